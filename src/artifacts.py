@@ -0,0 +1,133 @@
+# src/artifacts.py
+"""
+Gravação e leitura dos modelos em models/, com manifesto.
+
+models/manifest.json descreve o conjunto treinado:
+ - features de entrada (nome e dtype) e colunas geradas pelo preprocessor
+ - sha256 do parquet de treino e parâmetros das features (ver feature_store.py)
+ - métricas do treino
+ - para cada artefato: arquivo, compressão, tamanho e nº de árvores
+
+Compressão: "nenhuma" (padrão) grava os arrays crus e permite joblib.load com
+mmap_mode="r"; "zlib"/"lzma"/"lz4" (lz4 só se o pacote estiver instalado) deixam o
+arquivo menor, ao custo de descompactar na carga e de não poder usar mmap.
+
+cap_forest() limita o tamanho de uma RandomForest mantendo só as primeiras árvores
+que cabem no limite (a previsão passa a ser a média de menos árvores).
+
+Uso:
+    python src/artifacts.py            # tamanho e tempo de carga de cada artefato
+"""
+import os
+import io
+import json
+import time
+import argparse
+import joblib
+import numpy as np
+
+BASE = os.getcwd()
+MODEL_DIR = os.path.join(BASE, "models")
+MANIFEST_NAME = "manifest.json"
+ARTIFACTS = ("preprocessor", "rf_clf", "rf_reg", "iso_forest")
+
+COMPRESSIONS = ("nenhuma", "zlib", "lzma", "lz4")
+COMPRESS_LEVEL = 3
+
+def _compress_arg(compression, level=COMPRESS_LEVEL):
+    if compression in (None, "nenhuma"):
+        return 0
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"compressão desconhecida: {compression} (use uma de {COMPRESSIONS})")
+    if compression == "lz4":
+        try:
+            import lz4  # noqa: F401
+        except ImportError:
+            raise ImportError("compressão lz4 requer o pacote lz4 (pip install lz4)")
+    return (compression, level)
+
+def serialized_mb(obj, compression="nenhuma"):
+    buf = io.BytesIO()
+    joblib.dump(obj, buf, compress=_compress_arg(compression))
+    return buf.tell() / 1024 ** 2
+
+def cap_forest(model, max_mb):
+    """
+    Mantém as primeiras árvores de uma RandomForest* até caber em `max_mb`.
+    Retorna o nº de árvores removidas (0 se já cabia ou se não é RandomForest).
+    """
+    trees = getattr(model, "estimators_", None)
+    if trees is None or not type(model).__name__.startswith("RandomForest"):
+        return 0
+    sizes = np.cumsum([serialized_mb(t) for t in trees])
+    keep = max(int(np.searchsorted(sizes, max_mb, side="right")), 1)
+    removed = len(trees) - keep
+    if removed:
+        model.estimators_ = trees[:keep]
+        model.n_estimators = keep
+    return removed
+
+def save_model(name, obj, model_dir=MODEL_DIR, compression="nenhuma"):
+    path = os.path.join(model_dir, f"{name}.joblib")
+    tmp = path + ".tmp"
+    joblib.dump(obj, tmp, compress=_compress_arg(compression))
+    os.replace(tmp, path)
+    # tempo de carga não é medido aqui (seria reler cada artefato no treino): ver report()
+    info = {"arquivo": os.path.basename(path), "compressao": compression or "nenhuma",
+            "tamanho_mb": round(os.path.getsize(path) / 1024 ** 2, 3)}
+    if hasattr(obj, "estimators_"):
+        info["arvores"] = len(obj.estimators_)
+    return info
+
+def load_manifest(model_dir=MODEL_DIR):
+    path = os.path.join(model_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_manifest(manifest, model_dir=MODEL_DIR):
+    path = os.path.join(model_dir, MANIFEST_NAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, default=str)
+    os.replace(path + ".tmp", path)
+
+def load_model(name, model_dir=MODEL_DIR, mmap=True):
+    """Carrega um artefato; usa mmap_mode="r" quando ele foi gravado sem compressão."""
+    manifest = load_manifest(model_dir) or {}
+    info = manifest.get("artefatos", {}).get(name, {})
+    mode = "r" if mmap and info.get("compressao", "nenhuma") == "nenhuma" else None
+    return joblib.load(os.path.join(model_dir, f"{name}.joblib"), mmap_mode=mode)
+
+def report(model_dir=MODEL_DIR, mmap=True):
+    manifest = load_manifest(model_dir)
+    if manifest is None:
+        print("Sem manifest.json em", model_dir, "(modelos gravados antes do formato de artefatos)")
+    else:
+        print("Treino:", manifest.get("treinado_em"), "| dados sha256:", str(manifest.get("data_sha256"))[:12])
+        print("Features:", ", ".join(f"{c['nome']} ({c['dtype']})" for c in manifest.get("features", [])))
+        for k, v in manifest.get("metricas", {}).items():
+            print(f"  {k}: {v}")
+    # importa o sklearn antes de medir: o tempo de import não é tempo de carga do artefato
+    import sklearn.compose, sklearn.ensemble  # noqa: E401,F401
+    total_mb = total_s = 0.0
+    for name in ARTIFACTS:
+        path = os.path.join(model_dir, f"{name}.joblib")
+        if not os.path.exists(path):
+            continue
+        size = os.path.getsize(path) / 1024 ** 2
+        t0 = time.perf_counter()
+        load_model(name, model_dir, mmap)
+        dt = time.perf_counter() - t0
+        total_mb += size
+        total_s += dt
+        comp = ((manifest or {}).get("artefatos", {}).get(name, {})).get("compressao", "?")
+        print(f"{name:14s} {size:8.1f} MB  carga {dt:6.2f}s  compressão {comp}")
+    print(f"{'total':14s} {total_mb:8.1f} MB  carga {total_s:6.2f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tamanho e tempo de carga dos modelos")
+    parser.add_argument("--dir", default=MODEL_DIR)
+    parser.add_argument("--sem-mmap", action="store_true", help="carrega sem mmap_mode")
+    args = parser.parse_args()
+    report(args.dir, mmap=not args.sem_mmap)
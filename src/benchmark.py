@@ -0,0 +1,205 @@
+# src/benchmark.py
+"""
+Benchmark de ponta a ponta do pipeline com dados sintéticos (synthetic_data.py).
+
+Para cada escala pedida (--linhas) gera os CSVs num diretório de trabalho (reaproveitados
+se os parâmetros e o gerador não mudaram), apaga as saídas da execução anterior e roda
+as etapas do pipeline (ingestão, preprocessing, modelo, scoring, dashboard) do zero,
+cada uma num subprocesso. Sem a ingestão em --etapas, só as saídas das etapas pedidas
+são apagadas: as anteriores vêm de uma execução com --manter no mesmo --dir.
+Por etapa ficam registrados tempo de parede, CPU, pico de memória (RSS) e linhas/s.
+
+Os resultados vão para data/benchmarks.jsonl com o commit do código, para comparar
+execuções entre commits (--comparar).
+
+Uso:
+    python src/benchmark.py --linhas 10000 100000
+    python src/benchmark.py --linhas 1000000 --etapas ingestao preprocessamento --manter
+    python src/benchmark.py --linhas 1000000 --etapas modelo      # usa o clean da execução acima
+    python src/benchmark.py --comparar --linhas 100000            # última x anterior
+    python src/benchmark.py --comparar --linhas 100000 --contra 5896342
+"""
+import os
+import glob
+import json
+import shutil
+import tempfile
+import argparse
+import subprocess
+from datetime import datetime
+import pipeline
+import synthetic_data
+
+BASE = os.getcwd()
+RESULTS_PATH = os.path.join(BASE, "data", "benchmarks.jsonl")
+STAGES = ["ingestao", "preprocessamento", "modelo", "scoring", "dashboard"]
+GENERATOR_META = os.path.join("data", "raw", "synthetic.json")
+# além das saídas declaradas no pipeline.py: estado incremental e caches que a etapa reaproveitaria
+STAGE_STATE = {"ingestao": ["data/processed/ingestion_manifest.json"],
+               "preprocessamento": ["data/processed/preprocess_manifest.json"],
+               "modelo": ["models", "data/features"],
+               "dashboard": ["dashboard_data.js"]}
+
+def commit_id():
+    """Commit atual (com "+" se houver alterações não commitadas); None fora de um repositório git."""
+    try:
+        head = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=pipeline.SRC_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--", "."], cwd=pipeline.SRC_DIR,
+                               capture_output=True, text=True).stdout.strip()
+        return head + ("+" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def prepare_data(work_dir, rows, sep, encoding, seed):
+    """Gera os CSVs em work_dir/data/raw, a não ser que já estejam lá com os mesmos parâmetros."""
+    params = {"linhas": rows, "sep": sep, "encoding": encoding, "semente": seed,
+              "gerador": pipeline.code_hash("synthetic_data.py")}
+    meta_path = os.path.join(work_dir, GENERATOR_META)
+    raw_dir = os.path.join(work_dir, "data", "raw")
+    if os.path.exists(meta_path):
+        with open(meta_path, encoding="utf-8") as f:
+            if json.load(f) == params:
+                print("CSVs sintéticos reaproveitados de", raw_dir)
+                return None
+    shutil.rmtree(raw_dir, ignore_errors=True)
+    log = os.path.join(work_dir, "geracao.log")
+    r = pipeline.run_script("geracao", "synthetic_data.py",
+                            ["--linhas", str(rows), "--sep", sep, "--encoding", encoding,
+                             "--semente", str(seed), "--saida", raw_dir], work_dir, log)
+    if r["status"] != "ok":
+        raise RuntimeError(f"falha ao gerar os dados (ver {log})")
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(params, f)
+    return r
+
+def _remove(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+def reset_outputs(work_dir, stages=STAGES):
+    """
+    Cada medição parte do zero. Começando pela ingestão, apaga tudo (dataset, cache de
+    features, modelos, estado incremental); senão só o que as etapas pedidas produzem,
+    e as entradas delas precisam existir (de uma execução anterior com --manter).
+    """
+    stages = [name for name in STAGES if name in stages]
+    if stages[0] == STAGES[0]:
+        for d in ("data/processed", "data/features", "models", "logs"):
+            shutil.rmtree(os.path.join(work_dir, d), ignore_errors=True)
+        for f in ("dashboard.html", "dashboard_data.js"):
+            _remove(os.path.join(work_dir, f))
+    else:
+        produced = set()
+        missing = []
+        for name in stages:
+            _, _, inputs, outputs = pipeline.STAGES[name]
+            missing += [i for i in inputs if i not in produced and not glob.glob(os.path.join(work_dir, i))]
+            produced.update(outputs)
+        if missing:
+            raise SystemExit(f"Faltam entradas em {work_dir}: {', '.join(sorted(set(missing)))}. Rode antes as "
+                             f"etapas anteriores com --manter (ou inclua-as em --etapas)")
+        for name in stages:
+            for path in pipeline.STAGES[name][3] + STAGE_STATE.get(name, []):
+                _remove(os.path.join(work_dir, path))
+    os.makedirs(os.path.join(work_dir, "data", "processed"), exist_ok=True)
+    os.makedirs(os.path.join(work_dir, "models"), exist_ok=True)
+
+def _num(value, spec):
+    # cpu_s e pico_mb são None onde não há os.wait4 (Windows)
+    return format(value, spec) if value is not None else "-".rjust(len(format(0.0, spec)))
+
+def _print_stage(r):
+    print(f"  {r['etapa']:18s} {r['status']:7s} {r['parede_s']:8.1f}s  CPU {_num(r['cpu_s'], '8.1f')}s  "
+          f"pico {_num(r['pico_mb'], '8.0f')} MB  {r['linhas_s']:>12,} linhas/s")
+
+def run_benchmark(rows, stages=STAGES, work_dir=None, keep=False, sep=";", encoding="latin1",
+                  seed=synthetic_data.SEED, results_path=RESULTS_PATH):
+    work_dir = work_dir or os.path.join(tempfile.gettempdir(), f"benchmark_{rows}")
+    os.makedirs(work_dir, exist_ok=True)
+    print(f"== {rows:,} linhas em {work_dir}")
+    generated = prepare_data(work_dir, rows, sep, encoding, seed)
+    reset_outputs(work_dir, stages)
+    log_dir = os.path.join(work_dir, "logs")
+    os.makedirs(log_dir, exist_ok=True)
+
+    results = [dict(generated, linhas_s=round(rows / max(generated["parede_s"], 1e-9)))] if generated else []
+    for r in results:
+        _print_stage(r)
+    for name in STAGES:
+        if name not in stages:
+            continue
+        script, args = pipeline.STAGES[name][:2]
+        r = pipeline.run_script(name, script, args, work_dir, os.path.join(log_dir, f"{name}.log"))
+        r["linhas_s"] = round(rows / max(r["parede_s"], 1e-9))
+        results.append(r)
+        _print_stage(r)
+        if r["status"] != "ok":
+            with open(r["log"], encoding="utf-8", errors="replace") as f:
+                print("".join(f.readlines()[-20:]))
+            break
+
+    record = {"em": datetime.now().isoformat(timespec="seconds"), "commit": commit_id(), "linhas": rows,
+              "params": {"sep": sep, "encoding": encoding, "semente": seed, "cpus": os.cpu_count()},
+              "etapas": [{k: v for k, v in r.items() if k != "log"} for r in results]}
+    os.makedirs(os.path.dirname(results_path), exist_ok=True)
+    with open(results_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    if not keep:
+        shutil.rmtree(os.path.join(work_dir, "data", "processed"), ignore_errors=True)
+        shutil.rmtree(os.path.join(work_dir, "models"), ignore_errors=True)
+    return record
+
+def load_results(results_path=RESULTS_PATH):
+    if not os.path.exists(results_path):
+        return []
+    with open(results_path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def compare(rows, against=None, results_path=RESULTS_PATH):
+    """Última execução com `rows` linhas contra a anterior (ou a última do commit `against`)."""
+    runs = [r for r in load_results(results_path) if r["linhas"] == rows]
+    if not runs:
+        print(f"Nenhum resultado com {rows} linhas em {results_path}")
+        return
+    current = runs[-1]
+    if against:
+        base = next((r for r in reversed(runs[:-1]) if (r["commit"] or "").startswith(against)), None)
+    else:
+        base = runs[-2] if len(runs) > 1 else None
+    if base is None:
+        print("Sem execução anterior para comparar")
+        return
+    print(f"{rows:,} linhas: {base['commit']} ({base['em']}) -> {current['commit']} ({current['em']})")
+    print(f"{'etapa':18s} {'antes s':>9s} {'agora s':>9s} {'Δ tempo':>8s} {'antes MB':>9s} {'agora MB':>9s} {'Δ pico':>8s}")
+    before = {e["etapa"]: e for e in base["etapas"]}
+    for e in current["etapas"]:
+        b = before.get(e["etapa"])
+        if b is None:
+            continue
+        dt = 100 * (e["parede_s"] / max(b["parede_s"], 1e-9) - 1)
+        dm = None
+        if e["pico_mb"] is not None and b["pico_mb"] is not None:
+            dm = 100 * (e["pico_mb"] / max(b["pico_mb"], 1e-9) - 1)
+        print(f"{e['etapa']:18s} {b['parede_s']:9.1f} {e['parede_s']:9.1f} {dt:+7.0f}% "
+              f"{_num(b['pico_mb'], '9.0f')} {_num(e['pico_mb'], '9.0f')} {_num(dm, '+7.0f')}%")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline com dados sintéticos")
+    parser.add_argument("--linhas", type=int, nargs="+", default=[10_000], help="escalas (linhas geradas)")
+    parser.add_argument("--etapas", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--dir", default=None, help="diretório de trabalho (padrão: temporário, um por escala)")
+    parser.add_argument("--manter", action="store_true", help="mantém data/processed e models/ no fim")
+    parser.add_argument("--sep", choices=[";", ","], default=";")
+    parser.add_argument("--encoding", choices=["latin1", "utf-8"], default="latin1")
+    parser.add_argument("--semente", type=int, default=synthetic_data.SEED)
+    parser.add_argument("--comparar", action="store_true", help="só compara resultados já gravados")
+    parser.add_argument("--contra", help="commit usado como base na comparação (padrão: execução anterior)")
+    args = parser.parse_args()
+    for rows in args.linhas:
+        if not args.comparar:
+            work_dir = os.path.join(args.dir, str(rows)) if args.dir and len(args.linhas) > 1 else args.dir
+            run_benchmark(rows, args.etapas, work_dir, args.manter, args.sep, args.encoding, args.semente)
+        compare(rows, args.contra)
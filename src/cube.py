@@ -0,0 +1,160 @@
+# src/cube.py
+"""
+Cubo de agregados das autuações (data/processed/cube_autuacoes.parquet).
+
+Uma linha por combinação de arquivo_origem × uf × municipio × year_month ×
+gravidade_nivel × pred_risco, com medidas aditivas:
+ - qtd_autuacoes, qtd_com_coord, qtd_anomalias
+ - soma_multas / qtd_multas e soma_gravidade / qtd_gravidade (médias = soma / qtd)
+
+Como as medidas são somas, qualquer agregação (por UF, por mês, por município...) é
+um groupby sobre o cubo, que tem poucas linhas, em vez de uma leitura de todas as
+autuações.
+
+Quem atualiza:
+ - preprocessing.py: monta o cubo (pred_risco = -1, ainda sem modelo); na execução
+   incremental troca só as células dos arquivos de origem novos/alterados
+ - scoring.py: remonta o cubo com pred_risco e iso_flag, batch a batch, durante o
+   scoring
+
+O cubo está sempre inteiro num estado só: todo pontuado (depois do scoring.py) ou
+todo sem previsão (depois do preprocessing.py). Na troca incremental as células
+mantidas também perdem pred_risco e qtd_anomalias (ver replace_sources), em vez de
+misturar células pontuadas com as novas sem previsão; o pipeline.py roda o scoring
+de novo sempre que o clean_autuacoes.parquet muda, e ele devolve as previsões.
+
+Uso:
+    python src/cube.py --por uf year_month --uf PA AM --desde 2023-01 --ate 2023-12
+"""
+import os
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from instrument import timed
+
+BASE = os.getcwd()
+PROC_DIR = os.path.join(BASE, "data", "processed")
+CUBE_PATH = os.path.join(PROC_DIR, "cube_autuacoes.parquet")
+
+DIMENSIONS = ["arquivo_origem", "uf", "municipio", "year_month", "gravidade_nivel", "pred_risco"]
+MEASURES = ["qtd_autuacoes", "qtd_com_coord", "qtd_anomalias", "soma_multas", "qtd_multas",
+            "soma_gravidade", "qtd_gravidade"]
+# média -> (soma, qtd)
+MEANS = {"media_multa": ("soma_multas", "qtd_multas"), "media_gravidade": ("soma_gravidade", "qtd_gravidade")}
+NO_PREDICTION = -1
+
+def _year_month(df):
+    if "year_month" in df.columns:
+        ym = df["year_month"]
+    elif "dat_hora_auto_infracao" in df.columns:
+        ym = pd.to_datetime(df["dat_hora_auto_infracao"]).dt.to_period("M")
+    else:
+        return pd.Series("", index=df.index)
+    return ym.astype(str).where(ym.notna(), "")
+
+@timed()
+def build_cube(df):
+    """Cubo de um DataFrame de autuações limpas (ou pontuadas)."""
+    n = len(df)
+    col = lambda c, default: df[c] if c in df.columns else pd.Series(default, index=df.index)
+    valor = pd.to_numeric(col("valor_multa", np.nan), errors="coerce")
+    gravidade = pd.to_numeric(col("gravidade_nivel", np.nan), errors="coerce")
+    flat = pd.DataFrame({
+        "arquivo_origem": col("arquivo_origem", "").astype(str).to_numpy(),
+        "uf": col("uf", "UNKNOWN").astype(str).to_numpy(),
+        "municipio": col("municipio", "UNKNOWN").astype(str).to_numpy(),
+        "year_month": _year_month(df).to_numpy(),
+        # NaN como dimensão some no groupby de alguns pandas: -1 = sem gravidade
+        "gravidade_nivel": gravidade.fillna(-1).to_numpy(dtype=np.float32),
+        "pred_risco": pd.to_numeric(col("pred_risco", NO_PREDICTION)).fillna(NO_PREDICTION).to_numpy(dtype=np.int8),
+        "qtd_autuacoes": np.ones(n, dtype=np.int64),
+        "qtd_com_coord": col("lat", np.nan).notna().to_numpy(dtype=np.int64),
+        "qtd_anomalias": col("iso_flag", False).fillna(False).to_numpy(dtype=np.int64),
+        "soma_multas": valor.fillna(0).to_numpy(dtype=np.float64),
+        "qtd_multas": valor.notna().to_numpy(dtype=np.int64),
+        "soma_gravidade": gravidade.fillna(0).to_numpy(dtype=np.float64),
+        "qtd_gravidade": gravidade.notna().to_numpy(dtype=np.int64),
+    })
+    return combine([flat])
+
+@timed()
+def combine(parts):
+    """Soma cubos parciais (de batches ou de arquivos diferentes) num só."""
+    parts = [p for p in parts if len(p)]
+    if not parts:
+        return pd.DataFrame(columns=DIMENSIONS + MEASURES)
+    cube = pd.concat(parts, ignore_index=True)
+    for c in ("arquivo_origem", "uf", "municipio", "year_month"):
+        cube[c] = cube[c].astype(str)
+    cube = cube.groupby(DIMENSIONS, sort=True, observed=True)[MEASURES].sum().reset_index()
+    for c in ("arquivo_origem", "uf", "municipio", "year_month"):
+        cube[c] = cube[c].astype("category")
+    return cube
+
+def drop_predictions(cube):
+    """O cubo como o preprocessing o monta: pred_risco = -1 e sem anomalias."""
+    if not len(cube) or ((cube["pred_risco"] == NO_PREDICTION).all() and not cube["qtd_anomalias"].any()):
+        return cube
+    return combine([cube.assign(pred_risco=np.int8(NO_PREDICTION), qtd_anomalias=np.int64(0))])
+
+def replace_sources(cube, new_rows, sources):
+    """
+    Tira do cubo as células dos arquivos em `sources` e soma o cubo de `new_rows`.
+    As linhas novas ainda não têm previsão, então as mantidas perdem as suas também.
+    """
+    kept = drop_predictions(cube[~cube["arquivo_origem"].astype(str).isin(sources)])
+    return combine([kept, build_cube(new_rows)] if len(new_rows) else [kept])
+
+def save(cube, path=CUBE_PATH):
+    tmp = path + ".tmp"
+    cube.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+    print(f"Cubo salvo: {path} ({len(cube)} células)")
+
+def load(path=CUBE_PATH):
+    if not os.path.exists(path):
+        return None
+    return pd.read_parquet(path)
+
+@timed()
+def rollup(cube, by, uf=None, month_from=None, month_to=None):
+    """
+    Agrega o cubo pelas dimensões em `by`, com médias recalculadas a partir das somas.
+    `month_from`/`month_to` ("AAAA-MM", inclusivos) filtram year_month.
+    """
+    mask = np.ones(len(cube), dtype=bool)
+    if uf:
+        mask &= cube["uf"].astype(str).isin([uf] if isinstance(uf, str) else list(uf)).to_numpy()
+    ym = cube["year_month"].astype(str)
+    if month_from:
+        mask &= (ym >= str(pd.Period(month_from, "M"))).to_numpy()
+    if month_to:
+        mask &= ((ym <= str(pd.Period(month_to, "M"))) & (ym != "")).to_numpy()
+    sel = cube[mask]
+    out = sel.groupby(list(by), sort=True, observed=True)[MEASURES].sum().reset_index() if by else \
+        sel[MEASURES].sum().to_frame().T
+    for name, (s, q) in MEANS.items():
+        out[name] = out[s] / out[q].where(out[q] > 0)
+    return out
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Consulta o cubo de agregados das autuações")
+    parser.add_argument("--por", nargs="*", default=["uf"], choices=DIMENSIONS, help="dimensões do resultado")
+    parser.add_argument("--uf", nargs="+")
+    parser.add_argument("--desde", help="mês inicial (AAAA-MM)")
+    parser.add_argument("--ate", help="mês final (AAAA-MM)")
+    parser.add_argument("--ordenar", default=None, help="medida usada na ordenação (decrescente)")
+    parser.add_argument("--linhas", type=int, default=30, help="linhas mostradas")
+    args = parser.parse_args()
+    t0 = time.perf_counter()
+    cube = load()
+    if cube is None:
+        raise SystemExit(f"{CUBE_PATH} não encontrado: rode o preprocessing.py")
+    res = rollup(cube, args.por, args.uf, args.desde, args.ate)
+    if args.ordenar:
+        res = res.sort_values(args.ordenar, ascending=False)
+    dt = time.perf_counter() - t0
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(res.head(args.linhas).to_string(index=False))
+    print(f"{len(res)} linhas, {len(cube)} células no cubo, {1000 * dt:.0f} ms")
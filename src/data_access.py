@@ -0,0 +1,104 @@
+# src/data_access.py
+"""
+Leitura dos dados processados com projeção de colunas e filtros empurrados para o
+scanner do pyarrow.dataset.
+
+Cada etapa pede só as colunas e linhas de que precisa:
+
+    load(path, columns=["uf", "valor_multa"], uf=["PA", "AM"], date_from="2023-01-01")
+
+Funciona tanto para um arquivo parquet (clean_autuacoes.parquet, ...) quanto para o
+dataset particionado uf=/ano= gerado pelo data_ingestion.py. No dataset, o filtro de UF
+e o de ano descartam diretórios inteiros; nos arquivos ordenados por data (clean), o
+filtro de data pula row groups pelas estatísticas min/max.
+"""
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+DATE_COL = "dat_hora_auto_infracao"
+
+def open_dataset(path):
+    if os.path.isdir(path):
+        # partições uf=/ano= viram colunas normais (string/int), não categóricas
+        return ds.dataset(path, format="parquet", partitioning="hive")
+    return ds.dataset(path, format="parquet")
+
+def upper_bound(date_to):
+    """
+    (limite, estrito) para um `date_to` inclusivo: uma data sem hora ("2024-03-31")
+    cobre o dia inteiro, então o limite vira a meia-noite seguinte, exclusiva; com
+    hora, vale o próprio instante, inclusivo.
+    """
+    ts = pd.Timestamp(date_to)
+    if ts == ts.normalize():
+        return ts + pd.Timedelta(days=1), True
+    return ts, False
+
+def build_filter(schema, uf=None, date_from=None, date_to=None, date_col=DATE_COL):
+    """Monta a expressão de filtro com o que existir no schema; None se não houver filtro."""
+    names = set(schema.names)
+    expr = None
+
+    def _and(e):
+        nonlocal expr
+        expr = e if expr is None else expr & e
+
+    if uf and "uf" in names:
+        _and(pc.field("uf").isin([uf] if isinstance(uf, str) else list(uf)))
+
+    if date_from is not None or date_to is not None:
+        if date_col in names and pa.types.is_timestamp(schema.field(date_col).type):
+            if date_from is not None:
+                _and(pc.field(date_col) >= pd.Timestamp(date_from))
+            if date_to is not None:
+                hi, strict = upper_bound(date_to)
+                _and(pc.field(date_col) < hi if strict else pc.field(date_col) <= hi)
+        elif "ano" in names:
+            # dataset bruto: as datas ainda são texto, mas a partição ano= dá a poda
+            if date_from is not None:
+                _and(pc.field("ano") >= pd.Timestamp(date_from).year)
+            if date_to is not None:
+                _and(pc.field("ano") <= pd.Timestamp(date_to).year)
+    return expr
+
+def load(path, columns=None, uf=None, date_from=None, date_to=None, date_col=DATE_COL):
+    """
+    Lê `path` como DataFrame. `columns` lista as colunas desejadas (as inexistentes
+    são ignoradas); `uf` aceita uma sigla ou lista; `date_from`/`date_to` são
+    inclusivos (um `date_to` sem hora inclui o dia inteiro).
+    """
+    dataset = open_dataset(path)
+    if columns is not None:
+        columns = [c for c in columns if c in dataset.schema.names]
+    expr = build_filter(dataset.schema, uf, date_from, date_to, date_col)
+    return dataset.to_table(columns=columns, filter=expr).to_pandas()
+
+def iter_row_groups(path, columns=None, uf=None, date_from=None, date_to=None, date_col=DATE_COL):
+    """
+    Como load, mas devolve um DataFrame por row group, sempre na mesma ordem; row
+    groups descartados pelas estatísticas do filtro nem são lidos. A memória fica
+    limitada ao tamanho de um row group.
+    """
+    dataset = open_dataset(path)
+    if columns is not None:
+        columns = [c for c in columns if c in dataset.schema.names]
+    expr = build_filter(dataset.schema, uf, date_from, date_to, date_col)
+    for frag in dataset.get_fragments(filter=expr):
+        for rg in frag.split_by_row_group(filter=expr):
+            yield rg.to_table(schema=dataset.schema, columns=columns, filter=expr).to_pandas()
+
+def count_rows(path, **filters):
+    dataset = open_dataset(path)
+    return dataset.count_rows(filter=build_filter(dataset.schema, **filters))
+
+def head(path, n=5, columns=None):
+    dataset = open_dataset(path)
+    if columns is not None:
+        columns = [c for c in columns if c in dataset.schema.names]
+    return dataset.head(n, columns=columns).to_pandas()
+
+def schema(path):
+    return open_dataset(path).schema
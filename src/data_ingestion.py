@@ -1,8 +1,19 @@
 import os
+import re
 import glob
+import codecs
+import shutil
+import itertools
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 from datetime import datetime
 import requests
+from manifest import load_manifest, save_manifest, diff_sources, record
+from instrument import timed
 
 # Caminhos
 BASE_DIR = os.getcwd()
@@ -12,59 +23,295 @@ PROCESSED_DIR = os.path.join(BASE_DIR, "data", "processed")
 os.makedirs(RAW_DIR, exist_ok=True)
 os.makedirs(PROCESSED_DIR, exist_ok=True)
 
-FILENAME_PREFIX = "auto_infracao_2024"  # seu arquivo específico
+FILENAME_PREFIX = "auto_infracao"  # todos os anos (auto_infracao_2019.csv, auto_infracao_2024.csv, ...)
 
-def find_csv():
-    pattern = os.path.join(RAW_DIR, FILENAME_PREFIX + "*.csv")
-    files = glob.glob(pattern)
+# leitura em streaming: tamanho da amostra usada na detecção e linhas por chunk
+SNIFF_BYTES = 1024 * 1024
+# trechos extras, espalhados pelo arquivo, conferidos na detecção do encoding
+SNIFF_SAMPLES = 8
+CHUNK_ROWS = 200_000
+# dataset: linhas acumuladas por partição antes de gravar um row group e limite por arquivo
+MIN_GROUP_ROWS = 50_000
+MAX_FILE_ROWS = 5_000_000
+
+# dataset particionado (Hive): data/processed/autuacoes_dataset/uf=PA/ano=2024/<arquivo>-<n>.parquet
+DATASET_DIR = os.path.join(PROCESSED_DIR, "autuacoes_dataset")
+PARTITIONING = ds.partitioning(pa.schema([("uf", pa.string()), ("ano", pa.int16())]), flavor="hive")
+DATE_COL = "dat_hora_auto_infracao"
+
+def find_csvs(prefix=FILENAME_PREFIX):
+    pattern = os.path.join(RAW_DIR, prefix + "*.csv")
+    files = sorted(glob.glob(pattern))
     if not files:
-        raise FileNotFoundError(f"Nenhum CSV encontrado começando com {FILENAME_PREFIX} em {RAW_DIR}")
-    return files[0]
-
-def load_csv(path):
-    attempts = [
-        {"sep": ",", "enc": "utf-8"},
-        {"sep": ";", "enc": "utf-8"},
-        {"sep": ",", "enc": "latin1"},
-        {"sep": ";", "enc": "latin1"},
-    ]
-    for opt in attempts:
+        raise FileNotFoundError(f"Nenhum CSV encontrado começando com {prefix} em {RAW_DIR}")
+    return files
+
+def find_csv():
+    return find_csvs()[0]
+
+def _decodes_utf8(sample, middle=False):
+    if middle:
+        # trecho do meio do arquivo: descarta o resto de um caractere multibyte cortado no início
+        i = 0
+        while i < 3 and i < len(sample) and 0x80 <= sample[i] < 0xC0:
+            i += 1
+        sample = sample[i:]
+    # decoder incremental tolera um caractere multibyte cortado no fim da amostra
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+def sniff_csv(path, sample_bytes=SNIFF_BYTES, samples=SNIFF_SAMPLES):
+    """
+    Detecta encoding e separador lendo os primeiros bytes do arquivo e mais `samples`
+    trechos espalhados pelo resto dele (um export latin1 pode ter o 1º MB todo em ASCII).
+    Retorna (sep, encoding).
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        sample = f.read(sample_bytes)
+        rest = []
+        if size > sample_bytes and samples:
+            # o último trecho termina no fim do arquivo
+            step, n = (size - sample_bytes) // samples, sample_bytes // 4
+            for k in range(1, samples + 1):
+                f.seek(max(sample_bytes, sample_bytes + k * step - n))
+                rest.append(f.read(n))
+
+    if _decodes_utf8(sample) and all(_decodes_utf8(r, middle=True) for r in rest):
+        enc = "utf-8-sig" if sample.startswith(codecs.BOM_UTF8) else "utf-8"
+        text = sample.decode(enc, errors="ignore")
+    else:
+        text = sample.decode("latin1")
+        enc = "latin1"
+
+    # separador: o mais frequente no cabeçalho (CSVs do IBAMA usam ';' ou ',')
+    header = text.splitlines()[0] if text else ""
+    sep = ";" if header.count(";") > header.count(",") else ","
+    return sep, enc
+
+def read_chunks(path, sep, enc, chunksize):
+    """Chunks do CSV como texto, com os nomes de coluna normalizados. Decodifica em modo estrito."""
+    for chunk in pd.read_csv(path, sep=sep, encoding=enc, dtype=str, chunksize=chunksize):
+        chunk.columns = [c.strip().lower().replace(" ", "_") for c in chunk.columns]
+        yield chunk
+
+def with_latin1_fallback(path, enc, write, undo):
+    """
+    Roda write(enc). Se aparecer um byte inválido para `enc` fora das amostras do
+    sniff_csv, desfaz o que foi gravado (undo) e relê o arquivo inteiro como latin1,
+    em vez de trocar os caracteres acentuados por U+FFFD sem avisar.
+    """
+    try:
+        return write(enc)
+    except UnicodeDecodeError as e:
+        if enc == "latin1":
+            raise
+        undo()
+        print(f"⚠️  {os.path.basename(path)}: byte inválido para {enc} ({e.reason}); relendo como latin1")
+        return write("latin1")
+
+def processed_path(path):
+    # segundos + nome do CSV de origem: vários CSVs terminando no mesmo minuto não se sobrescrevem,
+    # e a ordem por nome (find_latest_parquet) continua sendo a ordem de gravação
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return os.path.join(PROCESSED_DIR, f"autuacoes_processed_{stamp}_{source_key(path)}.parquet")
+
+@timed()
+def stream_csv_to_parquet(path, out=None, chunksize=CHUNK_ROWS):
+    """
+    Lê o CSV em chunks de `chunksize` linhas e grava cada chunk como um row group
+    do parquet de saída. O pico de memória fica proporcional ao chunk, não ao arquivo.
+    Todas as colunas são lidas como texto (o preprocessing faz as conversões), o que
+    mantém o schema estável entre chunks.
+    """
+    sep, enc = sniff_csv(path)
+    print(f"Detectado sep='{sep}' encoding='{enc}' (chunks de {chunksize} linhas)")
+
+    out = out or processed_path(path)
+    tmp = out + ".tmp"
+
+    def write(enc):
+        writer = None
+        total = 0
         try:
-            df = pd.read_csv(path, sep=opt["sep"], encoding=opt["enc"], low_memory=False)
-            print(f"Carregado com sep='{opt['sep']}' encoding='{opt['enc']}'")
-            return df
-        except:
-            pass
-    # fallback
-    df = pd.read_csv(path, engine="python", low_memory=False)
-    print("Carregado com fallback padrão.")
-    return df
-
-def normalize_columns(df):
-    df = df.copy()
-    df.columns = [c.strip().lower().replace(" ", "_") for c in df.columns]
-    return df
-
-def save_processed(df):
-    out = os.path.join(PROCESSED_DIR, f"autuacoes_processed_{datetime.now().strftime('%Y%m%d_%H%M')}.parquet")
-    df.to_parquet(out, index=False)
+            for chunk in read_chunks(path, sep, enc, chunksize):
+                if writer is None:
+                    schema = pa.schema([(c, pa.string()) for c in chunk.columns])
+                    writer = pq.ParquetWriter(tmp, schema)
+                table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+                writer.write_table(table)
+                total += len(chunk)
+                print(f"  ... {total} linhas gravadas")
+        finally:
+            if writer is not None:
+                writer.close()
+        return writer, total
+
+    writer, total = with_latin1_fallback(path, enc, write, lambda: None)
+    if writer is None:
+        raise ValueError(f"CSV vazio: {path}")
+    # só publica o arquivo completo (evita que find_latest_parquet pegue um parquet pela metade)
+    os.replace(tmp, out)
     print("Arquivo salvo:", out)
+    return out, total
+
+def source_key(path):
+    # prefixo dos arquivos gravados no dataset para um CSV de origem
+    return os.path.splitext(os.path.basename(path))[0]
+
+def add_partition_columns(chunk):
+    chunk["uf"] = chunk["uf"].fillna("UNKNOWN") if "uf" in chunk.columns else "UNKNOWN"
+    if DATE_COL in chunk.columns:
+        # aceita "15/01/2024 10:00:00" e "2024-01-15 10:00:00": o ano é o único grupo de 4 dígitos
+        ano = chunk[DATE_COL].str.extract(r"(\d{4})", expand=False)
+        chunk["ano"] = pd.to_numeric(ano, errors="coerce").astype("Int16")
+    else:
+        chunk["ano"] = pd.array([pd.NA] * len(chunk), dtype="Int16")
+    return chunk
+
+@timed()
+def ingest_csv_to_dataset(path, dataset_dir=DATASET_DIR, chunksize=CHUNK_ROWS):
+    """
+    Lê um CSV em streaming e grava seus chunks no dataset particionado por uf/ano.
+    Um único write_dataset recebe todos os chunks: cada partição fica com poucos
+    arquivos grandes (até MAX_FILE_ROWS linhas, row groups de MIN_GROUP_ROWS ou mais)
+    em vez de um arquivo pequeno por chunk.
+    Cada arquivo gravado começa com o nome do CSV de origem, então vários processos
+    podem escrever no mesmo dataset sem colisão.
+    Retorna (path, linhas).
+    """
+    sep, enc = sniff_csv(path)
+    key = source_key(path)
+
+    def write(enc):
+        total = 0
+        # arquivo_origem: permite ao preprocessing saber de qual CSV veio cada linha (ingestão incremental)
+        tables = (add_partition_columns(chunk).assign(arquivo_origem=key)
+                  for chunk in read_chunks(path, sep, enc, chunksize))
+        first = next(tables, None)
+        if first is None:
+            return 0
+        fields = [(c, pa.string()) for c in first.columns if c not in ("uf", "ano")]
+        schema = pa.schema(fields + [("uf", pa.string()), ("ano", pa.int16())])
+
+        def batches():
+            nonlocal total
+            for chunk in itertools.chain([first], tables):
+                total += len(chunk)
+                yield from pa.Table.from_pandas(chunk, schema=schema, preserve_index=False).to_batches()
+
+        ds.write_dataset(
+            batches(), dataset_dir, schema=schema, format="parquet", partitioning=PARTITIONING,
+            basename_template=f"{key}-{{i}}.parquet", existing_data_behavior="overwrite_or_ignore",
+            max_partitions=4096, min_rows_per_group=MIN_GROUP_ROWS, max_rows_per_file=MAX_FILE_ROWS,
+        )
+        return total
+
+    total = with_latin1_fallback(path, enc, write, lambda: remove_source_files(key, dataset_dir))
+    return path, total
+
+@timed()
+def ingest_all(paths, dataset_dir=DATASET_DIR, chunksize=CHUNK_ROWS, workers=None):
+    """Ingere vários CSVs em paralelo (um processo por arquivo)."""
+    results = {}
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(paths) == 1:
+        for p in paths:
+            _, n = ingest_csv_to_dataset(p, dataset_dir, chunksize)
+            print(f"  ✔ {os.path.basename(p)}: {n} linhas")
+            results[p] = n
+        return results
+    with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as pool:
+        futures = [pool.submit(ingest_csv_to_dataset, p, dataset_dir, chunksize) for p in paths]
+        for fut in as_completed(futures):
+            p, n = fut.result()
+            print(f"  ✔ {os.path.basename(p)}: {n} linhas")
+            results[p] = n
+    return results
+
+def remove_source_files(key, dataset_dir=DATASET_DIR):
+    """Apaga do dataset os arquivos gravados a partir do CSV `key`."""
+    # <csv>-<n>.parquet; <csv>-<chunk>-<n>.parquet nos datasets gravados um arquivo por chunk
+    pattern = re.compile(rf"^{re.escape(key)}(?:-\d{{5}})?-\d+\.parquet$")
+    removed = 0
+    for root, _, files in os.walk(dataset_dir):
+        for f in files:
+            if pattern.match(f):
+                os.remove(os.path.join(root, f))
+                removed += 1
+    return removed
+
+def ingest_full(csv_paths, chunksize=CHUNK_ROWS, workers=None):
+    # grava num diretório temporário e troca no fim: uma execução com erro não deixa
+    # o dataset pela metade
+    tmp_dir = DATASET_DIR + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    print(f"📥 Ingerindo {len(csv_paths)} CSV(s) em paralelo...")
+    results = ingest_all(csv_paths, tmp_dir, chunksize, workers)
+    shutil.rmtree(DATASET_DIR, ignore_errors=True)
+    os.replace(tmp_dir, DATASET_DIR)
+    return results
+
+def main(chunksize=CHUNK_ROWS, workers=None, single_file=False, full=False):
+    print("🔍 Procurando CSVs...")
+    csv_paths = find_csvs()
+    for p in csv_paths:
+        print("📁 Arquivo encontrado:", p)
 
-def main():
-    print("🔍 Procurando CSV...")
-    csv_path = find_csv()
-    print("📁 Arquivo encontrado:", csv_path)
+    if single_file:
+        # modo antigo: um autuacoes_processed_<timestamp>_<csv>.parquet por CSV
+        for p in csv_paths:
+            stream_csv_to_parquet(p, chunksize=chunksize)
+        print("✅ Ingestão finalizada!")
+        return
 
-    print("📥 Lendo CSV...")
-    df = load_csv(csv_path)
+    manifest = {"arquivos": {}} if full else load_manifest()
+    if not os.path.isdir(DATASET_DIR):
+        manifest = {"arquivos": {}}
+    print("🧾 Comparando com o manifesto de arquivos já ingeridos...")
+    changed, removed, prints = diff_sources(csv_paths, manifest, source_key)
 
-    print("🧹 Normalizando colunas...")
-    df = normalize_columns(df)
+    # arquivos sem alteração de conteúdo: só atualiza tamanho/mtime no manifesto
+    for key, fp in prints.items():
+        entry = manifest["arquivos"].get(key)
+        if entry and entry["sha256"] == fp["sha256"]:
+            entry.update(fp)
 
-    print("💾 Salvando parquet processado...")
-    save_processed(df)
+    if not manifest["arquivos"]:
+        results = ingest_full(csv_paths, chunksize, workers)
+    else:
+        for key in removed:
+            n = remove_source_files(key)
+            manifest["arquivos"].pop(key, None)
+            print(f"🗑️  {key} removido de data/raw ({n} arquivos apagados do dataset)")
+        if not changed:
+            save_manifest(manifest)
+            print("✅ Nada novo para ingerir.")
+            return
+        for p in changed:
+            remove_source_files(source_key(p))
+        print(f"📥 Ingerindo {len(changed)} CSV(s) novo(s)/alterado(s) em paralelo...")
+        results = ingest_all(changed, DATASET_DIR, chunksize, workers)
 
+    for p, n in results.items():
+        record(manifest, source_key(p), prints[source_key(p)], n)
+    save_manifest(manifest)
+    print(f"💾 Dataset particionado atualizado em {DATASET_DIR} ({sum(results.values())} linhas novas)")
     print("✅ Ingestão finalizada!")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Ingestão dos CSVs de autos de infração do IBAMA")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_ROWS,
+                        help="linhas por chunk lido do CSV")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="processos paralelos (padrão: número de CPUs)")
+    parser.add_argument("--arquivo-unico", action="store_true",
+                        help="grava um autuacoes_processed_<timestamp>_<csv>.parquet por CSV em vez do dataset particionado")
+    parser.add_argument("--completo", action="store_true",
+                        help="ignora o manifesto e reconstrói o dataset inteiro")
+    args = parser.parse_args()
+    main(chunksize=args.chunksize, workers=args.workers, single_file=args.arquivo_unico,
+         full=args.completo)
@@ -0,0 +1,99 @@
+# src/feature_store.py
+"""
+Cache em disco das matrizes de features já transformadas (data/features/<chave>/).
+
+A chave combina o sha256 do parquet de entrada, o hash do código que gera as features
+(build_features, build_preprocessor, ...) e os parâmetros do treino (encoding,
+filtros, split). Se nada disso mudou, treino, experimentos e scoring reaproveitam a
+matriz em vez de refazer build_target_and_features + ColumnTransformer.
+
+Cada matriz é gravada em .npy (as esparsas como data/indices/indptr) e pode ser
+aberta com mmap_mode="r": várias execuções leem as mesmas páginas do disco sem
+copiar a matriz inteira para a memória.
+"""
+import os
+import json
+import shutil
+import hashlib
+import inspect
+import joblib
+import numpy as np
+import scipy.sparse as sp
+from manifest import fingerprint, load_manifest, save_manifest
+
+BASE = os.getcwd()
+FEATURE_DIR = os.path.join(BASE, "data", "features")
+HASHES_PATH = os.path.join(FEATURE_DIR, "source_hashes.json")
+
+def data_hash(path):
+    """sha256 do arquivo; só relê o conteúdo se tamanho ou mtime mudaram."""
+    prev = load_manifest(HASHES_PATH)["arquivos"].get(path)
+    fp = fingerprint(path, prev)
+    if fp != prev:
+        # só grava quando o arquivo mudou; relê antes para não apagar o que outro processo gravou
+        os.makedirs(FEATURE_DIR, exist_ok=True)
+        known = load_manifest(HASHES_PATH)
+        known["arquivos"][path] = fp
+        save_manifest(known, HASHES_PATH)
+    return fp["sha256"]
+
+def code_hash(*funcs):
+    h = hashlib.sha256()
+    for f in funcs:
+        h.update(inspect.getsource(f).encode("utf-8"))
+    return h.hexdigest()
+
+def cache_key(data_sha, code_sha, **params):
+    payload = json.dumps({"data": data_sha, "code": code_sha, "params": params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:20]
+
+def _entry(key):
+    return os.path.join(FEATURE_DIR, key)
+
+def exists(key):
+    return os.path.exists(os.path.join(_entry(key), "meta.json"))
+
+def save(key, arrays, objects=None, meta=None):
+    """Grava `arrays` (ndarray ou scipy.sparse), `objects` (joblib) e `meta` (json)."""
+    final = _entry(key)
+    tmp = final + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    info = {}
+    for name, M in arrays.items():
+        if sp.issparse(M):
+            M = M.tocsr()
+            for part in ("data", "indices", "indptr"):
+                np.save(os.path.join(tmp, f"{name}.{part}.npy"), getattr(M, part))
+            info[name] = {"sparse": True, "shape": list(M.shape)}
+        else:
+            np.save(os.path.join(tmp, f"{name}.npy"), np.asarray(M))
+            info[name] = {"sparse": False}
+    for name, obj in (objects or {}).items():
+        joblib.dump(obj, os.path.join(tmp, f"{name}.joblib"))
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(dict(meta or {}, arrays=info, objects=sorted(objects or {})), f, indent=2, default=str)
+    shutil.rmtree(final, ignore_errors=True)
+    os.replace(tmp, final)
+
+def load(key, mmap=True):
+    """Retorna (arrays, objects, meta) ou None se a chave não está no cache."""
+    if not exists(key):
+        return None
+    d = _entry(key)
+    mode = "r" if mmap else None
+    with open(os.path.join(d, "meta.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+    arrays = {}
+    for name, info in meta["arrays"].items():
+        if info["sparse"]:
+            parts = [np.load(os.path.join(d, f"{name}.{p}.npy"), mmap_mode=mode) for p in ("data", "indices", "indptr")]
+            arrays[name] = sp.csr_matrix(tuple(parts), shape=tuple(info["shape"]), copy=False)
+        else:
+            arrays[name] = np.load(os.path.join(d, f"{name}.npy"), mmap_mode=mode)
+    objects = {name: joblib.load(os.path.join(d, f"{name}.joblib")) for name in meta["objects"]}
+    return arrays, objects, meta
+
+def take_rows(M, idx):
+    """Linhas `idx` de uma matriz densa, esparsa ou memmap (em memória)."""
+    return M[idx] if sp.issparse(M) else np.asarray(M[idx])
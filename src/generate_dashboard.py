@@ -2,164 +2,340 @@
 """
 Gera dashboard.html estático (offline) a partir de data/processed/sample_for_dashboard.parquet (ou CSV)
 Corrigido para evitar conflitos de chaves em templates JS.
+
+Os dados vão para a página em layout colunar (um array por campo, alertas como
+índices nos pontos), serializados coluna a coluna pelo pandas, sem iterar linhas.
+A série temporal e o ranking vêm do cubo de agregados (cube.py) quando ele existe e
+não há filtro de data; senão são calculados das linhas lidas.
+
+O mapa não desenha um marcador por autuação: build_grid() agrega todas as linhas
+numa grade por nível de zoom (contagem, soma das multas, risco máximo, anomalias) e a
+página mostra as células do nível correspondente ao zoom. Com zoom alto, os pontos
+individuais da área visível são buscados num índice por célula (index_points()).
+--max-pontos limita os pontos individuais enviados (0 = todos, padrão).
+
+Para a página ficar leve: uf, município, infrator, descrição (cortada em
+--max-descricao) e mês vão como códigos num dicionário, lat/lon como inteiros, e o
+payload pode ir comprimido (--payload gzip, decodificado no navegador com
+DecompressionStream) ou num arquivo dashboard_data.js ao lado (--payload arquivo).
+--relatorio compara tamanho e tempo de parse com o formato antigo.
 """
 import os, json
+import gzip
+import time
+import base64
+import argparse
+import numpy as np
 import pandas as pd
 from datetime import datetime
+from parsing import parse_valor_series, parse_dates_series
+from preprocessing import read_clean
+import cube as cube_store
+from instrument import timed
 
 BASE = os.getcwd()
 PROC = os.path.join(BASE, "data", "processed")
+SCORED_PATH = os.path.join(PROC, "scored_autuacoes.parquet")  # gerado pelo scoring.py
 PARQ_PATH = os.path.join(PROC, "sample_for_dashboard.parquet")
 CSV_PATH = os.path.join(PROC, "sample_for_dashboard.csv")
 OUT_HTML = os.path.join(BASE, "dashboard.html")
 
-def read_sample():
+# colunas usadas pelo dashboard (as ausentes no arquivo são ignoradas)
+DASHBOARD_COLUMNS = ["seq_auto_infracao", "dat_hora_auto_infracao", "dt_fato_infracional", "dt_lancamento",
+                     "municipio", "uf", "valor_multa", "val_auto_infracao", "lat", "lon",
+                     "num_latitude_auto", "num_longitude_auto", "pred_risco", "iso_flag", "des_infracao",
+                     "nome_infrator", "nome", "infrator", "nome_responsavel"]
+NAME_COLUMNS = ["nome_infrator", "nome", "infrator", "nome_responsavel"]
+DATE_COLUMNS = ["dat_hora_auto_infracao", "dt_fato_infracional", "dt_lancamento"]
+
+MAX_ROWS = 0         # pontos individuais no payload (0 = todos); grade e gráficos usam todas as linhas
+COORD_DECIMALS = 4   # ~11 m
+MONEY_DECIMALS = 2
+DESC_CHARS = 200     # o popup mostra só o começo da descrição
+PAYLOAD_MODES = ("json", "gzip", "arquivo")
+
+# grade do mapa: no nível z a célula tem GRID_CELL_DEG / 2^z graus; o mapa usa o
+# nível mais próximo do zoom e, a partir de DETAIL_ZOOM, mostra os pontos da área
+# visível (se forem até MAX_MARKERS; senão, as células do nível mais fino)
+GRID_CELL_DEG = 90.0
+GRID_LEVELS = (2, 4, 6, 8, 10)
+DETAIL_ZOOM = 11
+MAX_MARKERS = 5000
+
+@timed()
+def read_sample(columns=DASHBOARD_COLUMNS, **filters):
+    # com os modelos aplicados, pred_risco e iso_flag vêm do scoring em vez dos fallbacks
+    if os.path.exists(SCORED_PATH):
+        try:
+            df = read_clean(SCORED_PATH, columns=columns, **filters)
+            print("Lido parquet pontuado:", SCORED_PATH)
+            return df
+        except Exception as e:
+            print("Falha ao ler parquet pontuado:", e)
     if os.path.exists(PARQ_PATH):
         try:
-            df = pd.read_parquet(PARQ_PATH)
+            df = read_clean(PARQ_PATH, columns=columns, **filters)
             print("Lido parquet:", PARQ_PATH)
             return df
         except Exception as e:
             print("Falha ao ler parquet:", e)
+    usecols = (lambda c: c.strip().lower().replace(" ", "_") in columns) if columns else None
     if os.path.exists(CSV_PATH):
-        df = pd.read_csv(CSV_PATH, low_memory=False)
+        df = pd.read_csv(CSV_PATH, low_memory=False, usecols=usecols)
         print("Lido csv:", CSV_PATH)
         return df
     # try to find other sample files
     for f in os.listdir(PROC):
         if f.endswith(".parquet") and "sample" in f:
             try:
-                df = pd.read_parquet(os.path.join(PROC,f))
+                df = read_clean(os.path.join(PROC,f), columns=columns, **filters)
                 print("Lido (auto) parquet:", f)
                 return df
             except Exception:
                 pass
         if f.endswith(".csv") and "sample" in f:
-            df = pd.read_csv(os.path.join(PROC,f), low_memory=False)
+            df = pd.read_csv(os.path.join(PROC,f), low_memory=False, usecols=usecols)
             print("Lido (auto) csv:", f)
             return df
     raise FileNotFoundError("Nenhum sample_for_dashboard.parquet/csv encontrado em data/processed.")
 
-df = read_sample()
-df.columns = [c.strip().lower().replace(" ", "_") for c in df.columns]
-
-# ensure lat/lon
-if "num_latitude_auto" in df.columns:
-    df["lat"] = pd.to_numeric(df["num_latitude_auto"], errors="coerce")
-elif "lat" in df.columns:
-    df["lat"] = pd.to_numeric(df["lat"], errors="coerce")
-else:
-    df["lat"] = pd.NA
-
-if "num_longitude_auto" in df.columns:
-    df["lon"] = pd.to_numeric(df["num_longitude_auto"], errors="coerce")
-elif "lon" in df.columns:
-    df["lon"] = pd.to_numeric(df["lon"], errors="coerce")
-else:
-    df["lon"] = pd.NA
-
-# valor_multa normalization
-if "valor_multa" not in df.columns and "val_auto_infracao" in df.columns:
-    df["valor_multa"] = df["val_auto_infracao"].astype(str).apply(lambda s: s.replace(".", "").replace(",", "."))
-    df["valor_multa"] = pd.to_numeric(df["valor_multa"], errors="coerce")
-elif "valor_multa" in df.columns:
-    df["valor_multa"] = pd.to_numeric(df["valor_multa"], errors="coerce")
-else:
-    df["valor_multa"] = pd.NA
-
-# pred_risco fallback by quantiles
-if "pred_risco" not in df.columns:
-    try:
-        q1 = df["valor_multa"].quantile(0.25)
-        q3 = df["valor_multa"].quantile(0.75)
-        def proxy(v):
-            try:
-                if pd.isna(v): return 1
-                if v < q1: return 0
-                if v >= q3: return 2
-                return 1
-            except:
-                return 1
-        df["pred_risco"] = df["valor_multa"].apply(proxy).astype(int)
-    except Exception:
-        df["pred_risco"] = 1
-else:
-    df["pred_risco"] = pd.to_numeric(df["pred_risco"], errors="coerce").fillna(1).astype(int)
-
-# iso_flag fallback
-if "iso_flag" in df.columns:
-    df["iso_flag"] = df["iso_flag"].astype(bool)
-else:
-    df["iso_flag"] = False
-
-# date handling
-date_col = None
-for c in ["dat_hora_auto_infracao","dt_fato_infracional","dt_lancamento"]:
-    if c in df.columns:
-        date_col = c
-        break
-if date_col:
-    df[date_col] = pd.to_datetime(df[date_col], errors="coerce")
-    df["year_month"] = df[date_col].dt.to_period("M").astype(str)
-else:
-    df["year_month"] = "unknown"
-
-# sample reduce
-MAX_ROWS = 50000
-if len(df) > MAX_ROWS:
-    df_small = df.sample(n=MAX_ROWS, random_state=42).reset_index(drop=True)
-else:
-    df_small = df.reset_index(drop=True)
-
-# robust points (safe keys)
-name_cols = [c for c in ["nome_infrator","nome","infrator","nome_responsavel"] if c in df_small.columns]
-name_col = name_cols[0] if name_cols else None
-
-points = []
-for _, r in df_small.iterrows():
-    rec = {
-        "seq_auto_infracao": r.get("seq_auto_infracao",""),
-        "nome_infrator": r.get(name_col,"") if name_col else "",
-        "municipio": r.get("municipio",""),
-        "uf": r.get("uf",""),
-        "valor_multa": float(r.get("valor_multa", 0)) if pd.notna(r.get("valor_multa", None)) else "",
-        "pred_risco": int(r.get("pred_risco",1)) if pd.notna(r.get("pred_risco", None)) else 1,
-        "iso_flag": bool(r.get("iso_flag", False)),
-        "lat": float(r.get("lat")) if pd.notna(r.get("lat", None)) else None,
-        "lon": float(r.get("lon")) if pd.notna(r.get("lon", None)) else None,
-        "des_infracao": str(r.get("des_infracao","")),
-        "year_month": r.get("year_month","")
-    }
-    points.append(rec)
-
-# timeseries
-if "year_month" in df.columns:
-    ts = df.groupby("year_month").size().reset_index(name="count").sort_values("year_month")
-    ts_list = ts.to_dict(orient="records")
-else:
-    ts_list = []
-
-# top municipalities
-if ("municipio" in df.columns) or ("uf" in df.columns):
-    agg = df.groupby(["uf","municipio"], dropna=False).agg(
-        qtd_autuacoes = ("seq_auto_infracao","count") if "seq_auto_infracao" in df.columns else ("municipio","size"),
-        soma_multas = ("valor_multa","sum") if "valor_multa" in df.columns else ("seq_auto_infracao","count")
-    ).reset_index()
-    top_mun = agg.sort_values("qtd_autuacoes", ascending=False).head(15).to_dict(orient="records")
-else:
-    top_mun = []
-
-# alerts
-alerts = [p for p in points if p.get("iso_flag")]
-
-# Convert to JSON for injection
-POINTS_JSON = json.dumps(points, ensure_ascii=False)
-TS_JSON = json.dumps(ts_list, ensure_ascii=False)
-TOP_JSON = json.dumps(top_mun, ensure_ascii=False)
-ALERTS_JSON = json.dumps(alerts, ensure_ascii=False)
+@timed()
+def normalize(df):
+    """Colunas usadas pelo dashboard com os tipos certos; tudo vetorizado."""
+    df.columns = [c.strip().lower().replace(" ", "_") for c in df.columns]
+
+    # ensure lat/lon
+    for col, raw in (("lat", "num_latitude_auto"), ("lon", "num_longitude_auto")):
+        src = raw if raw in df.columns else col
+        df[col] = pd.to_numeric(df[src], errors="coerce").astype(float) if src in df.columns else np.nan
+
+    # valor_multa normalization
+    if "valor_multa" not in df.columns and "val_auto_infracao" in df.columns:
+        df["valor_multa"], bad = parse_valor_series(df["val_auto_infracao"])
+        if bad:
+            print(f"val_auto_infracao: {bad} valores não reconhecidos")
+    elif "valor_multa" in df.columns:
+        df["valor_multa"] = pd.to_numeric(df["valor_multa"], errors="coerce").astype(float)
+    else:
+        df["valor_multa"] = np.nan
+
+    # pred_risco fallback by quantiles (sem valor: risco médio)
+    if "pred_risco" not in df.columns:
+        v = df["valor_multa"].to_numpy()
+        q1, q3 = df["valor_multa"].quantile(0.25), df["valor_multa"].quantile(0.75)
+        df["pred_risco"] = np.where(v < q1, 0, np.where(v >= q3, 2, 1)).astype(np.int8)
+    else:
+        df["pred_risco"] = pd.to_numeric(df["pred_risco"], errors="coerce").fillna(1).astype(np.int8)
+
+    # iso_flag fallback
+    df["iso_flag"] = df["iso_flag"].fillna(False).astype(bool) if "iso_flag" in df.columns else False
+
+    # date handling
+    date_col = next((c for c in DATE_COLUMNS if c in df.columns), None)
+    if date_col:
+        df[date_col], bad = parse_dates_series(df[date_col])
+        if bad:
+            print(f"{date_col}: {bad} datas não reconhecidas")
+        dt = df[date_col]
+        # AAAA-MM montado a partir de inteiros, sem Period por linha
+        ym = (dt.dt.year * 100 + dt.dt.month).astype("Int64")
+        codes, uniques = pd.factorize(ym, sort=True)
+        labels = np.array([f"{u // 100:04d}-{u % 100:02d}" for u in uniques] + ["NaT"], dtype=object)
+        df["year_month"] = pd.Categorical.from_codes(np.where(codes < 0, len(uniques), codes),
+                                                     categories=pd.Index(labels).unique())
+    else:
+        df["year_month"] = "unknown"
+    return df
+
+def _json_values(s, decimals=None):
+    # Series -> array JSON pelo serializador em C do pandas (NaN/None viram null)
+    if decimals is not None:
+        return s.round(decimals).to_json(orient="values", double_precision=max(decimals, 0))
+    return s.to_json(orient="values", force_ascii=False)
+
+def columnar_json(columns):
+    """{nome: array JSON já serializado} -> objeto JSON."""
+    return "{" + ",".join(f"{json.dumps(k)}:{v}" for k, v in columns.items()) + "}"
+
+def _dictionary(s):
+    """(códigos JSON, valores JSON): cada valor distinto aparece uma vez; nulo vira -1."""
+    codes, uniques = pd.factorize(s)
+    return json.dumps(codes.tolist()), _json_values(pd.Series(uniques, dtype=object).astype(str))
+
+def sample_points(df, max_rows=MAX_ROWS):
+    if max_rows and len(df) > max_rows:
+        df = df.sample(n=max_rows, random_state=42)
+    return df.reset_index(drop=True)
+
+def grid_cells(lat, lon, level):
+    """(ix, iy, válido) da célula de cada ponto no nível de zoom `level`."""
+    size = GRID_CELL_DEG / 2 ** level
+    ok = np.isfinite(lat) & np.isfinite(lon) & (np.abs(lat) <= 90) & (np.abs(lon) <= 180)
+    ix = np.floor((np.where(ok, lon, 0) + 180) / size).astype(np.int64)
+    iy = np.floor((np.where(ok, lat, 0) + 90) / size).astype(np.int64)
+    return ix, iy, ok
+
+@timed()
+def build_grid(df, levels=GRID_LEVELS, coord_decimals=COORD_DECIMALS, money_decimals=MONEY_DECIMALS):
+    """
+    Agregados por célula em cada nível (de todas as linhas, sem amostra): nº de
+    autuações, soma das multas, risco máximo, anomalias e centroide.
+    """
+    lat, lon = df["lat"].to_numpy(dtype=float), df["lon"].to_numpy(dtype=float)
+    scale = 10 ** coord_decimals
+    out = {}
+    for level in levels:
+        ix, iy, ok = grid_cells(lat, lon, level)
+        cells = pd.DataFrame({"ix": ix[ok], "iy": iy[ok], "lat": lat[ok], "lon": lon[ok],
+                              "valor": df["valor_multa"].to_numpy(dtype=float)[ok],
+                              "risco": df["pred_risco"].to_numpy()[ok], "anom": df["iso_flag"].to_numpy()[ok]})
+        agg = cells.groupby(["ix", "iy"], sort=False).agg(
+            n=("risco", "size"), soma=("valor", "sum"), risco=("risco", "max"), anom=("anom", "sum"),
+            lat=("lat", "mean"), lon=("lon", "mean"))
+        out[str(level)] = columnar_json({
+            "lat": _json_values(agg["lat"] * scale, 0), "lon": _json_values(agg["lon"] * scale, 0),
+            "n": _json_values(agg["n"]), "soma": _json_values(agg["soma"], money_decimals),
+            "risco": _json_values(agg["risco"].astype(int)), "anom": _json_values(agg["anom"].astype(int)),
+        })
+    return columnar_json({"cell_deg": json.dumps(GRID_CELL_DEG), "levels": columnar_json(out)})
+
+@timed()
+def index_points(df, level=GRID_LEVELS[-1]):
+    """
+    Ordena os pontos pela célula do nível mais fino e retorna (df ordenado, índice):
+    os pontos da célula k são as linhas start[k]:start[k + 1]. Sem coordenada ficam no fim.
+    """
+    ix, iy, ok = grid_cells(df["lat"].to_numpy(dtype=float), df["lon"].to_numpy(dtype=float), level)
+    ncols = int(360 / (GRID_CELL_DEG / 2 ** level)) + 1
+    key = np.where(ok, iy * ncols + ix, np.iinfo(np.int64).max)
+    order = np.argsort(key, kind="stable")
+    df, key = df.iloc[order].reset_index(drop=True), key[order]
+    n_ok = int(ok.sum())
+    keys, start = np.unique(key[:n_ok], return_index=True)
+    index = columnar_json({"level": str(level), "ix": json.dumps((keys % ncols).tolist()),
+                           "iy": json.dumps((keys // ncols).tolist()),
+                           "start": json.dumps(start.tolist() + [n_ok])})
+    return df, index
+
+@timed()
+def build_points(df, coord_decimals=COORD_DECIMALS, money_decimals=MONEY_DECIMALS, desc_chars=DESC_CHARS):
+    """
+    Pontos do mapa como arrays paralelos e índices (nesses arrays) das anomalias.
+    Textos repetidos (uf, município, infrator, descrição, mês) vão como códigos num
+    dicionário; lat/lon como inteiros (graus * 10^coord_decimals).
+    """
+
+    name_col = next((c for c in NAME_COLUMNS if c in df.columns), None)
+
+    def text(c):
+        if c is None or c not in df.columns:
+            return pd.Series(None, index=df.index, dtype=object)
+        return df[c]
+
+    desc = text("des_infracao")
+    if desc_chars:
+        desc = desc.astype(object).where(desc.isna(), desc.astype(str).str.slice(0, desc_chars))
+
+    columns, dictionary = {}, {}
+    for name, values in (("uf", text("uf")), ("municipio", text("municipio")), ("nome_infrator", text(name_col)),
+                         ("des_infracao", desc), ("year_month", df["year_month"])):
+        columns[name], dictionary[name] = _dictionary(values)
+
+    scale = 10 ** coord_decimals
+    for c in ("lat", "lon"):
+        columns[c] = _json_values(pd.Series(df[c].to_numpy() * scale), 0)
+    columns["valor_multa"] = _json_values(df["valor_multa"], money_decimals)
+    columns["pred_risco"] = _json_values(df["pred_risco"].astype(int))
+    columns["iso_flag"] = _json_values(df["iso_flag"].astype(np.int8))
+    seq = text("seq_auto_infracao")
+    columns["seq_auto_infracao"] = _json_values(seq.astype(object).where(seq.notna(), "").astype(str))
+    columns["dict"] = columnar_json(dictionary)
+    columns["coord_scale"] = str(scale)
+    columns["n"] = str(len(df))
+
+    alerts = np.flatnonzero(df["iso_flag"].to_numpy())
+    return columnar_json(columns), alerts, len(df)
+
+def legacy_points_json(df):
+    """Pontos no formato antigo (um objeto JSON por linha), só para o relatório de tamanho."""
+    name_col = next((c for c in NAME_COLUMNS if c in df.columns), None)
+    cols = {"seq_auto_infracao": "seq_auto_infracao", name_col: "nome_infrator", "municipio": "municipio",
+            "uf": "uf", "valor_multa": "valor_multa", "pred_risco": "pred_risco", "iso_flag": "iso_flag",
+            "lat": "lat", "lon": "lon", "des_infracao": "des_infracao", "year_month": "year_month"}
+    legacy = df[[c for c in cols if c in df.columns]].rename(columns=cols)
+    points = legacy.to_json(orient="records", force_ascii=False)
+    alerts = legacy[legacy["iso_flag"]].to_json(orient="records", force_ascii=False)
+    return points, alerts
+
+@timed()
+def build_timeseries(df, cube=None, uf=None):
+    if cube is not None:
+        ts = cube_store.rollup(cube, ["year_month"], uf).set_index("year_month")["qtd_autuacoes"]
+        ts = ts[ts.index.astype(str) != ""]
+    else:
+        ts = df.groupby("year_month", observed=True).size()
+    ts = ts[ts.index.astype(str) != "NaT"].sort_index()
+    return columnar_json({"year_month": json.dumps(ts.index.astype(str).tolist()),
+                          "count": json.dumps(ts.to_numpy().tolist())})
+
+@timed()
+def build_top_municipios(df, n=15, money_decimals=MONEY_DECIMALS, cube=None, uf=None):
+    if cube is not None:
+        agg = cube_store.rollup(cube, ["uf", "municipio"], uf)
+    elif "municipio" not in df.columns and "uf" not in df.columns:
+        return columnar_json({"municipio": "[]", "uf": "[]", "qtd_autuacoes": "[]", "soma_multas": "[]"})
+    else:
+        for c in ("uf", "municipio"):
+            if c not in df.columns:
+                df[c] = ""
+        agg = df.groupby(["uf", "municipio"], dropna=False, observed=True).agg(
+            qtd_autuacoes=("uf", "size"), soma_multas=("valor_multa", "sum")
+        ).reset_index()
+    top = agg.sort_values("qtd_autuacoes", ascending=False).head(n)
+    return columnar_json({
+        "municipio": _json_values(top["municipio"].astype(str)),
+        "uf": _json_values(top["uf"].astype(str)),
+        "qtd_autuacoes": _json_values(top["qtd_autuacoes"]),
+        "soma_multas": _json_values(top["soma_multas"], money_decimals),
+    })
+
+def _script_safe(s):
+    # um "</script>" dentro de des_infracao fecharia a tag
+    return s.replace("</", "<\\/")
+
+def build_payload(points_json, ts_json, top_json, alerts, grid_json, index_json):
+    return columnar_json({"points": points_json, "ts": ts_json, "top_mun": top_json,
+                          "alerts": json.dumps(alerts.tolist()), "grid": grid_json, "index": index_json})
+
+@timed()
+def data_script(payload, mode="json", out=OUT_HTML):
+    """
+    <script> que define loadData() (Promise com o payload) e, no modo "arquivo", o
+    arquivo ao lado do html. Retorna (html do script, caminho do arquivo ou None).
+    """
+    if mode == "json":
+        return ("<script>\nconst RAW = " + _script_safe(payload) + ";\n"
+                "function loadData() { return Promise.resolve(RAW); }\n</script>"), None
+    if mode == "gzip":
+        b64 = base64.b64encode(gzip.compress(payload.encode("utf-8"), compresslevel=9)).decode("ascii")
+        return ("<script>\nconst RAW_GZ = \"" + b64 + "\";\n"
+                "async function loadData() {\n"
+                "  const bytes = Uint8Array.from(atob(RAW_GZ), c => c.charCodeAt(0));\n"
+                "  const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('gzip'));\n"
+                "  return JSON.parse(await new Response(stream).text());\n"
+                "}\n</script>"), None
+    if mode == "arquivo":
+        # .js e não .json: o navegador bloqueia fetch() de arquivos locais (file://)
+        sidecar = os.path.splitext(out)[0] + "_data.js"
+        with open(sidecar, "w", encoding="utf-8") as f:
+            f.write("window.DASHBOARD_DATA = " + payload + ";\n")
+        name = os.path.basename(sidecar)
+        return (f'<script src="{name}"></script>\n<script>\n'
+                "function loadData() { return Promise.resolve(window.DASHBOARD_DATA); }\n</script>"), sidecar
+    raise ValueError(f"formato de payload desconhecido: {mode} (use um de {PAYLOAD_MODES})")
 
 # HTML template using str.format with placeholders (no f-string)
-html_template = """
+HTML_TEMPLATE = """
 <!doctype html>
 <html>
 <head>
@@ -207,100 +383,185 @@ html_template = """
   <h2>Tendência temporal — Autuações por mês</h2>
   <div id="timeseries" style="height:320px;"></div>
 
+{data_script}
 <script>
-const points = {points_json};
-const ts = {ts_json};
-const top_mun = {top_json};
-const alerts = {alerts_json};
-
 function riskLabel(r){{
   if(r===0) return '<span class="badge-low">Baixo</span>';
   if(r===1) return '<span class="badge-med">Médio</span>';
   return '<span class="badge-high">Alto</span>';
 }}
-
-// alerts table
-const alertsBody = document.getElementById("alerts_body");
-if(alerts.length===0){{
-  alertsBody.innerHTML = '<tr><td colspan="6">Nenhuma anomalia detectada na amostra</td></tr>';
-}} else {{
-  alerts.forEach(a => {{
-    const tr = document.createElement("tr");
-    tr.innerHTML = `<td>${{a.seq_auto_infracao}}</td><td>${{a.nome_infrator}}</td><td>${{a.municipio}}</td><td>${{a.uf}}</td><td>${{a.valor_multa}}</td><td>${{riskLabel(a.pred_risco)}}</td>`;
-    alertsBody.appendChild(tr);
-  }});
+function money(v){{ return v===null ? '' : v; }}
+function colorByRisk(r) {{
+  if(r===0) return 'green';
+  if(r===1) return 'orange';
+  return 'red';
 }}
 
-// bar chart
-const barData = [{{
-  x: top_mun.map(r=>r.municipio + " ("+r.uf+")"),
-  y: top_mun.map(r=>r.qtd_autuacoes),
-  type: 'bar'
-}}];
-const barLayout = {{ margin: {{t:30,l:40,r:20,b:150}}, height: 400 }};
-Plotly.newPlot('bar', barData, barLayout);
-
-// timeseries
-const timesX = ts.map(r=>r.year_month);
-const timesY = ts.map(r=>r.count);
-const lineData = [{{
-  x: timesX,
-  y: timesY,
-  type:'scatter',
-  mode:'lines+markers',
-  name:'Autuações'
-}}];
-const lineLayout = {{ margin: {{t:30,l:40,r:20,b:40}}, height:320 }};
-Plotly.newPlot('timeseries', lineData, lineLayout);
-
-// Leaflet map
+// mapa e gráficos aparecem antes dos dados; os pontos entram quando o payload é decodificado
 const map = L.map('map').setView([ -15.0, -55.0 ], 4);
 L.tileLayer('https://{{s}}.tile.openstreetmap.org/{{z}}/{{x}}/{{y}}.png', {{
   maxZoom: 18,
   attribution: '© OpenStreetMap'
 }}).addTo(map);
 
-function colorByRisk(r) {{
-  if(r===0) return 'green';
-  if(r===1) return 'orange';
-  return 'red';
-}}
-
-points.forEach(p => {{
-  try {{
-    const lat = parseFloat(p.lat);
-    const lon = parseFloat(p.lon);
-    if(!isFinite(lat) || !isFinite(lon)) return;
-    const marker = L.circleMarker([lat, lon], {{
-      radius: p.iso_flag ? 7 : 5,
-      color: colorByRisk(p.pred_risco),
-      fillOpacity: 0.8
-    }}).addTo(map);
-    const popup = `<b>Empresa:</b> ${{p.nome_infrator}}<br><b>Mun:</b> ${{p.municipio}}/${{p.uf}}<br><b>Valor:</b> R$ ${{p.valor_multa}}<br><b>Risco:</b> ${{p.pred_risco}}<br><b>Descrição:</b> ${{(p.des_infracao||'').substring(0,200)}}`;
-    marker.bindPopup(popup);
-  }} catch(e){{console.warn(e)}}
+loadData().then(D => {{
+  // P.uf[i] é um código em P.dict.uf; lat/lon são inteiros (graus * P.coord_scale)
+  const P = D.points, N = P.n, S = P.coord_scale;
+  const txt = (name, i) => {{ const c = P[name][i]; return c < 0 ? '' : P.dict[name][c]; }};
+
+  // alerts table
+  const alertsBody = document.getElementById("alerts_body");
+  if(D.alerts.length===0){{
+    alertsBody.innerHTML = '<tr><td colspan="6">Nenhuma anomalia detectada na amostra</td></tr>';
+  }} else {{
+    alertsBody.innerHTML = D.alerts.map(i => `<tr><td>${{P.seq_auto_infracao[i]}}</td><td>${{txt('nome_infrator', i)}}</td><td>${{txt('municipio', i)}}</td><td>${{txt('uf', i)}}</td><td>${{money(P.valor_multa[i])}}</td><td>${{riskLabel(P.pred_risco[i])}}</td></tr>`).join("");
+  }}
+
+  // bar chart
+  const top_mun = D.top_mun;
+  Plotly.newPlot('bar', [{{
+    x: top_mun.municipio.map((m, i) => m + " ("+top_mun.uf[i]+")"),
+    y: top_mun.qtd_autuacoes,
+    type: 'bar'
+  }}], {{ margin: {{t:30,l:40,r:20,b:150}}, height: 400 }});
+
+  // timeseries
+  Plotly.newPlot('timeseries', [{{
+    x: D.ts.year_month,
+    y: D.ts.count,
+    type:'scatter',
+    mode:'lines+markers',
+    name:'Autuações'
+  }}], {{ margin: {{t:30,l:40,r:20,b:40}}, height:320 }});
+
+  // Leaflet map: agregados por célula; pontos individuais só com zoom alto
+  const G = D.grid, IX = D.index, levels = Object.keys(G.levels).map(Number).sort((a, b) => a - b);
+  const layer = L.layerGroup().addTo(map);
+  const DETAIL_ZOOM = {detail_zoom}, MAX_MARKERS = {max_markers};
+
+  function drawCells(level, b) {{
+    const C = G.levels[level];
+    for(let k = 0; k < C.n.length; k++){{
+      const lat = C.lat[k] / S, lon = C.lon[k] / S;
+      if(!b.contains([lat, lon])) continue;
+      L.circleMarker([lat, lon], {{
+        radius: 4 + 3 * Math.log10(1 + C.n[k]),
+        color: colorByRisk(C.risco[k]),
+        weight: C.anom[k] > 0 ? 3 : 1,
+        fillOpacity: 0.5
+      }}).bindPopup(() => `<b>${{C.n[k]}}</b> autuações<br><b>Multas:</b> R$ ${{money(C.soma[k])}}<br><b>Anomalias:</b> ${{C.anom[k]}}<br><b>Risco máx.:</b> ${{C.risco[k]}}`)
+        .addTo(layer);
+    }}
+  }}
+
+  function drawPoints(b) {{
+    // células do índice (nível mais fino) que cruzam a área visível
+    const size = G.cell_deg / Math.pow(2, IX.level), ranges = [];
+    let total = 0;
+    for(let k = 0; k < IX.ix.length; k++){{
+      const lon0 = IX.ix[k] * size - 180, lat0 = IX.iy[k] * size - 90;
+      if(lon0 > b.getEast() || lon0 + size < b.getWest() || lat0 > b.getNorth() || lat0 + size < b.getSouth()) continue;
+      ranges.push([IX.start[k], IX.start[k + 1]]);
+      total += IX.start[k + 1] - IX.start[k];
+    }}
+    if(total > MAX_MARKERS) return false;
+    ranges.forEach(([s, e]) => {{
+      for(let i = s; i < e; i++){{
+        L.circleMarker([P.lat[i] / S, P.lon[i] / S], {{
+          radius: P.iso_flag[i] ? 7 : 5,
+          color: colorByRisk(P.pred_risco[i]),
+          fillOpacity: 0.8
+        }}).bindPopup(() => `<b>Empresa:</b> ${{txt('nome_infrator', i)}}<br><b>Mun:</b> ${{txt('municipio', i)}}/${{txt('uf', i)}}<br><b>Valor:</b> R$ ${{money(P.valor_multa[i])}}<br><b>Risco:</b> ${{P.pred_risco[i]}}<br><b>Descrição:</b> ${{txt('des_infracao', i)}}`)
+          .addTo(layer);
+      }}
+    }});
+    return true;
+  }}
+
+  function redraw() {{
+    layer.clearLayers();
+    const z = map.getZoom(), b = map.getBounds().pad(0.2);
+    if(z >= DETAIL_ZOOM && drawPoints(b)) return;
+    // nível mais fino que não passa do zoom atual
+    const level = levels.filter(l => l <= z).pop() ?? levels[0];
+    drawCells(level, b);
+  }}
+  map.on('moveend', redraw);
+
+  // enquadra pelas células do nível mais grosso
+  const C0 = G.levels[levels[0]];
+  const coords = C0.lat.map((v, k) => [v / S, C0.lon[k] / S]);
+  if(coords.length>0){{
+    map.fitBounds(coords, {{maxZoom:10}});
+  }}
+  redraw();
 }});
 
-const coords = points.filter(p=>p.lat && p.lon).map(p=>[p.lat,p.lon]);
-if(coords.length>0){{
-  map.fitBounds(coords, {{maxZoom:10}});
-}}
-
 </script>
 </body>
 </html>
 """
 
-html_out = html_template.format(
-    gen_time = datetime.utcnow().isoformat(),
-    points_json = POINTS_JSON,
-    ts_json = TS_JSON,
-    top_json = TOP_JSON,
-    alerts_json = ALERTS_JSON
-)
-
-with open(OUT_HTML, "w", encoding="utf-8") as f:
-    f.write(html_out)
-
-print("Gerado:", OUT_HTML)
-print("Abra o arquivo no navegador (duplo-clique).")
+@timed()
+def render(data_html):
+    return HTML_TEMPLATE.format(gen_time=datetime.utcnow().isoformat(), data_script=data_html,
+                                detail_zoom=DETAIL_ZOOM, max_markers=MAX_MARKERS)
+
+def size_report(pts, payload, html_out):
+    """Compara o payload compacto com o formato antigo (objetos por linha): bytes e json.loads."""
+    pts, alerts = legacy_points_json(pts)
+    legacy = "[" + pts + "," + alerts + "]"
+    gz = gzip.compress(payload.encode("utf-8"))
+    rows = [("antigo (objetos por linha)", len(legacy.encode("utf-8")), legacy),
+            ("colunar + dicionários", len(payload.encode("utf-8")), payload)]
+    print("Payload:")
+    for name, size, text in rows:
+        t0 = time.perf_counter()
+        json.loads(text)
+        print(f"  {name:28s} {size / 1024 ** 2:7.2f} MB  parse {1000 * (time.perf_counter() - t0):7.1f} ms")
+    print(f"  {'colunar, gzip':28s} {len(gz) / 1024 ** 2:7.2f} MB  (base64: {4 * -(-len(gz) // 3) / 1024 ** 2:.2f} MB)")
+    print(f"  html gerado: {len(html_out.encode('utf-8')) / 1024 ** 2:.2f} MB")
+
+def main(uf=None, date_from=None, date_to=None, max_rows=MAX_ROWS, coord_decimals=COORD_DECIMALS,
+         money_decimals=MONEY_DECIMALS, desc_chars=DESC_CHARS, mode="json", report=False, out=OUT_HTML):
+    # o tempo de cada etapa vem do @timed das funções (INSTRUMENTAR=1 python src/generate_dashboard.py)
+    df = read_sample(uf=uf, date_from=date_from, date_to=date_to)
+    df = normalize(df)
+    grid_json = build_grid(df, GRID_LEVELS, coord_decimals, money_decimals)
+    pts, index_json = index_points(sample_points(df, max_rows))
+    points_json, alerts, n_points = build_points(pts, coord_decimals, money_decimals, desc_chars)
+    # o cubo tem granularidade de mês: com filtro de data os agregados saem das linhas
+    cube = cube_store.load() if date_from is None and date_to is None else None
+    if cube is not None:
+        print("Série temporal e ranking a partir do cubo:", cube_store.CUBE_PATH)
+    ts_json = build_timeseries(df, cube, uf)
+    top_json = build_top_municipios(df, money_decimals=money_decimals, cube=cube, uf=uf)
+    payload = build_payload(points_json, ts_json, top_json, alerts, grid_json, index_json)
+    data_html, sidecar = data_script(payload, mode, out)
+    html_out = render(data_html)
+    with open(out, "w", encoding="utf-8") as f:
+        f.write(html_out)
+
+    print(f"{len(df)} linhas, {n_points} pontos no mapa, {len(alerts)} alertas")
+    if report:
+        size_report(pts, payload, html_out)
+    print(f"Gerado: {out} ({os.path.getsize(out) / 1024 ** 2:.1f} MB)")
+    if sidecar:
+        print(f"Dados em: {sidecar} ({os.path.getsize(sidecar) / 1024 ** 2:.1f} MB), mantenha ao lado do html")
+    print("Abra o arquivo no navegador (duplo-clique).")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera dashboard.html")
+    parser.add_argument("--uf", nargs="+", help="mostra só estas UFs")
+    parser.add_argument("--desde", help="data inicial (AAAA-MM-DD)")
+    parser.add_argument("--ate", help="data final (AAAA-MM-DD)")
+    parser.add_argument("--max-pontos", type=int, default=MAX_ROWS, help="pontos individuais no mapa (0 = todos); a grade usa todas as linhas")
+    parser.add_argument("--casas-coord", type=int, default=COORD_DECIMALS, help="casas decimais de lat/lon")
+    parser.add_argument("--casas-valor", type=int, default=MONEY_DECIMALS, help="casas decimais dos valores em R$")
+    parser.add_argument("--max-descricao", type=int, default=DESC_CHARS, help="caracteres de des_infracao (0 = tudo)")
+    parser.add_argument("--payload", choices=PAYLOAD_MODES, default="json",
+                        help="json embutido, gzip+base64 embutido, ou arquivo dashboard_data.js ao lado")
+    parser.add_argument("--relatorio", action="store_true", help="compara tamanho e parse com o formato antigo")
+    args = parser.parse_args()
+    main(args.uf, args.desde, args.ate, args.max_pontos, args.casas_coord, args.casas_valor,
+         args.max_descricao, args.payload, args.relatorio)
@@ -0,0 +1,258 @@
+# src/infractors.py
+"""
+Índice de infratores (data/processed/infratores/).
+
+Chave do infrator (coluna infrator_id do clean_autuacoes.parquet), na ordem:
+ - "CNPJ:<raiz>": CNPJ com dígitos verificadores válidos; filiais (0001, 0002, ...)
+   da mesma empresa caem na raiz de 8 dígitos
+ - "CPF:<11 dígitos>": CPF válido
+ - "DOC:<dígitos>": documento preenchido que não passa na validação (mascarado,
+   truncado...), só sem a pontuação
+ - "PESSOA:<num_pessoa_infrator>" e "NOME:<nome normalizado>" quando não há documento
+Sem nenhum deles o infrator fica nulo e não entra no histórico. Pontuação, espaços e
+zeros à esquerda perdidos (documento lido como número) não separam mais o mesmo
+infrator.
+
+O índice guarda ids densos int32 (a ordem das chaves), e as autuações de cada
+infrator ordenadas por data num único array de eventos, com offsets por id:
+ - histórico de um infrator: fatia events[offsets[i]:offsets[i + 1]], O(1)
+ - autuações numa janela de datas: duas buscas binárias na fatia, O(log n)
+ - ranking de reincidentes num período: as mesmas buscas para todos os ids de uma vez
+
+Arrays em .npy (abertos com mmap), chaves e resumo por infrator em infratores.parquet.
+
+Uso:
+    python src/infractors.py --top 20 --desde 2023-01-01
+    python src/infractors.py --infrator 12.345.678/0001-90
+"""
+import os
+import json
+import argparse
+import numpy as np
+import pandas as pd
+from data_access import upper_bound
+
+BASE = os.getcwd()
+PROC_DIR = os.path.join(BASE, "data", "processed")
+INDEX_DIR = os.path.join(PROC_DIR, "infratores")
+# muda quando a regra da chave muda: o preprocessing refaz tudo (ver incremental_plan)
+KEY_VERSION = 1
+NO_DATE = np.iinfo(np.int64).max
+
+CPF_WEIGHTS = (np.arange(10, 1, -1), np.arange(11, 1, -1))
+CNPJ_WEIGHTS = (np.array([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]), np.array([6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]))
+
+def _digit_matrix(s, width):
+    """Strings de `width` dígitos -> matriz (n, width) de inteiros."""
+    return (np.frombuffer("".join(s).encode("ascii"), dtype=np.uint8).reshape(-1, width) - ord("0")).astype(np.int64)
+
+def valid_check_digits(d, weights):
+    """Linhas de `d` cujos dois últimos dígitos são os verificadores (módulo 11) dos anteriores."""
+    n = d.shape[1] - 2
+    ok = np.ones(len(d), dtype=bool)
+    for k, w in enumerate(weights):
+        r = (d[:, :n + k] * w).sum(axis=1) % 11
+        ok &= d[:, n + k] == np.where(r < 2, 0, 11 - r)
+    # 000.000.000-00, 111.111.111-11... passam no módulo 11 mas não são documentos
+    return ok & (d != d[:, :1]).any(axis=1)
+
+def normalize_documents(values):
+    """Chave (CNPJ:/CPF:/DOC:) de cada documento; None se vazio. Cada valor distinto é tratado uma vez."""
+    values = pd.Series(values)
+    if pd.api.types.is_float_dtype(values):
+        values = values.astype("Int64")
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    digits = pd.Series(uniques, dtype=object).astype(str).str.replace(r"\D", "", regex=True)
+    # "0", "000.000.000-00"...: documento não informado
+    digits = digits.where(digits.str.strip("0") != "", "")
+    size = digits.str.len()
+    keys = pd.Series(np.where(size > 0, "DOC:" + digits, None), dtype=object)
+    # zeros à esquerda somem quando o documento foi lido como número
+    for lo, hi, width, weights, prefix, keep in ((12, 14, 14, CNPJ_WEIGHTS, "CNPJ:", 8),
+                                                 (9, 11, 11, CPF_WEIGHTS, "CPF:", 11)):
+        cand = size.between(lo, hi)
+        if not cand.any():
+            continue
+        d = digits[cand].str.zfill(width)
+        ok = valid_check_digits(_digit_matrix(d, width), weights)
+        keys[d.index[ok]] = prefix + d[ok].str[:keep]
+    out = keys.to_numpy()[codes]
+    out[codes < 0] = None
+    return pd.Series(out, dtype=object)
+
+def normalize_names(values):
+    """Maiúsculas, sem acentos e com espaços simples; None se vazio."""
+    codes, uniques = pd.factorize(pd.Series(values), use_na_sentinel=True)
+    names = (pd.Series(uniques, dtype=object).astype(str).str.normalize("NFKD")
+             .str.encode("ascii", "ignore").str.decode("ascii").str.upper().str.split().str.join(" "))
+    names = names.where(names != "", None)
+    out = names.to_numpy(dtype=object)[codes]
+    out[codes < 0] = None
+    return pd.Series(out, dtype=object)
+
+def infrator_keys(df):
+    """Chave do infrator de cada linha (ver o topo do módulo), alinhada com `df`."""
+    n = len(df)
+    key = (normalize_documents(df["cpf_cnpj_infrator"]) if "cpf_cnpj_infrator" in df.columns
+           else pd.Series([None] * n, dtype=object))
+    if "num_pessoa_infrator" in df.columns:
+        pessoa = df["num_pessoa_infrator"]
+        if pd.api.types.is_float_dtype(pessoa):
+            # lido como número: 123.0 -> 123
+            pessoa = pessoa.astype("Int64")
+        pessoa = pd.Series(pessoa.astype(object).to_numpy(), dtype=object)
+        pessoa = pessoa.where(pessoa.notna() & (pessoa.astype(str).str.strip() != ""))
+        key = key.fillna("PESSOA:" + pessoa.astype(str).str.strip().where(pessoa.notna()))
+    if "nome_infrator" in df.columns:
+        key = key.fillna("NOME:" + normalize_names(df["nome_infrator"]))
+    key.index = df.index
+    return key
+
+class InfractorIndex:
+    """
+    `keys`: chaves ordenadas (id = posição); `offsets`: início de cada id em `t`/`rows`
+    (n_ids + 1 posições); `t`: datas em segundos (NO_DATE para sem data, no fim de cada
+    fatia); `rows`: posição da autuação no clean_autuacoes.parquet; `valor`: multa.
+    """
+    ARRAYS = ("offsets", "t", "rows", "valor")
+
+    def __init__(self, keys, offsets, t, rows, valor):
+        self.keys = np.asarray(keys, dtype=object)
+        self.offsets, self.t, self.rows, self.valor = offsets, t, rows, valor
+
+    @classmethod
+    def build(cls, keys, dates, values=None):
+        """Índice a partir das chaves e datas de cada linha; retorna (índice, id int32 de cada linha, -1 = nulo)."""
+        codes, uniques = pd.factorize(pd.Series(np.asarray(keys, dtype=object)), sort=True, use_na_sentinel=True)
+        ids = codes.astype(np.int32)
+        dates = pd.to_datetime(pd.Series(dates))
+        t = np.where(dates.notna().to_numpy(), dates.to_numpy(dtype="datetime64[s]").astype(np.int64), NO_DATE)
+        rows = np.flatnonzero(ids >= 0)
+        rows = rows[np.lexsort((t[rows], ids[rows]))]
+        offsets = np.zeros(len(uniques) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(ids[rows], minlength=len(uniques)))
+        valor = (np.nan_to_num(np.asarray(values, dtype=np.float64)[rows]) if values is not None
+                 else np.zeros(len(rows)))
+        return cls(np.asarray(uniques, dtype=object), offsets, t[rows], rows.astype(np.int64), valor), ids
+
+    def __len__(self):
+        return len(self.keys)
+
+    def id_of(self, key):
+        """Id da chave (busca binária nas chaves ordenadas); -1 se não existe."""
+        i = int(np.searchsorted(self.keys, key))
+        return i if i < len(self.keys) and self.keys[i] == key else -1
+
+    def events(self, i):
+        """Fatia (datas, linhas) do infrator `i`, em ordem de data."""
+        s = slice(self.offsets[i], self.offsets[i + 1])
+        return self.t[s], self.rows[s]
+
+    def count(self, i, when, days):
+        """Autuações do infrator `i` em [when - days, when)."""
+        if i < 0 or pd.isna(when):
+            return 0
+        t = int(pd.Timestamp(when).timestamp())
+        arr = self.events(i)[0]
+        return int(np.searchsorted(arr, t, "left") - np.searchsorted(arr, t - days * 86400, "left"))
+
+    def window(self, date_from=None, date_to=None):
+        """(autuações, soma das multas) de cada id com data em [date_from, date_to]; date_to sem hora inclui o dia todo."""
+        ids = np.repeat(np.arange(len(self.keys), dtype=np.int64), np.diff(self.offsets))
+        has_date = self.t != NO_DATE
+        tmin = int(self.t[has_date].min()) if has_date.any() else 0
+        span = int(self.t[has_date].max()) - tmin + 2 if has_date.any() else 2
+        # chave composta (id, data) crescente: cada limite vira uma busca binária por id
+        rel = np.where(has_date, self.t - tmin, span - 1)
+        comp = ids * span + rel
+        lo = 0 if date_from is None else min(max(int(pd.Timestamp(date_from).timestamp()) - tmin, 0), span - 1)
+        hi = span - 1
+        if date_to is not None:
+            # mesmo limite do data_access: date_to sem hora vai até a meia-noite seguinte (exclusiva)
+            end, strict = upper_bound(date_to)
+            hi = min(max(int(end.timestamp()) + (0 if strict else 1) - tmin, 0), span - 1)
+        base = np.arange(len(self.keys), dtype=np.int64) * span
+        left = np.searchsorted(comp, base + lo, "left")
+        right = np.searchsorted(comp, base + hi, "left")
+        csum = np.concatenate([[0.0], np.cumsum(self.valor)])
+        return right - left, csum[right] - csum[left]
+
+    def top(self, n=20, date_from=None, date_to=None):
+        """Infratores com mais autuações no período."""
+        counts, sums = self.window(date_from, date_to)
+        best = np.argsort(-counts, kind="stable")[:n]
+        best = best[counts[best] > 0]
+        return pd.DataFrame({"id": best.astype(np.int32), "infrator_id": self.keys[best],
+                             "autuacoes": counts[best], "soma_multas": sums[best]})
+
+    def summary(self):
+        """Uma linha por infrator: chave, autuações, primeira e última data, soma das multas."""
+        n = np.diff(self.offsets)
+        first = self.t[self.offsets[:-1]] if len(self.t) else np.zeros(0, dtype=np.int64)
+        # última data válida: NO_DATE fica no fim da fatia
+        valid = np.add.reduceat((self.t != NO_DATE).astype(np.int64), self.offsets[:-1]) if len(self.t) else n
+        last = self.t[np.maximum(self.offsets[:-1] + valid - 1, 0)] if len(self.t) else first
+        to_date = lambda a, ok: pd.to_datetime(np.where(ok, a, 0), unit="s").where(ok)
+        return pd.DataFrame({"id": np.arange(len(self.keys), dtype=np.int32), "infrator_id": self.keys,
+                             "autuacoes": n.astype(np.int32), "primeira": to_date(first, valid > 0),
+                             "ultima": to_date(last, valid > 0),
+                             "soma_multas": np.add.reduceat(self.valor, self.offsets[:-1]) if len(self.valor) else 0.0})
+
+    def save(self, index_dir=INDEX_DIR):
+        tmp = index_dir + ".tmp"
+        os.makedirs(tmp, exist_ok=True)
+        for name in self.ARRAYS:
+            np.save(os.path.join(tmp, f"{name}.npy"), getattr(self, name))
+        self.summary().to_parquet(os.path.join(tmp, "infratores.parquet"), index=False)
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"versao_chave": KEY_VERSION, "infratores": len(self), "eventos": len(self.rows)}, f)
+        if os.path.isdir(index_dir):
+            for name in os.listdir(index_dir):
+                os.remove(os.path.join(index_dir, name))
+            os.rmdir(index_dir)
+        os.replace(tmp, index_dir)
+        print(f"Índice de infratores salvo: {index_dir} ({len(self)} infratores, {len(self.rows)} autuações)")
+
+    @classmethod
+    def load(cls, index_dir=INDEX_DIR, mmap=True):
+        """Índice gravado pelo preprocessing; None se não existe ou é de outra versão da chave."""
+        meta_path = os.path.join(index_dir, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, encoding="utf-8") as f:
+            if json.load(f).get("versao_chave") != KEY_VERSION:
+                return None
+        arrays = {name: np.load(os.path.join(index_dir, f"{name}.npy"), mmap_mode="r" if mmap else None)
+                  for name in cls.ARRAYS}
+        keys = pd.read_parquet(os.path.join(index_dir, "infratores.parquet"), columns=["infrator_id"])["infrator_id"]
+        return cls(keys.to_numpy(dtype=object), **arrays)
+
+if __name__ == "__main__":
+    import pyarrow.parquet as pq
+    parser = argparse.ArgumentParser(description="Consulta o índice de infratores")
+    parser.add_argument("--top", type=int, default=20, help="infratores com mais autuações no período")
+    parser.add_argument("--desde", help="data inicial (AAAA-MM-DD)")
+    parser.add_argument("--ate", help="data final (AAAA-MM-DD)")
+    parser.add_argument("--infrator", help="CPF/CNPJ (com ou sem pontuação) ou chave: mostra o histórico")
+    args = parser.parse_args()
+    index = InfractorIndex.load()
+    if index is None:
+        raise SystemExit(f"{INDEX_DIR} não encontrado: rode o preprocessing.py")
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        if args.infrator:
+            key = args.infrator if ":" in args.infrator else normalize_documents([args.infrator])[0]
+            i = index.id_of(key)
+            if i < 0:
+                raise SystemExit(f"infrator não encontrado: {key}")
+            _, rows = index.events(i)
+            # só os row groups que têm linhas do infrator saem do disco
+            pf = pq.ParquetFile(os.path.join(PROC_DIR, "clean_autuacoes.parquet"))
+            starts = np.cumsum([0] + [pf.metadata.row_group(g).num_rows for g in range(pf.num_row_groups)])
+            groups = np.unique(np.searchsorted(starts, rows, "right") - 1)
+            table = pf.read_row_groups(groups.tolist(), columns=["seq_auto_infracao", "dat_hora_auto_infracao", "uf",
+                                                                 "municipio", "valor_multa", "gravidade_nivel"])
+            local = np.concatenate([np.arange(starts[g], starts[g + 1]) for g in groups])
+            print(f"{key} (id {i}): {len(rows)} autuações")
+            print(table.take(np.searchsorted(local, rows)).to_pandas().to_string(index=False))
+        else:
+            print(index.top(args.top, args.desde, args.ate).to_string(index=False))
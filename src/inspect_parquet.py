@@ -1,17 +1,177 @@
 # src/inspect_parquet.py
-import pandas as pd
+"""
+Inspeção rápida dos parquets de data/processed, sem carregar os dados.
+
+Linhas, schema, row groups e min/máx/nulos por coluna vêm só dos metadados (rodapé de
+cada arquivo, estatísticas dos row groups); linhas de exemplo, amostra e perfil leem
+só o primeiro row group ou alguns row groups sorteados.
+
+Uso:
+    python src/inspect_parquet.py                          # dataset mais recente
+    python src/inspect_parquet.py --listar                 # todos os parquets de data/processed
+    python src/inspect_parquet.py clean_autuacoes.parquet --estatisticas
+    python src/inspect_parquet.py scored_autuacoes.parquet --amostra 10000 --perfil
+"""
 import os
+import time
+import argparse
+import numpy as np
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from data_access import open_dataset, schema, count_rows, head
+
 p = "data/processed"
-# procura o arquivo parquet mais recente que comece com 'autuacoes_processed'
-files = [os.path.join(p,f) for f in os.listdir(p) if f.startswith("autuacoes_processed") and f.endswith(".parquet")]
-if not files:
-    raise SystemExit("Nenhum arquivo autuacoes_processed*.parquet encontrado em data/processed")
-files = sorted(files)
-latest = files[-1]
-print("Arquivo lido:", latest)
-df = pd.read_parquet(latest)
-print("\nNúmero de linhas, colunas:", df.shape)
-print("\nColunas:")
-print(df.columns.tolist())
-print("\nPrimeiras 5 linhas:")
-print(df.head(5).to_string(index=False))
+dataset_dir = os.path.join(p, "autuacoes_dataset")
+
+def find_latest():
+    if os.path.isdir(dataset_dir):
+        # dataset particionado (uf=/ano=) gerado pelo data_ingestion.py
+        return dataset_dir
+    # procura o arquivo parquet mais recente que comece com 'autuacoes_processed'
+    files = [os.path.join(p,f) for f in os.listdir(p) if f.startswith("autuacoes_processed") and f.endswith(".parquet")]
+    if not files:
+        raise SystemExit("Nenhum arquivo autuacoes_processed*.parquet encontrado em data/processed")
+    return sorted(files)[-1]
+
+def resolve(path):
+    """Aceita caminho completo ou nome relativo a data/processed."""
+    if path is None:
+        return find_latest()
+    if not os.path.exists(path) and os.path.exists(os.path.join(p, path)):
+        return os.path.join(p, path)
+    return path
+
+def parquet_files(path):
+    if os.path.isdir(path):
+        return sorted(os.path.join(d, f) for d, _, fs in os.walk(path) for f in fs if f.endswith(".parquet"))
+    return [path]
+
+def list_processed(root=p):
+    """Um resumo por parquet (ou dataset) de data/processed, só com metadados."""
+    for name in sorted(os.listdir(root)):
+        path = os.path.join(root, name)
+        files = parquet_files(path) if os.path.isdir(path) or name.endswith(".parquet") else []
+        if not files:
+            continue
+        metas = [pq.read_metadata(f) for f in files]
+        size = sum(os.path.getsize(f) for f in files)
+        print(f"{name:40s} {sum(m.num_rows for m in metas):>12,} linhas  {metas[0].num_columns:>4} colunas  "
+              f"{sum(m.num_row_groups for m in metas):>5} row groups  {size / 1024 ** 2:9.1f} MB")
+
+def summary(path):
+    files = parquet_files(path)
+    cols = schema(path).names
+    n_groups = sum(pq.read_metadata(f).num_row_groups for f in files)
+    size = sum(os.path.getsize(f) for f in files)
+    print("Arquivo lido:", path)
+    # linhas e colunas vêm dos metadados; nenhum dado é lido
+    print("\nNúmero de linhas, colunas:", (count_rows(path), len(cols)))
+    print(f"Arquivos: {len(files)} | row groups: {n_groups} | tamanho: {size / 1024 ** 2:.1f} MB")
+    print("\nSchema:")
+    for field in schema(path):
+        print(f"  {field.name:32s} {field.type}")
+
+def column_stats(path):
+    """min, máx e nulos por coluna, combinando as estatísticas de todos os row groups."""
+    stats = {}
+    for f in parquet_files(path):
+        meta = pq.read_metadata(f)
+        for g in range(meta.num_row_groups):
+            rg = meta.row_group(g)
+            for c in range(rg.num_columns):
+                col = rg.column(c)
+                s = stats.setdefault(col.path_in_schema, {"min": None, "max": None, "nulos": 0, "sem_estatistica": 0,
+                                                           "comprimido_mb": 0.0})
+                s["comprimido_mb"] += col.total_compressed_size / 1024 ** 2
+                st = col.statistics
+                if st is None:
+                    s["sem_estatistica"] += 1
+                    continue
+                if st.has_null_count:
+                    s["nulos"] += st.null_count
+                if st.has_min_max:
+                    try:
+                        s["min"] = st.min if s["min"] is None else min(s["min"], st.min)
+                        s["max"] = st.max if s["max"] is None else max(s["max"], st.max)
+                    except TypeError:
+                        pass
+    return stats
+
+def print_stats(stats):
+    print(f"\n{'coluna':32s} {'nulos':>10s} {'MB (comp.)':>10s}  min .. máx")
+    for name, s in stats.items():
+        rng = "-" if s["min"] is None else f"{str(s['min'])[:30]} .. {str(s['max'])[:30]}"
+        extra = f"  ({s['sem_estatistica']} row groups sem estatística)" if s["sem_estatistica"] else ""
+        print(f"{name:32s} {s['nulos']:>10,} {s['comprimido_mb']:>10.2f}  {rng}{extra}")
+
+def row_groups(path):
+    """Um fragmento por row group (as colunas de partição uf=/ano= vêm junto)."""
+    dataset = open_dataset(path)
+    return dataset, [rg for frag in dataset.get_fragments() for rg in frag.split_by_row_group()]
+
+def read_groups(dataset, groups, columns=None):
+    if columns is not None:
+        columns = [c for c in columns if c in dataset.schema.names]
+    sub = ds.FileSystemDataset(groups, dataset.schema, dataset.format, filesystem=dataset.filesystem)
+    return sub.to_table(columns=columns)
+
+def first_row_group(path, columns=None):
+    dataset, groups = row_groups(path)
+    return read_groups(dataset, groups[:1], columns).to_pandas()
+
+def sample_rows(path, n, columns=None, seed=42):
+    """
+    Amostra de ~n linhas: sorteia row groups (peso = nº de linhas) até somar n linhas e
+    sorteia as linhas dentro deles. Só os row groups sorteados são lidos.
+    """
+    rng = np.random.default_rng(seed)
+    dataset, groups = row_groups(path)
+    rows = np.array([g.row_groups[0].num_rows for g in groups], dtype=float)
+    order = rng.choice(len(groups), size=len(groups), replace=False, p=rows / rows.sum())
+    chosen = order[:int(np.searchsorted(np.cumsum(rows[order]), n)) + 1]
+    table = read_groups(dataset, [groups[i] for i in sorted(chosen)], columns)
+    idx = np.sort(rng.choice(table.num_rows, size=min(n, table.num_rows), replace=False))
+    return table.take(idx).to_pandas()
+
+def profile(df, total_rows):
+    """Cardinalidade, nulos e memória por coluna; memória estimada para o arquivo todo."""
+    scale = total_rows / max(len(df), 1)
+    print(f"\nPerfil ({len(df):,} linhas lidas de {total_rows:,}):")
+    print(f"{'coluna':32s} {'dtype':>14s} {'distintos':>10s} {'% nulos':>8s} {'MB lidos':>9s} {'MB estim.':>10s}")
+    mem = df.memory_usage(deep=True, index=False)
+    for c in df.columns:
+        print(f"{c:32s} {str(df[c].dtype):>14s} {df[c].nunique(dropna=True):>10,} "
+              f"{100 * df[c].isna().mean():>7.1f}% {mem[c] / 1024 ** 2:>9.2f} {mem[c] * scale / 1024 ** 2:>10.1f}")
+    print(f"{'total':32s} {'':>14s} {'':>10s} {'':>8s} {mem.sum() / 1024 ** 2:>9.2f} {mem.sum() * scale / 1024 ** 2:>10.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspeciona parquets de data/processed pelos metadados")
+    parser.add_argument("caminho", nargs="?", help="arquivo ou dataset (padrão: o mais recente de autuações)")
+    parser.add_argument("--listar", action="store_true", help="resumo de todos os parquets de data/processed")
+    parser.add_argument("--estatisticas", action="store_true", help="min/máx/nulos por coluna (estatísticas dos row groups)")
+    parser.add_argument("--primeiro-grupo", action="store_true", help="lê o primeiro row group inteiro")
+    parser.add_argument("--amostra", type=int, help="lê ~N linhas de row groups sorteados")
+    parser.add_argument("--perfil", action="store_true", help="cardinalidade e memória por coluna (da amostra ou do 1º row group)")
+    parser.add_argument("--colunas", nargs="+", help="colunas lidas na amostra/perfil")
+    parser.add_argument("--linhas", type=int, default=5, help="linhas de exemplo mostradas")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    if args.listar:
+        list_processed()
+    else:
+        latest = resolve(args.caminho)
+        summary(latest)
+        if args.estatisticas:
+            print_stats(column_stats(latest))
+        if args.amostra:
+            df = sample_rows(latest, args.amostra, args.colunas)
+        elif args.primeiro_grupo or args.perfil:
+            df = first_row_group(latest, args.colunas)
+        else:
+            df = head(latest, args.linhas, args.colunas)
+        print(f"\nPrimeiras {args.linhas} linhas:")
+        print(df.head(args.linhas).to_string(index=False))
+        if args.perfil:
+            profile(df, count_rows(latest))
+    print(f"\n({time.perf_counter() - t0:.2f}s)")
@@ -0,0 +1,175 @@
+# src/instrument.py
+"""
+Instrumentação opcional das etapas do pipeline.
+
+Desligada por padrão: sem a variável de ambiente INSTRUMENTAR, timed() devolve a
+própria função e step() não mede nada. Ligada, cada função decorada (e cada bloco
+`with step(...)`) registra tempo de parede, tempo de CPU, linhas de entrada/saída
+(primeiro argumento e retorno que forem DataFrame, array ou matriz) e memória do
+DataFrame retornado. Os modos vêm separados por vírgula:
+
+    INSTRUMENTAR=1                 tempo, linhas, memória dos DataFrames
+    INSTRUMENTAR=memoria           + pico do tracemalloc em cada etapa (mais lento)
+    INSTRUMENTAR=perfil            + cProfile do processo inteiro
+    INSTRUMENTAR=tudo              tudo acima
+
+No fim do processo ficam em logs/perfil/ (ou em PERFIL_DIR):
+ - <script>-<data>.json: as métricas de cada etapa, na ordem em que começaram
+ - <script>-<data>.prof: o cProfile (pstats) desde o import deste módulo, que abre
+   no snakeviz ou vira flamegraph com o flameprof
+
+Funções rodando em processos de um pool (ingestão e scoring em paralelo) não entram
+no relatório do processo principal, só o tempo total da chamada que espera por elas.
+
+Uso:
+    INSTRUMENTAR=memoria python src/preprocessing.py
+"""
+import os
+import sys
+import json
+import time
+import atexit
+import functools
+import contextlib
+from datetime import datetime
+
+BASE = os.getcwd()
+ENV_VAR = "INSTRUMENTAR"
+OUT_DIR = os.environ.get("PERFIL_DIR") or os.path.join(BASE, "logs", "perfil")
+ALL_MODES = ("tempo", "memoria", "perfil")
+
+def _modes(value):
+    value = (value or "").strip().lower()
+    if value in ("", "0", "nao", "não"):
+        return set()
+    if value in ("1", "sim", "tudo"):
+        return {"tempo"} | ({"memoria", "perfil"} if value == "tudo" else set())
+    return {"tempo"} | {m.strip() for m in value.split(",") if m.strip() in ALL_MODES}
+
+MODES = _modes(os.environ.get(ENV_VAR))
+ENABLED = bool(MODES)
+
+_records = []
+_stack = []
+_session = None
+
+def start():
+    """Abre a sessão (feito no import quando ligada): o cProfile cobre o processo todo."""
+    global _session
+    _session = {"inicio": datetime.now(), "t0": time.perf_counter(), "cpu0": time.process_time()}
+    if "memoria" in MODES:
+        import tracemalloc
+        tracemalloc.start()
+    if "perfil" in MODES:
+        import cProfile
+        _session["profiler"] = cProfile.Profile()
+        _session["profiler"].enable()
+    atexit.register(finish)
+
+def rows_of(obj):
+    """Nº de linhas de um DataFrame/array/matriz (ou do 1º item de uma tupla); None se não der."""
+    if isinstance(obj, tuple) and obj:
+        obj = obj[0]
+    shape = getattr(obj, "shape", None)
+    if shape:
+        return int(shape[0])
+    return None
+
+def frame_mb(obj):
+    if isinstance(obj, tuple) and obj:
+        obj = obj[0]
+    if hasattr(obj, "memory_usage") and hasattr(obj, "columns"):
+        return round(obj.memory_usage(deep=True).sum() / 1024 ** 2, 2)
+    return None
+
+@contextlib.contextmanager
+def step(name, rows_in=None):
+    """
+    Mede um bloco. O dict devolvido aceita `linhas_saida` (e outros campos) preenchidos
+    dentro do bloco.
+    """
+    if not ENABLED:
+        yield {}
+        return
+    rec = {"etapa": name, "nivel": len(_stack), "linhas_entrada": rows_in}
+    if "memoria" in MODES:
+        import tracemalloc
+        cur, peak = tracemalloc.get_traced_memory()
+        # o pico das etapas de fora continua valendo depois do reset
+        for outer in _stack:
+            outer["_peak"] = max(outer["_peak"], peak)
+        tracemalloc.reset_peak()
+        rec["_base"] = rec["_peak"] = cur
+    _records.append(rec)
+    _stack.append(rec)
+    t0, cpu0 = time.perf_counter(), time.process_time()
+    try:
+        yield rec
+    finally:
+        rec["parede_s"] = round(time.perf_counter() - t0, 4)
+        rec["cpu_s"] = round(time.process_time() - cpu0, 4)
+        if "memoria" in MODES:
+            import tracemalloc
+            peak = max(tracemalloc.get_traced_memory()[1], rec.pop("_peak"))
+            rec["pico_tracemalloc_mb"] = round((peak - rec.pop("_base")) / 1024 ** 2, 2)
+            for outer in _stack[:-1]:
+                outer["_peak"] = max(outer["_peak"], peak)
+        _stack.pop()
+
+def timed(name=None):
+    """Decorador: mede cada chamada da função quando a instrumentação está ligada."""
+    def wrap(fn):
+        if not ENABLED:
+            return fn
+        module = fn.__module__
+        if module == "__main__":
+            module = os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0]
+        label = name or f"{module}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            first = args[0] if args else next(iter(kwargs.values()), None)
+            with step(label, rows_of(first)) as rec:
+                result = fn(*args, **kwargs)
+                rec["linhas_saida"] = rows_of(result)
+                rec["saida_mb"] = frame_mb(result)
+            return result
+        return inner
+    return wrap
+
+def summary(records=None):
+    records = _records if records is None else records
+    print(f"\n{'etapa':60s} {'parede s':>9s} {'CPU s':>8s} {'linhas':>12s} {'pico MB':>8s}")
+    for r in records:
+        label = "  " * r["nivel"] + r["etapa"]
+        rows = r.get("linhas_saida") or r.get("linhas_entrada")
+        peak = r.get("pico_tracemalloc_mb")
+        print(f"{label[:60]:60s} {r.get('parede_s', 0):9.3f} {r.get('cpu_s', 0):8.3f} "
+              f"{'' if rows is None else f'{rows:,}':>12s} {'' if peak is None else f'{peak:.1f}':>8s}")
+
+def finish():
+    """Grava o JSON (e o .prof) da execução; chamado no atexit."""
+    global _session
+    if _session is None:
+        return
+    session, _session = _session, None
+    os.makedirs(OUT_DIR, exist_ok=True)
+    script = os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0]
+    stem = os.path.join(OUT_DIR, f"{script}-{session['inicio'].strftime('%Y%m%d-%H%M%S')}")
+    out = {"script": script, "argv": sys.argv[1:], "inicio": session["inicio"].isoformat(timespec="seconds"),
+           "modos": sorted(MODES), "parede_s": round(time.perf_counter() - session["t0"], 4),
+           "cpu_s": round(time.process_time() - session["cpu0"], 4), "etapas": _records}
+    if "profiler" in session:
+        session["profiler"].disable()
+        session["profiler"].dump_stats(stem + ".prof")
+        out["perfil"] = stem + ".prof"
+    if "memoria" in MODES:
+        import tracemalloc
+        tracemalloc.stop()
+    with open(stem + ".json", "w", encoding="utf-8") as f:
+        json.dump(out, f, indent=2, ensure_ascii=False, default=str)
+    summary()
+    print("Métricas de instrumentação:", stem + ".json")
+
+if ENABLED:
+    start()
@@ -0,0 +1,72 @@
+# src/manifest.py
+"""
+Manifesto dos CSVs brutos já ingeridos (data/processed/ingestion_manifest.json).
+
+Para cada arquivo de data/raw guarda caminho, tamanho, mtime, sha256 e número de
+linhas. A ingestão e o preprocessing comparam o estado atual com o manifesto e só
+processam arquivos novos ou alterados.
+"""
+import os
+import json
+import hashlib
+from datetime import datetime
+
+BASE = os.getcwd()
+PROC_DIR = os.path.join(BASE, "data", "processed")
+MANIFEST_PATH = os.path.join(PROC_DIR, "ingestion_manifest.json")
+PREPROCESS_STATE_PATH = os.path.join(PROC_DIR, "preprocess_manifest.json")
+
+def file_hash(path, block=1024 * 1024):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for b in iter(lambda: f.read(block), b""):
+            h.update(b)
+    return h.hexdigest()
+
+def load_manifest(path=MANIFEST_PATH):
+    if not os.path.exists(path):
+        return {"arquivos": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    # grava num temporário e troca: um manifesto truncado faria reprocessar tudo.
+    # Um temporário por processo: dois processos gravando juntos não disputam o mesmo .tmp
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+def fingerprint(path, previous=None):
+    """
+    Tamanho, mtime e sha256 de um arquivo. Se tamanho e mtime batem com `previous`,
+    reaproveita o hash dele em vez de reler o arquivo inteiro.
+    """
+    st = os.stat(path)
+    entry = {"path": path, "size": st.st_size, "mtime": st.st_mtime}
+    if previous and previous.get("size") == st.st_size and previous.get("mtime") == st.st_mtime:
+        entry["sha256"] = previous["sha256"]
+    else:
+        entry["sha256"] = file_hash(path)
+    return entry
+
+def diff_sources(paths, manifest, key_fn):
+    """
+    Compara os arquivos atuais com o manifesto.
+    Retorna (alterados, removidos, fingerprints): `alterados` são os caminhos novos ou
+    com conteúdo diferente, `removidos` as chaves do manifesto que sumiram de data/raw.
+    """
+    known = manifest.get("arquivos", {})
+    changed, prints = [], {}
+    for p in paths:
+        key = key_fn(p)
+        prev = known.get(key)
+        fp = fingerprint(p, prev)
+        prints[key] = fp
+        if prev is None or prev.get("sha256") != fp["sha256"]:
+            changed.append(p)
+    removed = sorted(set(known) - set(prints))
+    return changed, removed, prints
+
+def record(manifest, key, fp, rows):
+    manifest.setdefault("arquivos", {})[key] = dict(fp, rows=int(rows), ingested_at=datetime.now().isoformat())
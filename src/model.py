@@ -9,30 +9,56 @@ Treina 3 modelos:
 Entradas:
  - Usa data/processed/clean_autuacoes.parquet como fonte (gerado pelo preprocessing.py)
 
-Saídas (salvas em /models):
+Saídas (salvas em /models, ver artifacts.py):
  - models/rf_clf.joblib
  - models/rf_reg.joblib
  - models/iso_forest.joblib
  - models/preprocessor.joblib (ColumnTransformer)
+ - models/feature_key.json (chave das features usadas, ver feature_store.py)
+ - models/manifest.json (features, hash dos dados de treino, métricas, tamanhos)
  - metrics_summary.txt (resumo das métricas)
+
+Com --melhores-parametros, classificador e regressor usam os vencedores da busca do
+tuning.py (models/best_params.json), que podem ser HistGradientBoosting*.
 """
 import os
-import joblib
+import json
+import argparse
 import numpy as np
 import pandas as pd
+import scipy.sparse as sp
 from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor, IsolationForest
-from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from sklearn.ensemble import (RandomForestClassifier, RandomForestRegressor, IsolationForest,
+                              HistGradientBoostingClassifier, HistGradientBoostingRegressor)
+from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder, StandardScaler
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
-from sklearn.metrics import classification_report, mean_absolute_error, mean_squared_error
+from sklearn.metrics import classification_report, accuracy_score, f1_score, mean_absolute_error, mean_squared_error
 from math import sqrt
+from datetime import datetime
+from preprocessing import read_clean
+import feature_store
+import artifacts
+from text_features import HashedText, TEXT_COLUMN, N_FEATURES, distinct_texts
+from instrument import timed, step
 
 BASE = os.getcwd()
 PROC_DIR = os.path.join(BASE, "data", "processed")
 MODEL_DIR = os.path.join(BASE, "models")
 os.makedirs(MODEL_DIR, exist_ok=True)
 
+# colunas lidas do clean_autuacoes.parquet (features + alvos); o resto nem sai do disco
+MODEL_COLUMNS = ["dat_hora_auto_infracao", "uf", "municipio", "autuacoes_365d", "gravidade_nivel",
+                 "lat", "lon", "des_infracao", "valor_multa"]
+
+# codificação das categóricas (uf, municipio):
+#  - "esparso": one-hot em matriz esparsa; categorias com menos de MIN_CATEGORY_COUNT
+#    linhas viram uma coluna "infrequente" (municipio tem 5.500+ valores)
+#  - "ordinal": um inteiro por categoria (float32), matriz densa mas estreita
+#  - "denso": one-hot denso (comportamento antigo)
+ENCODINGS = ("esparso", "ordinal", "denso")
+MIN_CATEGORY_COUNT = 20
+
 def find_clean():
     candidates = [os.path.join(PROC_DIR,f) for f in os.listdir(PROC_DIR) if f == "clean_autuacoes.parquet"]
     if not candidates:
@@ -43,51 +69,53 @@ def find_clean():
         return sorted(files)[-1]
     return candidates[0]
 
-def build_target_and_features(df):
-    df = df.copy()
+def risk_class(v, q1, q3):
+    # 0 abaixo do 1º quartil, 2 a partir do 3º, 1 no meio ou sem valor (NaN compara False)
+    v = np.asarray(v, dtype=float)
+    return pd.Series(np.where(v < q1, 0, np.where(v >= q3, 2, 1)), dtype=int)
+
+def target_thresholds(df):
+    """(coluna, q1, q3) que definem as classes de risco: gravidade_nivel se houver dados, senão valor_multa."""
+    col = "valor_multa"
+    if "gravidade_nivel" in df.columns and df["gravidade_nivel"].notna().sum() > 100:
+        y_raw = pd.to_numeric(df["gravidade_nivel"], errors="coerce")
+        if y_raw.notna().sum() >= 50:
+            col = "gravidade_nivel"
+    v = pd.to_numeric(df[col], errors="coerce") if col in df.columns else pd.Series(np.nan, index=df.index)
+    return col, v.quantile(0.25), v.quantile(0.75)
+
+@timed()
+def build_target_and_features(df, thresholds=None, text=False):
+    """
+    `thresholds` fixa as classes de risco (ver target_thresholds); por padrão vêm de `df`.
+    Com `text`, des_infracao entra em X (para o bloco HashedText do preprocessor).
+    """
+    # copia só as colunas usadas, não o DataFrame inteiro
+    df = df[[c for c in MODEL_COLUMNS if c in df.columns]].copy()
 
     if "valor_multa" not in df.columns:
         df["valor_multa"] = np.nan
 
-    if "gravidade_nivel" in df.columns and df["gravidade_nivel"].notna().sum() > 100:
-        y_raw = pd.to_numeric(df["gravidade_nivel"], errors="coerce")
-        if y_raw.notna().sum() < 50:
-            y_raw = None
-    else:
-        y_raw = None
-
-    if y_raw is None:
-        q1 = df["valor_multa"].quantile(0.25)
-        q3 = df["valor_multa"].quantile(0.75)
-        def proxy(v):
-            try:
-                if np.isnan(v):
-                    return 1
-                if v < q1:
-                    return 0
-                if v >= q3:
-                    return 2
-                return 1
-            except:
-                return 1
-        y_cls = df["valor_multa"].apply(proxy).astype(int)
-    else:
-        q1 = y_raw.quantile(0.25)
-        q3 = y_raw.quantile(0.75)
-        def mapg(x):
-            if np.isnan(x): return 1
-            if x < q1: return 0
-            if x >= q3: return 2
-            return 1
-        y_cls = y_raw.apply(mapg).astype(int)
+    col, q1, q3 = thresholds or target_thresholds(df)
+    y_cls = risk_class(pd.to_numeric(df[col], errors="coerce"), q1, q3)
+    y_cls.index = df.index
 
     y_reg = df["valor_multa"].fillna(0.0).astype(float)
 
+    X, df = build_features(df, copy=False, text=text)
+    return X, y_cls, y_reg, df
+
+def build_features(df, copy=True, text=False):
+    """Matriz de features (antes do ColumnTransformer); usada no treino e no scoring."""
+    if copy:
+        df = df.copy()
+
     features = []
 
     if "dat_hora_auto_infracao" in df.columns:
-        df["year"] = pd.to_datetime(df["dat_hora_auto_infracao"], errors="coerce").dt.year
-        df["month"] = pd.to_datetime(df["dat_hora_auto_infracao"], errors="coerce").dt.month
+        dt = pd.to_datetime(df["dat_hora_auto_infracao"], errors="coerce")
+        df["year"] = dt.dt.year
+        df["month"] = dt.dt.month
         features += ["year", "month"]
 
     if "uf" in df.columns:
@@ -109,66 +137,337 @@ def build_target_and_features(df):
         features += ["lat","lon"]
 
     if "des_infracao" in df.columns:
-        df["desc_len"] = df["des_infracao"].astype(str).apply(len)
+        desc = df["des_infracao"]
+        if isinstance(desc.dtype, pd.CategoricalDtype):
+            # mede cada categoria uma vez; código -1 (nulo) vira "nan", 3 caracteres
+            lens = np.append(desc.cat.categories.astype(str).str.len().to_numpy(), 3)
+            df["desc_len"] = lens[desc.cat.codes.to_numpy()]
+        else:
+            # nulo conta como "nan", igual ao código -1 acima (None viraria "None")
+            df["desc_len"] = desc.astype(str).where(desc.notna(), "nan").str.len()
         features.append("desc_len")
+        if text:
+            features.append(TEXT_COLUMN)
 
     for c in features:
         if c not in df.columns:
             df[c] = 0
 
     X = df[features].copy()
-    X = X.replace([np.inf, -np.inf], np.nan).fillna(0)
+    # só as numéricas: fillna(0) numa coluna category (uf, municipio) levantaria erro
+    num = X.select_dtypes(include=[np.number]).columns
+    X[num] = X[num].replace([np.inf, -np.inf], np.nan).fillna(0)
 
-    return X, y_cls, y_reg, df
+    return X, df
 
-def build_preprocessor(X):
+def build_preprocessor(X, encoding="esparso", text=None):
+    """`text`: parâmetros do HashedText aplicado a des_infracao (None = sem bloco de texto)."""
     numeric_cols = X.select_dtypes(include=[np.number]).columns.tolist()
-    cat_cols = X.select_dtypes(exclude=[np.number]).columns.tolist()
+    cat_cols = [c for c in X.select_dtypes(exclude=[np.number]).columns if c != TEXT_COLUMN]
+    if encoding == "esparso":
+        cat = OneHotEncoder(handle_unknown="infrequent_if_exist", min_frequency=MIN_CATEGORY_COUNT,
+                            sparse_output=True, dtype=np.float32)
+        sparse_threshold = 1.0
+    elif encoding == "ordinal":
+        cat = OrdinalEncoder(handle_unknown="use_encoded_value", unknown_value=-1,
+                             encoded_missing_value=-1, dtype=np.float32)
+        sparse_threshold = 0
+    elif encoding == "denso":
+        cat = OneHotEncoder(handle_unknown="ignore", sparse_output=False)
+        sparse_threshold = 0
+    else:
+        raise ValueError(f"encoding desconhecido: {encoding} (use um de {ENCODINGS})")
+    transformers = [("num", StandardScaler(), numeric_cols), ("cat", cat, cat_cols)]
+    if text is not None and TEXT_COLUMN in X.columns:
+        transformers.append(("txt", HashedText(**text), [TEXT_COLUMN]))
+        if not text.get("svd_components"):
+            # milhares de colunas de hashing: a saída fica esparsa em qualquer encoding
+            sparse_threshold = 1.0
     transformer = ColumnTransformer(
-        transformers=[
-            ("num", StandardScaler(), numeric_cols),
-            ("cat", OneHotEncoder(handle_unknown="ignore", sparse_output=False), cat_cols)
-
-        ],
+        transformers=transformers,
         remainder="drop",
-        sparse_threshold=0
+        sparse_threshold=sparse_threshold
     )
     return transformer, numeric_cols, cat_cols
 
-def train_models():
-    path = find_clean()
-    print("Lendo dados:", path)
-    df = pd.read_parquet(path)
-    X, y_cls, y_reg, df_full = build_target_and_features(df)
+def matrix_mb(M):
+    if sp.issparse(M):
+        M = M.tocsr()
+        return (M.data.nbytes + M.indices.nbytes + M.indptr.nbytes) / 1024 ** 2
+    return np.asarray(M).nbytes / 1024 ** 2
 
-    X_train, X_test, y_cls_train, y_cls_test, y_reg_train, y_reg_test = train_test_split(
-        X, y_cls, y_reg, test_size=0.2, random_state=42
-    )
+def describe_matrix(name, M):
+    n, m = M.shape
+    density = (M.nnz if sp.issparse(M) else np.count_nonzero(M)) / max(n * m, 1)
+    kind = "esparsa" if sp.issparse(M) else "densa"
+    print(f"{name}: {n} x {m} {kind}, {matrix_mb(M):.1f} MB, densidade {density:.3f}")
+
+TEST_SIZE = 0.2
+SEED = 42
+FEATURE_KEY_PATH = os.path.join(MODEL_DIR, "feature_key.json")
+
+def feature_code_hash():
+    # qualquer mudança nestas funções invalida o cache de features
+    return feature_store.code_hash(build_target_and_features, target_thresholds, build_features, risk_class,
+                                   build_preprocessor, HashedText, distinct_texts)
+
+def uses_text(pre):
+    """True se o preprocessor foi ajustado com o bloco de texto (des_infracao entre as entradas)."""
+    return TEXT_COLUMN in getattr(pre, "feature_names_in_", ())
+
+def period(df):
+    """Primeira e última dat_hora_auto_infracao (texto ISO), ou None."""
+    dt = pd.to_datetime(df["dat_hora_auto_infracao"], errors="coerce") if "dat_hora_auto_infracao" in df else None
+    if dt is None or dt.notna().sum() == 0:
+        return None
+    return {"inicio": dt.min().isoformat(), "fim": dt.max().isoformat()}
+
+@timed()
+def prepare_features(path, uf=None, date_from=None, date_to=None, encoding="esparso", use_cache=True, text=None):
+    """
+    Matriz transformada de todas as linhas (na ordem do arquivo), índices de
+    treino/teste, alvos e o preprocessor ajustado no treino. Vem do feature_store
+    quando dados, código e parâmetros são os mesmos de uma execução anterior.
+    """
+    params = {"uf": uf, "date_from": date_from, "date_to": date_to, "encoding": encoding,
+              "test_size": TEST_SIZE, "seed": SEED, "text": text}
+    data_sha, code_sha = feature_store.data_hash(path), feature_code_hash()
+    key = feature_store.cache_key(data_sha, code_sha, **params)
+    cached = feature_store.load(key) if use_cache else None
+    if cached is not None:
+        arrays, objects, meta = cached
+        print("Features lidas do cache:", key)
+    else:
+        df = read_clean(path, columns=MODEL_COLUMNS, uf=uf, date_from=date_from, date_to=date_to)
+        print(f"{len(df)} linhas, {df.shape[1]} colunas")
+        X, y_cls, y_reg, _ = build_target_and_features(df, text=text is not None)
+        train_idx, test_idx = train_test_split(np.arange(len(X)), test_size=TEST_SIZE, random_state=SEED)
 
-    preprocessor, num_cols, cat_cols = build_preprocessor(X_train)
-    X_train_t = preprocessor.fit_transform(X_train)
-    X_test_t = preprocessor.transform(X_test)
+        preprocessor, num_cols, cat_cols = build_preprocessor(X, encoding, text)
+        with step("ColumnTransformer.fit", len(train_idx)):
+            preprocessor.fit(X.iloc[train_idx])
+        with step("ColumnTransformer.transform", len(X)):
+            Xt = preprocessor.transform(X)
+        arrays = {"X": Xt, "train_idx": train_idx, "test_idx": test_idx,
+                  "y_cls": y_cls.to_numpy(), "y_reg": y_reg.to_numpy()}
+        objects = {"preprocessor": preprocessor}
+        meta = {"source": path, "data_sha256": data_sha, "code_sha256": code_sha, "params": params,
+                "rows": len(X), "dtypes": {c: str(t) for c, t in X.dtypes.items()},
+                "periodo": period(df)}
+        feature_store.save(key, arrays, objects, meta=meta)
+        print("Features salvas no cache:", key)
+    with open(FEATURE_KEY_PATH, "w", encoding="utf-8") as f:
+        json.dump({"key": key, "source": path, "data_sha256": data_sha, "code_sha256": code_sha,
+                   "params": params}, f, indent=2)
+    return arrays, objects["preprocessor"], meta
 
-    joblib.dump(preprocessor, os.path.join(MODEL_DIR, "preprocessor.joblib"))
+BEST_PARAMS_PATH = os.path.join(MODEL_DIR, "best_params.json")
 
-    clf = RandomForestClassifier(n_estimators=200, random_state=42, n_jobs=-1)
-    clf.fit(X_train_t, y_cls_train)
-    preds_cls = clf.predict(X_test_t)
+ESTIMATORS = {
+    "rf_clf": RandomForestClassifier,
+    "rf_reg": RandomForestRegressor,
+    "hgb_clf": HistGradientBoostingClassifier,
+    "hgb_reg": HistGradientBoostingRegressor,
+}
+DEFAULT_MODELS = {"clf": ("rf_clf", {"n_estimators": 200}), "reg": ("rf_reg", {"n_estimators": 200})}
+
+def make_estimator(task, best=None):
+    name, params = DEFAULT_MODELS[task]
+    if best and task in best:
+        name, params = best[task]["estimador"], best[task]["params"]
+    est = ESTIMATORS[name](random_state=SEED, **params)
+    if "n_jobs" in est.get_params():
+        est.set_params(n_jobs=-1)
+    return est
+
+def fit_input(est, M):
+    # HistGradientBoosting não aceita matriz esparsa
+    if sp.issparse(M) and isinstance(est, (HistGradientBoostingClassifier, HistGradientBoostingRegressor)):
+        return M.toarray()
+    return M
+
+# usados pelo refresh.py; ficam aqui para que os .joblib não dependam de refresh.py rodar como script
+class ExtendedPreprocessor:
+    """Preprocessor anterior + one-hot (no fim da matriz) para categorias novas."""
+    def __init__(self, base, new_categories):
+        self.base = base
+        self.cat_cols = list(new_categories)
+        self.extra = OneHotEncoder(categories=[sorted(new_categories[c]) for c in self.cat_cols],
+                                   handle_unknown="ignore", sparse_output=True, dtype=np.float32)
+        self.feature_names_in_ = base.feature_names_in_
+
+    def fit(self, X, y=None):
+        self.extra.fit(X[self.cat_cols].astype(object))
+        return self
+
+    def transform(self, X):
+        base = self.base.transform(X)
+        extra = self.extra.transform(X[self.cat_cols].astype(object))
+        if sp.issparse(base):
+            return sp.hstack([base, extra], format="csr")
+        return np.hstack([base, extra.toarray().astype(base.dtype)])
+
+    def get_feature_names_out(self):
+        return np.concatenate([self.base.get_feature_names_out(),
+                               ["novas__" + n for n in self.extra.get_feature_names_out()]])
+
+    @property
+    def transformers_(self):
+        return self.base.transformers_
+
+class PeriodEnsemble:
+    """
+    Média de modelos treinados em períodos diferentes, ponderada pelo peso de cada
+    membro (as linhas de treino do período), qualquer que seja o tipo do modelo.
+    `members` é uma lista de (modelo, nº de colunas que ele lê, peso).
+    """
+    def __init__(self, members):
+        self.members = []
+        for m, n_cols, weight in members:
+            if isinstance(m, PeriodEnsemble):
+                # um ensemble anterior é achatado; com `weight`, os pesos dos membros são
+                # reescalados para somar `weight` (senão ficam os que já tinham)
+                scale = 1.0 if weight is None else float(weight) / sum(w for _, _, w in m.members)
+                self.members += [(mm, n, w * scale) for mm, n, w in m.members]
+            else:
+                self.members.append((m, n_cols, float(weight)))
+        first = self.members[0][0]
+        if hasattr(first, "classes_"):
+            self.classes_ = np.unique(np.concatenate([m.classes_ for m, _, _ in self.members]))
+
+    def __setstate__(self, state):
+        # artefatos gravados antes do peso explícito: (modelo, colunas), ponderados pelo nº de árvores
+        state["members"] = [m if len(m) == 3 else (m[0], m[1], float(len(getattr(m[0], "estimators_", [None]))))
+                            for m in state["members"]]
+        self.__dict__.update(state)
+
+    @property
+    def estimators_(self):
+        return [t for m, _, _ in self.members for t in getattr(m, "estimators_", [m])]
+
+    @property
+    def n_jobs(self):
+        return getattr(self.members[0][0], "n_jobs", None)
+
+    @n_jobs.setter
+    def n_jobs(self, value):
+        for m, _, _ in self.members:
+            if hasattr(m, "n_jobs"):
+                m.n_jobs = value
+
+    def _average(self, fn, X):
+        total = sum(w for _, _, w in self.members)
+        return sum(w * fn(m, fit_input(m, X[:, :n])) for m, n, w in self.members) / total
+
+    def predict_proba(self, X):
+        def proba(m, Xm):
+            # membros de um mês sem alguma classe: coluna de probabilidade zero
+            out = np.zeros((Xm.shape[0], len(self.classes_)))
+            out[:, np.searchsorted(self.classes_, m.classes_)] = m.predict_proba(Xm)
+            return out
+        return self._average(proba, X)
+
+    def predict(self, X):
+        if hasattr(self, "classes_"):
+            return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+        return self._average(lambda m, Xm: m.predict(Xm), X)
+
+    def score_samples(self, X):
+        return self._average(lambda m, Xm: m.score_samples(Xm), X)
+
+    @property
+    def offset_(self):
+        total = sum(w for _, _, w in self.members)
+        return sum(w * m.offset_ for m, _, w in self.members) / total
+
+    def decision_function(self, X):
+        # mesmo critério do IsolationForest: score_samples - offset_
+        return self.score_samples(X) - self.offset_
+
+@timed()
+def train_models(uf=None, date_from=None, date_to=None, encoding=None, use_cache=True, best_params=False,
+                 compression="nenhuma", max_tree_mb=None, text=None):
+    best = None
+    if best_params:
+        with open(BEST_PARAMS_PATH, encoding="utf-8") as f:
+            best = json.load(f)
+        print("Usando os parâmetros de", BEST_PARAMS_PATH)
+        # os vencedores foram escolhidos com este encoding; --encoding explícito tem prioridade
+        tuned = best.get("encoding")
+        if encoding is None:
+            encoding = tuned
+        elif tuned and tuned != encoding:
+            print(f"Aviso: parâmetros ajustados com encoding '{tuned}', treinando com '{encoding}'")
+    encoding = encoding or "esparso"
+
+    path = find_clean()
+    print("Lendo dados:", path)
+    arrays, preprocessor, meta = prepare_features(path, uf, date_from, date_to, encoding, use_cache, text)
+    train_idx, test_idx = arrays["train_idx"], arrays["test_idx"]
+    X_train_t = feature_store.take_rows(arrays["X"], train_idx)
+    X_test_t = feature_store.take_rows(arrays["X"], test_idx)
+    y_cls_train, y_cls_test = arrays["y_cls"][train_idx], arrays["y_cls"][test_idx]
+    y_reg_train, y_reg_test = arrays["y_reg"][train_idx], arrays["y_reg"][test_idx]
+    describe_matrix("X_train", X_train_t)
+    describe_matrix("X_test", X_test_t)
+
+    saved = {"preprocessor": artifacts.save_model("preprocessor", preprocessor, MODEL_DIR, compression)}
+
+    clf = make_estimator("clf", best)
+    with step("fit rf_clf", X_train_t.shape[0]):
+        clf.fit(fit_input(clf, X_train_t), y_cls_train)
+    preds_cls = clf.predict(fit_input(clf, X_test_t))
     report = classification_report(y_cls_test, preds_cls, digits=3)
     print(report)
-    joblib.dump(clf, os.path.join(MODEL_DIR, "rf_clf.joblib"))
 
-    reg = RandomForestRegressor(n_estimators=200, random_state=42, n_jobs=-1)
-    reg.fit(X_train_t, y_reg_train)
-    preds_reg = reg.predict(X_test_t)
+    reg = make_estimator("reg", best)
+    with step("fit rf_reg", X_train_t.shape[0]):
+        reg.fit(fit_input(reg, X_train_t), y_reg_train)
+    preds_reg = reg.predict(fit_input(reg, X_test_t))
     mae = mean_absolute_error(y_reg_test, preds_reg)
     rmse = sqrt(mean_squared_error(y_reg_test, preds_reg))
     print("MAE:", mae, "RMSE:", rmse)
-    joblib.dump(reg, os.path.join(MODEL_DIR, "rf_reg.joblib"))
 
     iso = IsolationForest(n_estimators=300, contamination=0.02, random_state=42)
-    iso.fit(np.vstack([X_train_t, X_test_t]))
-    joblib.dump(iso, os.path.join(MODEL_DIR, "iso_forest.joblib"))
+    with step("fit iso_forest", arrays["X"].shape[0]):
+        iso.fit(arrays["X"])
+
+    metrics = {"accuracy": accuracy_score(y_cls_test, preds_cls),
+               "f1_macro": f1_score(y_cls_test, preds_cls, average="macro"), "mae": mae, "rmse": rmse}
+    for name, model in (("rf_clf", clf), ("rf_reg", reg)):
+        if max_tree_mb:
+            removed = artifacts.cap_forest(model, max_tree_mb)
+            if removed:
+                print(f"{name}: {removed} árvores removidas para caber em {max_tree_mb} MB")
+                # métricas passam a ser as do modelo reduzido
+                pred = model.predict(fit_input(model, X_test_t))
+                if name == "rf_clf":
+                    metrics.update(accuracy=accuracy_score(y_cls_test, pred),
+                                   f1_macro=f1_score(y_cls_test, pred, average="macro"))
+                else:
+                    metrics.update(mae=mean_absolute_error(y_reg_test, pred),
+                                   rmse=sqrt(mean_squared_error(y_reg_test, pred)))
+        saved[name] = artifacts.save_model(name, model, MODEL_DIR, compression)
+    saved["iso_forest"] = artifacts.save_model("iso_forest", iso, MODEL_DIR, compression)
+
+    # entradas do cache antigo não têm dtypes: usa o tipo do transformer de cada coluna
+    dtypes = meta.get("dtypes") or {c: kind for kind, _, cols in preprocessor.transformers_
+                                    if kind != "remainder" for c in cols}
+    artifacts.save_manifest({
+        "treinado_em": datetime.now().isoformat(timespec="seconds"),
+        "fonte": path,
+        "data_sha256": meta["data_sha256"],
+        "code_sha256": meta["code_sha256"],
+        "params": meta["params"],
+        "linhas_treino": len(train_idx),
+        "periodo": meta.get("periodo"),
+        "features": [{"nome": c, "dtype": t} for c, t in dtypes.items()],
+        "colunas_transformadas": preprocessor.get_feature_names_out().tolist(),
+        "metricas": {k: float(v) for k, v in metrics.items()},
+        "artefatos": saved,
+    }, MODEL_DIR)
+    for name, info in saved.items():
+        print(f"{name}: {info['tamanho_mb']:.1f} MB ({info['compressao']})")
 
     with open(os.path.join(MODEL_DIR, "metrics_summary.txt"), "w") as f:
         f.write(report)
@@ -177,4 +476,27 @@ def train_models():
     print("Modelos treinados e salvos em", MODEL_DIR)
 
 if __name__ == "__main__":
-    train_models()
+    parser = argparse.ArgumentParser(description="Treino dos modelos de risco, multa e anomalias")
+    parser.add_argument("--uf", nargs="+", help="treina só com estas UFs")
+    parser.add_argument("--desde", help="data inicial (AAAA-MM-DD) de dat_hora_auto_infracao")
+    parser.add_argument("--ate", help="data final (AAAA-MM-DD) de dat_hora_auto_infracao")
+    parser.add_argument("--encoding", choices=ENCODINGS, default=None,
+                        help="codificação de uf/municipio (padrão: a do best_params.json com --melhores-parametros, "
+                             "senão one-hot esparso com categorias raras agrupadas)")
+    parser.add_argument("--sem-cache", action="store_true", help="recalcula as features mesmo se estiverem no cache")
+    parser.add_argument("--melhores-parametros", action="store_true",
+                        help="usa os vencedores do tuning.py (models/best_params.json)")
+    parser.add_argument("--compressao", choices=artifacts.COMPRESSIONS, default="nenhuma",
+                        help="compressão dos .joblib (padrão: nenhuma, permite carga com mmap)")
+    parser.add_argument("--tamanho-max-mb", type=float,
+                        help="limite por floresta (rf_clf, rf_reg): mantém só as árvores que cabem")
+    parser.add_argument("--texto", action="store_true",
+                        help="acrescenta n-gramas de des_infracao (hashing + TF-IDF) às features dos três modelos")
+    parser.add_argument("--texto-hash", type=int, default=N_FEATURES, help="colunas do hashing do texto")
+    parser.add_argument("--texto-svd", type=int, default=0,
+                        help="reduz o bloco de texto a N colunas densas com TruncatedSVD (0 = esparso)")
+    args = parser.parse_args()
+    text = {"n_features": args.texto_hash, "svd_components": args.texto_svd} if args.texto else None
+    train_models(uf=args.uf, date_from=args.desde, date_to=args.ate, encoding=args.encoding,
+                 use_cache=not args.sem_cache, best_params=args.melhores_parametros,
+                 compression=args.compressao, max_tree_mb=args.tamanho_max_mb, text=text)
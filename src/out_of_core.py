@@ -0,0 +1,313 @@
+# src/out_of_core.py
+"""
+Treino fora da memória: os mesmos modelos do model.py, lendo o clean_autuacoes.parquet
+um row group por vez, para históricos que não cabem na RAM.
+
+Passadas sobre os row groups (data_access.iter_row_groups, sempre na mesma ordem):
+ 1. estatísticas: médias/variâncias do StandardScaler (partial_fit), vocabulário de uf e
+    municipio com contagens, período e uma amostra limitada do alvo para os limiares
+    das classes de risco (target_thresholds);
+ 2. amostras: cada membro da floresta (um bloco de árvores) é treinado numa amostra
+    bootstrap de --amostra linhas de treino sorteadas entre todos os row groups; a cada
+    passada entram tantos membros quantos cabem em --max-linhas;
+ 3. holdout: as linhas de teste são pontuadas row group a row group e só a matriz de
+    confusão e as somas de erro ficam em memória.
+
+O split treino/teste é sorteado por row group com uma semente fixa (mesmo TEST_SIZE
+do model.py), então as passadas enxergam as mesmas linhas de teste. Os membros são
+juntados num model.PeriodEnsemble (média ponderada pelas linhas de cada amostra),
+que o scoring.py e o refresh.py já sabem usar; o IsolationForest, cujas árvores só
+veem 256 linhas cada, é treinado na amostra do primeiro membro.
+
+Diferença para o model.py: no encoding "esparso" as categorias com menos de
+MIN_CATEGORY_COUNT linhas viram uma linha toda zero em vez da coluna "infrequente".
+
+Uso:
+    python src/out_of_core.py --amostra 200000 --membros 8 --max-linhas 1000000
+"""
+import os
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.ensemble import IsolationForest
+from sklearn.frozen import FrozenEstimator
+from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder, StandardScaler
+from math import sqrt, ceil
+from datetime import datetime
+from data_access import iter_row_groups, count_rows
+from preprocessing import apply_schema
+from model import (MODEL_COLUMNS, MODEL_DIR, FEATURE_KEY_PATH, BEST_PARAMS_PATH, ENCODINGS, MIN_CATEGORY_COUNT,
+                   TEST_SIZE, SEED, PeriodEnsemble, find_clean, build_features, build_target_and_features,
+                   build_preprocessor, make_estimator, fit_input, feature_code_hash, uses_text)
+from text_features import HashedText, TEXT_COLUMN, N_FEATURES
+import feature_store
+import artifacts
+from instrument import timed
+
+SAMPLE_ROWS = 200_000
+MEMBERS = 4
+MAX_ROWS = 1_000_000
+# valores do alvo guardados para estimar os quartis das classes de risco
+QUANTILE_SAMPLE = 200_000
+N_CLASSES = 3
+
+def row_groups(path, filters):
+    """(índice, DataFrame, máscara de teste) de cada row group."""
+    for g, df in enumerate(iter_row_groups(path, columns=MODEL_COLUMNS, **filters)):
+        rng = np.random.default_rng([SEED, g])
+        yield g, apply_schema(df, infer=False), rng.random(len(df)) < TEST_SIZE
+
+@timed()
+def collect_stats(path, filters, text=None):
+    total = count_rows(path, **filters)
+    keep = min(1.0, QUANTILE_SAMPLE / max(total, 1))
+    rng = np.random.default_rng(SEED)
+    scaler = StandardScaler()
+    # IDF do texto acumulado por batch (só as frequências de documento ficam em memória)
+    txt = HashedText(**text) if text is not None else None
+    counts, target, train_rows = {}, [], []
+    n_grav, first, start, end = 0, None, None, None
+    for g, df, test in row_groups(path, filters):
+        X, _ = build_features(df, text=txt is not None)
+        if first is None:
+            first = X.head(1000)
+        num = X.select_dtypes(include=[np.number]).columns
+        train = ~test
+        if train.any():
+            scaler.partial_fit(X.loc[train, num])
+        if txt is not None and train.any():
+            txt.partial_fit(X.loc[train, [TEXT_COLUMN]])
+        for c in X.select_dtypes(exclude=[np.number]).columns.drop(TEXT_COLUMN, errors="ignore"):
+            vc = X.loc[train, c].astype(str).where(X.loc[train, c].notna()).value_counts()
+            counts[c] = counts[c].add(vc, fill_value=0) if c in counts else vc
+        train_rows.append(int(train.sum()))
+
+        if "gravidade_nivel" in df.columns:
+            n_grav += int(pd.to_numeric(df["gravidade_nivel"], errors="coerce").notna().sum())
+        pick = rng.random(len(df)) < keep
+        target.append(pd.DataFrame({c: pd.to_numeric(df[c], errors="coerce").to_numpy()[pick]
+                                    for c in ("gravidade_nivel", "valor_multa") if c in df.columns}))
+        if "dat_hora_auto_infracao" in df.columns:
+            dt = pd.to_datetime(df["dat_hora_auto_infracao"], errors="coerce")
+            if dt.notna().any():
+                start = dt.min() if start is None else min(start, dt.min())
+                end = dt.max() if end is None else max(end, dt.max())
+    if first is None:
+        raise ValueError("nenhuma linha de treino com esses filtros")
+    target = pd.concat(target, ignore_index=True)
+    # mesmo critério do target_thresholds, com as contagens do arquivo inteiro
+    col = "gravidade_nivel" if n_grav > 100 and "gravidade_nivel" in target else "valor_multa"
+    v = target[col] if col in target else pd.Series(np.nan)
+    return {"scaler": scaler, "text": txt.finish_fit() if txt is not None else None, "counts": counts, "first": first, "train_rows": np.array(train_rows),
+            "thresholds": (col, v.quantile(0.25), v.quantile(0.75)), "total": total,
+            "periodo": {"inicio": start.isoformat(), "fim": end.isoformat()} if start is not None else None}
+
+def streaming_preprocessor(stats, encoding, text=None):
+    """
+    ColumnTransformer equivalente ao do model.py, montado com as estatísticas da 1ª
+    passada: categorias fixas no encoder, o StandardScaler e o HashedText dos partial_fit.
+    """
+    X = stats["first"]
+    pre, num_cols, cat_cols = build_preprocessor(X, encoding, text)
+    vocab = []
+    for c in cat_cols:
+        vc = stats["counts"].get(c, pd.Series(dtype=float))
+        if encoding == "esparso":
+            vc = vc[vc >= MIN_CATEGORY_COUNT]
+        vocab.append(sorted(vc.index))
+    if encoding == "ordinal":
+        cat = OrdinalEncoder(categories=vocab, handle_unknown="use_encoded_value", unknown_value=-1,
+                             encoded_missing_value=-1, dtype=np.float32)
+    else:
+        cat = OneHotEncoder(categories=vocab, handle_unknown="ignore", sparse_output=encoding == "esparso",
+                            dtype=np.float32)
+    # scaler e texto já ajustados nos partial_fit: congelados, o fit abaixo não os refaz
+    fitted = {"cat": cat, "num": FrozenEstimator(stats["scaler"])}
+    if any(name == "txt" for name, _, _ in pre.transformers):
+        fitted["txt"] = FrozenEstimator(stats["text"])
+    pre.set_params(**fitted)
+    # com as categorias fixas, o fit nas primeiras linhas só registra colunas e tipos
+    pre.fit(X)
+    return pre
+
+def transform_group(pre, df, thresholds):
+    X, y_cls, y_reg, _ = build_target_and_features(df, thresholds, text=uses_text(pre))
+    Xt = pre.transform(X)
+    if sp.issparse(Xt):
+        Xt = Xt.tocsr()
+    return Xt, y_cls.to_numpy(), y_reg.to_numpy()
+
+def stack(parts):
+    return sp.vstack(parts, format="csr") if sp.issparse(parts[0]) else np.vstack(parts)
+
+@timed()
+def draw_samples(path, filters, pre, thresholds, allocations, seed):
+    """
+    Uma passada: para cada membro j, allocations[j][g] linhas de treino sorteadas (com
+    reposição) no row group g. Retorna [(X, y_cls, y_reg)] na ordem dos membros.
+    """
+    rng = np.random.default_rng(seed)
+    parts = [([], [], []) for _ in allocations]
+    for g, df, test in row_groups(path, filters):
+        if not allocations[:, g].any():
+            continue
+        Xt, y_cls, y_reg = transform_group(pre, df, thresholds)
+        train = np.flatnonzero(~test)
+        for j, n in enumerate(allocations[:, g]):
+            if n:
+                rows = train[rng.integers(0, len(train), n)]
+                parts[j][0].append(Xt[rows])
+                parts[j][1].append(y_cls[rows])
+                parts[j][2].append(y_reg[rows])
+    return [(stack(X), np.concatenate(yc), np.concatenate(yr)) for X, yc, yr in parts]
+
+def class_report(cm):
+    """Relatório no formato do classification_report, a partir da matriz de confusão."""
+    tp = np.diag(cm).astype(float)
+    support, predicted = cm.sum(axis=1), cm.sum(axis=0)
+    precision = np.divide(tp, predicted, out=np.zeros_like(tp), where=predicted > 0)
+    recall = np.divide(tp, support, out=np.zeros_like(tp), where=support > 0)
+    f1 = np.divide(2 * precision * recall, precision + recall, out=np.zeros_like(tp), where=precision + recall > 0)
+    present = (support > 0) | (predicted > 0)
+    lines = [f"{'':>12s} {'precision':>9s} {'recall':>9s} {'f1-score':>9s} {'support':>9s}", ""]
+    for k in np.flatnonzero(present):
+        lines.append(f"{k:>12d} {precision[k]:9.3f} {recall[k]:9.3f} {f1[k]:9.3f} {support[k]:9d}")
+    n = int(cm.sum())
+    accuracy = tp.sum() / max(n, 1)
+    f1_macro = f1[present].mean() if present.any() else 0.0
+    lines += ["", f"{'accuracy':>12s} {'':9s} {'':9s} {accuracy:9.3f} {n:9d}",
+              f"{'macro avg':>12s} {precision[present].mean():9.3f} {recall[present].mean():9.3f} "
+              f"{f1_macro:9.3f} {n:9d}"]
+    return "\n".join(lines) + "\n", accuracy, f1_macro
+
+@timed()
+def evaluate(path, filters, pre, thresholds, clf, reg):
+    """Holdout lido em streaming: só a matriz de confusão e as somas de erro ficam em memória."""
+    cm = np.zeros((N_CLASSES, N_CLASSES), dtype=np.int64)
+    abs_err = sq_err = 0.0
+    n = 0
+    for g, df, test in row_groups(path, filters):
+        if not test.any():
+            continue
+        Xt, y_cls, y_reg = transform_group(pre, df.loc[test].reset_index(drop=True), thresholds)
+        pred = np.asarray(clf.predict(Xt), dtype=np.int64)
+        np.add.at(cm, (y_cls, pred), 1)
+        err = reg.predict(Xt) - y_reg
+        abs_err += float(np.abs(err).sum())
+        sq_err += float((err ** 2).sum())
+        n += len(err)
+    report, accuracy, f1_macro = class_report(cm)
+    return report, {"accuracy": accuracy, "f1_macro": f1_macro,
+                    "mae": abs_err / max(n, 1), "rmse": sqrt(sq_err / max(n, 1))}, n
+
+def _member(task, best, n_trees):
+    est = make_estimator(task, best)
+    if "n_estimators" in est.get_params():
+        est.set_params(n_estimators=n_trees)
+    return est
+
+@timed()
+def train_out_of_core(uf=None, date_from=None, date_to=None, encoding="esparso", sample_rows=SAMPLE_ROWS,
+                      members=MEMBERS, max_rows=MAX_ROWS, best_params=False, compression="nenhuma", text=None):
+    t_start = time.perf_counter()
+    path = find_clean()
+    filters = {"uf": uf, "date_from": date_from, "date_to": date_to}
+    print("Lendo dados em row groups:", path)
+
+    stats = collect_stats(path, filters, text)
+    n_train = int(stats["train_rows"].sum())
+    print(f"{stats['total']} linhas ({n_train} treino) em {len(stats['train_rows'])} row groups; "
+          f"limiares: {stats['thresholds']}")
+    pre = streaming_preprocessor(stats, encoding, text)
+    n_cols = len(pre.get_feature_names_out())
+
+    best = None
+    if best_params:
+        with open(BEST_PARAMS_PATH, encoding="utf-8") as f:
+            best = json.load(f)
+        print("Usando os parâmetros de", BEST_PARAMS_PATH)
+
+    sample_rows = min(sample_rows, n_train)
+    per_pass = max(1, max_rows // max(sample_rows, 1))
+    rng = np.random.default_rng(SEED)
+    # linhas de cada membro por row group, proporcionais às linhas de treino de cada um
+    allocations = rng.multinomial(sample_rows, stats["train_rows"] / n_train, size=members)
+    trees = {task: ceil(make_estimator(task, best).get_params().get("n_estimators", 1) / members)
+             for task in ("clf", "reg")}
+    fitted = {"clf": [], "reg": []}
+    iso = None
+    for start in range(0, members, per_pass):
+        t0 = time.perf_counter()
+        samples = draw_samples(path, filters, pre, stats["thresholds"], allocations[start:start + per_pass],
+                               [SEED, start])
+        for X, y_cls, y_reg in samples:
+            for task, y in (("clf", y_cls), ("reg", y_reg)):
+                est = _member(task, best, trees[task])
+                est.fit(fit_input(est, X), y)
+                fitted[task].append((est, n_cols, len(y)))
+            if iso is None:
+                iso = IsolationForest(n_estimators=300, contamination=0.02, random_state=42).fit(X)
+        print(f"membros {start + 1}-{start + len(samples)} de {members}: "
+              f"{len(samples)} x {sample_rows} linhas em {time.perf_counter() - t0:.1f}s")
+
+    clf, reg = PeriodEnsemble(fitted["clf"]), PeriodEnsemble(fitted["reg"])
+    report, metrics, n_test = evaluate(path, filters, pre, stats["thresholds"], clf, reg)
+    print(report)
+    print(f"Holdout: {n_test} linhas | MAE: {metrics['mae']} RMSE: {metrics['rmse']}")
+
+    saved = {"preprocessor": artifacts.save_model("preprocessor", pre, MODEL_DIR, compression),
+             "rf_clf": artifacts.save_model("rf_clf", clf, MODEL_DIR, compression),
+             "rf_reg": artifacts.save_model("rf_reg", reg, MODEL_DIR, compression),
+             "iso_forest": artifacts.save_model("iso_forest", iso, MODEL_DIR, compression)}
+    params = dict(filters, encoding=encoding, test_size=TEST_SIZE, seed=SEED, text=text)
+    artifacts.save_manifest({
+        "treinado_em": datetime.now().isoformat(timespec="seconds"),
+        "fonte": path,
+        "data_sha256": feature_store.data_hash(path),
+        "code_sha256": feature_code_hash(),
+        "params": params,
+        "fora_da_memoria": {"membros": members, "amostra": sample_rows, "max_linhas": max_rows,
+                            "limiares": list(stats["thresholds"])},
+        "linhas_treino": n_train,
+        "periodo": stats["periodo"],
+        "features": [{"nome": c, "dtype": str(t)} for c, t in stats["first"].dtypes.items()],
+        "colunas_transformadas": pre.get_feature_names_out().tolist(),
+        "metricas": {k: float(v) for k, v in metrics.items()},
+        "artefatos": saved,
+    }, MODEL_DIR)
+    for name, info in saved.items():
+        print(f"{name}: {info['tamanho_mb']:.1f} MB ({info['compressao']})")
+    with open(os.path.join(MODEL_DIR, "metrics_summary.txt"), "w") as f:
+        f.write(report)
+        f.write(f"\nMAE: {metrics['mae']}\nRMSE: {metrics['rmse']}\n")
+    # não há matriz em cache deste preprocessor: o scoring transforma os batches
+    if os.path.exists(FEATURE_KEY_PATH):
+        os.remove(FEATURE_KEY_PATH)
+    print(f"Modelos treinados fora da memória em {time.perf_counter() - t_start:.1f}s e salvos em", MODEL_DIR)
+    return metrics
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Treino dos modelos lendo o parquet em row groups (memória fixa)")
+    parser.add_argument("--uf", nargs="+", help="treina só com estas UFs")
+    parser.add_argument("--desde", help="data inicial (AAAA-MM-DD) de dat_hora_auto_infracao")
+    parser.add_argument("--ate", help="data final (AAAA-MM-DD) de dat_hora_auto_infracao")
+    parser.add_argument("--encoding", choices=ENCODINGS, default="esparso")
+    parser.add_argument("--amostra", type=int, default=SAMPLE_ROWS, help="linhas da amostra bootstrap de cada membro")
+    parser.add_argument("--membros", type=int, default=MEMBERS,
+                        help="membros por floresta (as árvores do model.py são divididas entre eles)")
+    parser.add_argument("--max-linhas", type=int, default=MAX_ROWS,
+                        help="linhas de amostra em memória ao mesmo tempo (define os membros por passada)")
+    parser.add_argument("--melhores-parametros", action="store_true",
+                        help="usa os vencedores do tuning.py (models/best_params.json)")
+    parser.add_argument("--compressao", choices=artifacts.COMPRESSIONS, default="nenhuma")
+    parser.add_argument("--texto", action="store_true", help="acrescenta n-gramas de des_infracao (ver model.py)")
+    parser.add_argument("--texto-hash", type=int, default=N_FEATURES, help="colunas do hashing do texto")
+    parser.add_argument("--texto-svd", type=int, default=0, help="componentes da SVD do texto (0 = esparso)")
+    args = parser.parse_args()
+    text = {"n_features": args.texto_hash, "svd_components": args.texto_svd} if args.texto else None
+    train_out_of_core(uf=args.uf, date_from=args.desde, date_to=args.ate, encoding=args.encoding,
+                      sample_rows=args.amostra, members=args.membros, max_rows=args.max_linhas,
+                      best_params=args.melhores_parametros, compression=args.compressao, text=text)
@@ -0,0 +1,102 @@
+# src/parsing.py
+"""
+Conversão vetorizada dos campos texto do IBAMA (valores em R$ e datas no formato
+brasileiro). Usado pelo preprocessing.py e pelo generate_dashboard.py.
+
+As funções de Series retornam (resultado, n_invalidos), onde n_invalidos conta os
+valores não nulos na entrada que não puderam ser convertidos.
+"""
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from instrument import timed
+
+# formatos aceitos, na ordem em que são tentados
+DATE_FORMATS = (
+    "%d/%m/%Y %H:%M:%S",
+    "%d/%m/%Y %H:%M",
+    "%d/%m/%Y",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d",
+)
+
+# "15.000" / "1.234.567" (pontos de milhar, sem vírgula decimal)
+_THOUSANDS = r"^\d{1,3}(?:\.\d{3})+$"
+_NUMBER = r"^[-+]?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?$"
+_NULL_STR = pa.scalar(None, pa.string())
+
+def _as_text(s):
+    # tudo abaixo roda como kernels do pyarrow.compute, sem passar por objetos Python
+    try:
+        arr = pa.array(s, type=pa.string(), from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # coluna object com tipos misturados (ex.: str e float)
+        arr = pa.array(s.astype(str).where(s.notna(), None), type=pa.string(), from_pandas=True)
+    txt = pc.utf8_trim_whitespace(arr)
+    return pc.if_else(pc.equal(txt, ""), _NULL_STR, txt)
+
+def _to_float(txt):
+    try:
+        # caminho rápido: tudo numérico
+        return pc.cast(txt, pa.float64())
+    except pa.ArrowInvalid:
+        ok = pc.match_substring_regex(txt, _NUMBER)
+        return pc.cast(pc.if_else(ok, txt, _NULL_STR), pa.float64())
+
+@timed()
+def parse_valor_series(s):
+    """
+    "15.000,00" -> 15000.0, "R$ 1.234,5" -> 1234.5, "15000.5" -> 15000.5.
+    Colunas já numéricas passam direto.
+    """
+    if pd.api.types.is_numeric_dtype(s):
+        return pd.to_numeric(s, errors="coerce").astype(float), 0
+
+    txt = _as_text(s)
+    if pc.any(pc.starts_with(txt, "R$")).as_py():
+        txt = pc.replace_substring_regex(txt, r"^R\$\s*", "")
+    txt = pc.replace_substring(txt, " ", "")
+    # com vírgula (ou só pontos de milhar): formato brasileiro, tira pontos e troca vírgula
+    br_fmt = pc.match_substring(txt, ",")
+    if not pc.all(pc.or_kleene(br_fmt, pc.is_null(txt))).as_py():
+        br_fmt = pc.or_(br_fmt, pc.match_substring_regex(txt, _THOUSANDS))
+    br = pc.replace_substring(pc.replace_substring(txt, ".", ""), ",", ".")
+    out = _to_float(pc.if_else(br_fmt, br, txt))
+
+    # fallback: primeiro número que aparecer no texto (ex.: "15.000,00 (quinze mil)")
+    bad = pc.and_(pc.is_null(out), pc.is_valid(txt))
+    if pc.any(bad).as_py():
+        num = pc.struct_field(pc.extract_regex(pc.if_else(bad, txt, _NULL_STR), r"(?P<n>\d+(?:[\.,]\d+)*)"), [0])
+        num = pc.replace_substring(pc.replace_substring(num, ".", ""), ",", ".")
+        out = pc.coalesce(out, _to_float(num))
+        bad = pc.and_(pc.is_null(out), pc.is_valid(txt))
+    values = out.to_numpy(zero_copy_only=False)
+    return pd.Series(values, index=s.index, name=s.name), int(pc.sum(bad).as_py() or 0)
+
+@timed()
+def parse_dates_series(s, formats=DATE_FORMATS):
+    """
+    Converte datas tentando cada formato explícito só nas linhas ainda não convertidas
+    (sem a inferência de dayfirst=True linha a linha).
+    """
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return s, 0
+
+    txt = _as_text(s)
+    out = pa.nulls(len(txt), pa.timestamp("s"))
+    pending = pc.is_valid(txt)
+    for i, fmt in enumerate(formats):
+        if not pc.any(pending).as_py():
+            break
+        todo = txt if i == 0 else pc.if_else(pending, txt, _NULL_STR)
+        parsed = pc.strptime(todo, format=fmt, unit="s", error_is_null=True)
+        # o strptime do arrow não valida o dia do mês ("31/02/2024" vira 02/03): o que não
+        # volta igual ao texto (dia inválido ou sem zero à esquerda) é refeito pelo pandas
+        odd = pc.and_(pc.is_valid(parsed), pc.not_equal(pc.strftime(parsed, format=fmt), todo))
+        if pc.any(odd).as_py():
+            redo = pd.to_datetime(pc.if_else(odd, todo, _NULL_STR).to_pandas(), format=fmt, errors="coerce")
+            parsed = pc.if_else(odd, pa.array(redo, type=pa.timestamp("s"), from_pandas=True), parsed)
+        out = pc.coalesce(out, parsed)
+        pending = pc.and_(pending, pc.is_null(parsed))
+    values = out.to_numpy(zero_copy_only=False).astype("datetime64[ns]")
+    return pd.Series(values, index=s.index, name=s.name), int(pc.sum(pending).as_py() or 0)
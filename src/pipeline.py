@@ -0,0 +1,262 @@
+# src/pipeline.py
+"""
+Ponto de entrada único do pipeline: as etapas formam um DAG a partir das entradas e
+saídas que cada uma declara (uma etapa depende das que produzem suas entradas).
+
+ - etapa pulada quando entradas, código (o script e os módulos de src/ que ele
+   importa) e argumentos são os mesmos da última execução bem-sucedida e as saídas
+   existem; o estado fica em data/pipeline_state.json
+ - etapas sem dependência entre si rodam ao mesmo tempo (--workers)
+ - cada etapa roda num subprocesso com cwd na raiz do projeto (--raiz); tempo de
+   parede, CPU e pico de memória (maior RSS do processo da etapa e dos filhos que ele
+   esperou) vão para data/pipeline_runs.jsonl, e a saída de cada etapa para
+   logs/pipeline/<execução>/<etapa>.log
+
+Uso:
+    python src/pipeline.py                     # tudo até o dashboard
+    python src/pipeline.py modelo --workers 2  # só o necessário para o modelo
+    python src/pipeline.py --plano             # mostra o que rodaria, sem rodar
+"""
+import os
+import ast
+import sys
+import glob
+import json
+import time
+import hashlib
+import argparse
+import subprocess
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from manifest import fingerprint, load_manifest, save_manifest
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_NAME = os.path.join("data", "pipeline_state.json")
+RUNS_NAME = os.path.join("data", "pipeline_runs.jsonl")
+LOG_DIR = os.path.join("logs", "pipeline")
+
+PROC = "data/processed"
+CLEAN = f"{PROC}/clean_autuacoes.parquet"
+SAMPLE = f"{PROC}/sample_for_dashboard.parquet"
+SCORED = f"{PROC}/scored_autuacoes.parquet"
+CUBE = f"{PROC}/cube_autuacoes.parquet"
+MODELS = ["models/preprocessor.joblib", "models/rf_clf.joblib", "models/rf_reg.joblib",
+          "models/iso_forest.joblib", "models/manifest.json"]
+
+# nome -> (script, argumentos, entradas, saídas); entradas aceitam glob e diretórios
+STAGES = {
+    "ingestao": ("data_ingestion.py", [], ["data/raw/auto_infracao*.csv"], [f"{PROC}/autuacoes_dataset"]),
+    "preprocessamento": ("preprocessing.py", [], [f"{PROC}/autuacoes_dataset"],
+                         [CLEAN, SAMPLE, f"{PROC}/agg_municipio.parquet", CUBE, f"{PROC}/infratores"]),
+    "modelo": ("model.py", [], [CLEAN], MODELS),
+    # o scoring refaz o cubo com as previsões: é ele o produtor que o dashboard espera
+    "scoring": ("scoring.py", [], [CLEAN] + MODELS, [SCORED, CUBE]),
+    "dashboard": ("generate_dashboard.py", [], [SCORED, SAMPLE, CUBE], ["dashboard.html"]),
+}
+DEFAULT_TARGET = "dashboard"
+
+def dependencies(stages=STAGES):
+    """etapa -> etapas que produzem alguma das suas entradas."""
+    producer = {out: name for name, (_, _, _, outs) in stages.items() for out in outs}
+    return {name: sorted({producer[i] for i in ins if i in producer and producer[i] != name})
+            for name, (_, _, ins, _) in stages.items()}
+
+def closure(targets, deps):
+    """As etapas pedidas e tudo de que elas dependem."""
+    todo, seen = list(targets), set()
+    while todo:
+        name = todo.pop()
+        if name not in seen:
+            seen.add(name)
+            todo += deps[name]
+    return seen
+
+def local_modules(script, seen=None):
+    """Arquivos de src/ importados (recursivamente) pelo script, incluindo ele mesmo."""
+    seen = set() if seen is None else seen
+    path = os.path.join(SRC_DIR, script)
+    if path in seen or not os.path.exists(path):
+        return seen
+    seen.add(path)
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    for node in ast.walk(tree):
+        names = []
+        if isinstance(node, ast.Import):
+            names = [a.name for a in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+            names = [node.module]
+        for n in names:
+            local_modules(n.split(".")[0] + ".py", seen)
+    return seen
+
+def code_hash(script):
+    h = hashlib.sha256()
+    for path in sorted(local_modules(script)):
+        with open(path, "rb") as f:
+            h.update(os.path.basename(path).encode() + b"\0" + f.read())
+    return h.hexdigest()
+
+def expand(root, pattern):
+    """Arquivos que um padrão de entrada/saída representa (diretório = todos os arquivos dentro)."""
+    files = []
+    for p in sorted(glob.glob(os.path.join(root, pattern))):
+        if os.path.isdir(p):
+            files += sorted(os.path.join(d, f) for d, _, fs in os.walk(p) for f in fs)
+        else:
+            files.append(p)
+    return files
+
+def input_fingerprints(root, patterns, known):
+    out = {}
+    for pattern in patterns:
+        for path in expand(root, pattern):
+            fp = fingerprint(path, known.get(path))
+            known[path] = fp
+            out[os.path.relpath(path, root)] = fp["sha256"]
+    return out
+
+def run_stage(name, root, log_path):
+    script, args = STAGES[name][:2]
+    return run_script(name, script, args, root, log_path)
+
+def peak_mb(maxrss):
+    # ru_maxrss vem em bytes no macOS e em KB no Linux
+    return round(maxrss / (1024 ** 2 if sys.platform == "darwin" else 1024), 1)
+
+def run_script(name, script, args, root, log_path):
+    """
+    Roda um script de src/ num subprocesso com cwd em `root`; tempo, CPU e pico de memória.
+    Sem os.wait4 (Windows) só o tempo de parede é medido: cpu_s e pico_mb ficam None.
+    """
+    t0 = time.perf_counter()
+    usage = None
+    with open(log_path, "w", encoding="utf-8") as log:
+        proc = subprocess.Popen([sys.executable, os.path.join(SRC_DIR, script)] + args, cwd=root,
+                                stdout=log, stderr=subprocess.STDOUT)
+        if hasattr(os, "wait4"):
+            # wait4 devolve o rusage deste filho (e dos processos que ele esperou)
+            _, status, usage = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+        else:
+            proc.wait()
+    return {
+        "etapa": name,
+        "status": "ok" if proc.returncode == 0 else "falhou",
+        "codigo_saida": proc.returncode,
+        "parede_s": round(time.perf_counter() - t0, 2),
+        "cpu_s": round(usage.ru_utime + usage.ru_stime, 2) if usage else None,
+        "pico_mb": peak_mb(usage.ru_maxrss) if usage else None,
+        "log": log_path,
+    }
+
+def resources(r):
+    """Trecho "(CPU ..., pico ... MB)" de um resultado de run_script; vazio sem rusage."""
+    if r["cpu_s"] is None:
+        return ""
+    return f" (CPU {r['cpu_s']:.1f}s, pico {r['pico_mb']:.0f} MB)"
+
+def run(targets=None, root=None, workers=2, force=False, plan_only=False):
+    root = os.path.abspath(root or os.getcwd())
+    deps = dependencies()
+    targets = targets or [DEFAULT_TARGET]
+    unknown = [t for t in targets if t not in STAGES]
+    if unknown:
+        raise ValueError(f"etapas desconhecidas: {unknown} (use {list(STAGES)})")
+    selected = closure(targets, deps)
+
+    state_path = os.path.join(root, STATE_NAME)
+    state = load_manifest(state_path)
+    state.setdefault("etapas", {})
+    run_id = datetime.now().strftime("%Y%m%d-%H%M%S")
+    log_dir = os.path.join(root, LOG_DIR, run_id)
+
+    pending = {n for n in STAGES if n in selected}
+    done, results, keys = set(), [], {}
+    failed = False
+    t_run = time.perf_counter()
+
+    def stage_key(name):
+        script, args, ins, _ = STAGES[name]
+        return {"codigo": code_hash(script), "args": args,
+                "entradas": input_fingerprints(root, ins, state["arquivos"])}
+
+    def up_to_date(name):
+        outs = STAGES[name][3]
+        prev = state["etapas"].get(name)
+        return (not force and prev is not None and prev == keys[name]
+                and all(expand(root, o) for o in outs))
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        running = {}
+        while pending or running:
+            ready = sorted(n for n in pending if all(d in done for d in deps[n] if d in selected))
+            for name in ready:
+                pending.discard(name)
+                # entradas conferidas só quando as dependências terminaram (elas podem ter mudado)
+                keys[name] = stage_key(name)
+                if plan_only and any(r["etapa"] in deps[name] and r["status"] == "planejada" for r in results):
+                    print(f"[{name}] rodaria depois de {', '.join(deps[name])}")
+                    results.append({"etapa": name, "status": "planejada"})
+                    done.add(name)
+                elif up_to_date(name):
+                    print(f"[{name}] atualizada, pulando")
+                    results.append({"etapa": name, "status": "pulada"})
+                    done.add(name)
+                elif plan_only:
+                    print(f"[{name}] rodaria ({STAGES[name][0]})")
+                    results.append({"etapa": name, "status": "planejada"})
+                    done.add(name)
+                else:
+                    os.makedirs(log_dir, exist_ok=True)
+                    print(f"[{name}] iniciando")
+                    fut = pool.submit(run_stage, name, root, os.path.join(log_dir, f"{name}.log"))
+                    running[fut] = name
+            if not running:
+                if pending and not ready:
+                    break
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                name = running.pop(fut)
+                r = fut.result()
+                results.append(r)
+                print(f"[{name}] {r['status']} em {r['parede_s']:.1f}s{resources(r)}")
+                if r["status"] == "ok":
+                    done.add(name)
+                    # chave com as entradas vistas antes de rodar: se elas mudaram durante
+                    # a etapa, a próxima execução roda de novo
+                    state["etapas"][name] = keys[name]
+                    save_manifest(state, state_path)
+                else:
+                    failed = True
+                    with open(r["log"], encoding="utf-8", errors="replace") as f:
+                        print("".join(f.readlines()[-20:]))
+            if failed:
+                # não inicia mais nada; espera as que já estão rodando
+                pending.clear()
+
+    skipped = sorted(n for n in selected if n not in done and not any(r["etapa"] == n for r in results))
+    for name in skipped:
+        results.append({"etapa": name, "status": "não executada"})
+    total = time.perf_counter() - t_run
+    print(f"Pipeline {'falhou' if failed else 'concluído'} em {total:.1f}s")
+    if not plan_only:
+        os.makedirs(os.path.dirname(os.path.join(root, RUNS_NAME)), exist_ok=True)
+        with open(os.path.join(root, RUNS_NAME), "a", encoding="utf-8") as f:
+            f.write(json.dumps({"execucao": run_id, "alvos": targets, "workers": workers,
+                                "parede_s": round(total, 2), "falhou": failed, "etapas": results},
+                               ensure_ascii=False) + "\n")
+    return not failed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Executa o pipeline como um DAG de etapas")
+    parser.add_argument("etapas", nargs="*", help=f"etapas-alvo (padrão: {DEFAULT_TARGET}); opções: {', '.join(STAGES)}")
+    parser.add_argument("--raiz", default=None, help="diretório do projeto (padrão: diretório atual)")
+    parser.add_argument("--workers", type=int, default=2, help="etapas independentes rodando ao mesmo tempo")
+    parser.add_argument("--forcar", action="store_true", help="roda as etapas mesmo se estiverem atualizadas")
+    parser.add_argument("--plano", action="store_true", help="só mostra o que rodaria")
+    args = parser.parse_args()
+    ok = run(args.etapas, args.raiz, args.workers, args.forcar, args.plano)
+    sys.exit(0 if ok else 1)
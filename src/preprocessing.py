@@ -2,45 +2,62 @@
 import os
 import pandas as pd
 import numpy as np
+import argparse
+import pyarrow.dataset as ds
 from datetime import timedelta
+from manifest import load_manifest, save_manifest, PREPROCESS_STATE_PATH
+from parsing import parse_valor_series, parse_dates_series
+from data_access import load
+from instrument import timed
+import cube as cube_store
+import infractors
 
 BASE = os.getcwd()
 PROC_DIR = os.path.join(BASE, "data", "processed")
+DATASET_DIR = os.path.join(PROC_DIR, "autuacoes_dataset")
 os.makedirs(PROC_DIR, exist_ok=True)
 
 def find_latest_parquet():
+    # dataset particionado gerado pelo data_ingestion.py tem prioridade
+    if os.path.isdir(DATASET_DIR):
+        return DATASET_DIR
     files = [os.path.join(PROC_DIR,f) for f in os.listdir(PROC_DIR) if f.startswith("autuacoes_processed") and f.endswith(".parquet")]
     if not files:
         raise FileNotFoundError("Nenhum autuacoes_processed*.parquet em data/processed")
     return sorted(files)[-1]
 
-def parse_valor(x):
-    if pd.isna(x): 
-        return np.nan
-    # tira pontos de milhar e troca vírgula decimal
-    try:
-        s = str(x).replace(".", "").replace(",", ".")
-        return float(s)
-    except:
-        # tenta extrair números
-        import re
-        m = re.search(r"(\d+[\.,]?\d*)", str(x))
-        if m:
-            return float(m.group(1).replace(".", "").replace(",", "."))
-        return np.nan
-
-def main():
-    p = find_latest_parquet()
-    print("Lendo:", p)
-    df = pd.read_parquet(p)
+@timed()
+def read_processed(p, **filters):
+    return load(p, **filters)
 
+@timed()
+def read_sources(keys, dataset_dir=DATASET_DIR):
+    """Lê do dataset só os arquivos gerados a partir dos CSVs em `keys`."""
+    prefixes = tuple(f"{k}-" for k in keys)
+    files = [os.path.join(root, f)
+             for root, _, fs in os.walk(dataset_dir)
+             for f in fs if f.startswith(prefixes) and f.endswith(".parquet")]
+    if not files:
+        return pd.DataFrame()
+    dataset = ds.dataset(files, format="parquet", partitioning="hive", partition_base_dir=dataset_dir)
+    return dataset.to_table().to_pandas()
+
+def build_infrator_id(df):
+    # CPF/CNPJ normalizado (filiais na raiz do CNPJ), senão num_pessoa_infrator ou nome; ver infractors.py
+    return infractors.infrator_keys(df)
+
+@timed()
+def clean_rows(df):
+    """Transformações linha a linha: datas, coordenadas, multa, gravidade, infrator."""
     # normaliza colunas (já feito mas garantimos)
     df.columns = [c.strip().lower().replace(" ", "_") for c in df.columns]
 
     # datas: usar 'dat_hora_auto_infracao' ou 'dt_fato_infracional' como referência
     for col in ["dat_hora_auto_infracao", "dt_fato_infracional", "dt_inicio_ato_inequivoco", "dt_fim_ato_inequivoco", "dt_lancamento"]:
         if col in df.columns:
-            df[col] = pd.to_datetime(df[col], errors="coerce", dayfirst=True)
+            df[col], bad = parse_dates_series(df[col])
+            if bad:
+                print(f"  {col}: {bad} datas não reconhecidas")
 
     # lat/lon
     lat_cols = ["num_latitude_auto", "num_latitude_auto", "num_latitude_auto"]  # placeholder
@@ -58,7 +75,9 @@ def main():
 
     # valor da multa: coluna val_auto_infracao (ex: "15000,00")
     if "val_auto_infracao" in df.columns:
-        df["valor_multa"] = df["val_auto_infracao"].apply(parse_valor)
+        df["valor_multa"], bad = parse_valor_series(df["val_auto_infracao"])
+        if bad:
+            print(f"  val_auto_infracao: {bad} valores não reconhecidos")
     else:
         df["valor_multa"] = np.nan
 
@@ -68,11 +87,7 @@ def main():
     else:
         df["gravidade_nivel"] = np.nan
 
-    # coluna de agência/empresa infratora: preferir cpf_cnpj_infrator ou nome_infrator
-    if "cpf_cnpj_infrator" in df.columns:
-        df["infrator_id"] = df["cpf_cnpj_infrator"].fillna(df.get("num_pessoa_infrator", np.nan)).astype(str)
-    else:
-        df["infrator_id"] = df.get("num_pessoa_infrator", df.get("nome_infrator", "")).astype(str)
+    df["infrator_id"] = build_infrator_id(df)
 
     # campo de município/uf já existem: 'municipio','uf'
     df["municipio"] = df["municipio"].fillna("UNKNOWN")
@@ -84,59 +99,245 @@ def main():
     else:
         df["year_month"] = pd.NaT
 
-    # Feature: contagem de autuações por infrator nos últimos 365 dias (rolling)
+    return df
+
+# janelas (em dias) das features de histórico por infrator
+ROLLING_WINDOWS = (30, 90, 365)
+
+@timed()
+def rolling_counts(group, dates, values=None, windows=ROLLING_WINDOWS):
+    """
+    Para cada evento conta quantos eventos do mesmo grupo ocorreram nos `w` dias
+    anteriores (intervalo [t - w, t), exclui o próprio evento e os do mesmo instante)
+    e, se `values` for dado, a soma desses valores.
+
+    Vetorizado: ordena por (grupo, data) uma vez e codifica os dois numa chave int64
+    crescente; cada janela vira dois `searchsorted` sobre essa chave, O(n log n) no
+    total, sem loop por infrator.
+    Retorna {w: (contagens, somas)} alinhado com a entrada; datas nulas ficam com 0.
+    """
+    codes = pd.factorize(group)[0].astype(np.int64)
+    dates = pd.to_datetime(pd.Series(dates))
+    # grupo nulo (infrator não identificado) não tem histórico
+    valid = dates.notna().to_numpy() & (codes >= 0)
+    t = dates.to_numpy(dtype="datetime64[s]").astype(np.int64)
+
+    n = len(codes)
+    out = {w: (np.zeros(n, dtype=np.int32), np.zeros(n, dtype=np.float64)) for w in windows}
+    if not valid.any():
+        return out
+
+    idx = np.flatnonzero(valid)
+    t0 = t[idx].min()
+    rel = t[idx] - t0
+    span = int(rel.max()) + max(windows) * 86400 + 1
+    key = codes[idx] * span + rel
+    order = np.argsort(key, kind="stable")
+    key = key[order]
+
+    # fim da janela: primeiro evento do mesmo instante (empates não se contam entre si)
+    right = np.searchsorted(key, key, side="left")
+    if values is not None:
+        v = np.nan_to_num(np.asarray(values, dtype=np.float64)[idx][order])
+        csum = np.concatenate([[0.0], np.cumsum(v)])
+    for w in windows:
+        left = np.searchsorted(key, key - w * 86400, side="left")
+        counts, sums = out[w]
+        counts[idx[order]] = right - left
+        if values is not None:
+            sums[idx[order]] = csum[right] - csum[left]
+    return out
+
+@timed()
+def add_rolling_features(df, windows=ROLLING_WINDOWS):
+    # Features: autuações e soma de multas por infrator nas janelas de 30/90/365 dias
     if "dat_hora_auto_infracao" in df.columns:
-        df = df.sort_values("dat_hora_auto_infracao")
-        # para cada infrator contar eventos anteriores 365 dias
-        df["autuacoes_365d"] = 0
-        # cálculo eficiente por groupby
-        def count_last365(sub):
-            sub = sub.sort_values("dat_hora_auto_infracao")
-            dates = sub["dat_hora_auto_infracao"]
-            counts = []
-            from bisect import bisect_left
-            for i, d in enumerate(dates):
-                window_start = d - pd.Timedelta(days=365)
-                # número de elementos >= window_start and < d  (exclui corrente)
-                j = bisect_left(dates.tolist(), window_start)
-                cnt = i - j
-                counts.append(cnt)
-            sub["autuacoes_365d"] = counts
-            return sub
-        try:
-            df = df.groupby("infrator_id", group_keys=False).apply(count_last365)
-        except Exception:
-            df["autuacoes_365d"] = 0
+        values = df["valor_multa"].to_numpy() if "valor_multa" in df.columns else None
+        res = rolling_counts(df["infrator_id"].to_numpy(), df["dat_hora_auto_infracao"], values, windows)
+        for w, (counts, sums) in res.items():
+            df[f"autuacoes_{w}d"] = counts
+            if values is not None:
+                df[f"soma_multas_{w}d"] = sums
+        df = df.sort_values("dat_hora_auto_infracao", kind="stable")
     else:
-        df["autuacoes_365d"] = 0
+        for w in windows:
+            df[f"autuacoes_{w}d"] = 0
+    return df
+
+# Schema do clean_autuacoes.parquet (e do sample do dashboard).
+# Códigos repetidos viram category (dictionary no parquet), coordenadas float32 e
+# contagens int32. Valores em R$ continuam float64 para as somas não perderem centavos.
+CLEAN_SCHEMA = {
+    "uf": "category",
+    "municipio": "category",
+    "infrator_id": "category",
+    "infrator_idx": "int32",
+    "arquivo_origem": "category",
+    "ano": "Int16",
+    "lat": "float32",
+    "lon": "float32",
+    "gravidade_nivel": "float32",
+    "valor_multa": "float64",
+}
+for _w in ROLLING_WINDOWS:
+    CLEAN_SCHEMA[f"autuacoes_{_w}d"] = "int32"
+    CLEAN_SCHEMA[f"soma_multas_{_w}d"] = "float64"
 
-    # Agregação por município
-    agg = df.groupby(["uf","municipio"], dropna=False).agg(
-        qtd_autuacoes = ("seq_auto_infracao","count"),
-        soma_multas = ("valor_multa","sum"),
-        media_gravidade = ("gravidade_nivel","mean"),
-        qtd_com_coord = ("lat","count")
-    ).reset_index()
+# demais colunas texto viram category quando há poucos valores distintos por linha
+CATEGORY_MAX_RATIO = 0.5
+ROW_GROUP_ROWS = 100_000
 
+def apply_schema(df, infer=True):
+    """
+    Aplica CLEAN_SCHEMA às colunas presentes. Com `infer`, também converte para
+    category as colunas texto não declaradas com baixa cardinalidade (só na escrita:
+    na leitura o parquet já traz esses tipos).
+    """
+    for col, dtype in CLEAN_SCHEMA.items():
+        if col in df.columns and str(df[col].dtype) != dtype:
+            df[col] = df[col].astype(dtype)
+    if infer:
+        for col in df.columns:
+            if col in CLEAN_SCHEMA or df[col].dtype != object:
+                continue
+            n = df[col].notna().sum()
+            if n and df[col].nunique() <= CATEGORY_MAX_RATIO * n:
+                df[col] = df[col].astype("category")
+    return df
+
+def memory_mb(df):
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
+
+@timed()
+def write_clean(df, path):
+    before = memory_mb(df)
+    df = apply_schema(df)
+    print(f"  memória: {before:.1f} MB -> {memory_mb(df):.1f} MB com o schema compacto")
+    # row groups menores: filtros por data (arquivo ordenado) pulam mais dados na leitura
+    df.to_parquet(path, index=False, row_group_size=ROW_GROUP_ROWS)
+    return df
+
+@timed()
+def read_clean(path, columns=None, **filters):
+    """
+    Lê um parquet gerado pelo preprocessing já com os tipos de CLEAN_SCHEMA.
+    `columns` e os filtros (uf, date_from, date_to) vão para data_access.load.
+    """
+    return apply_schema(load(path, columns=columns, **filters), infer=False)
+
+@timed()
+def build_aggregates(cube):
+    # Agregação por município, a partir do cubo (sem reler as autuações)
+    agg = cube_store.rollup(cube, ["uf", "municipio"])
+    return agg[["uf", "municipio", "qtd_autuacoes", "soma_multas", "media_gravidade", "qtd_com_coord"]]
+
+def save_outputs(df, agg, cube):
     # salva arquivos
     clean_path = os.path.join(PROC_DIR, "clean_autuacoes.parquet")
     sample_path = os.path.join(PROC_DIR, "sample_for_dashboard.parquet")
     agg_path = os.path.join(PROC_DIR, "agg_municipio.parquet")
 
     print("Salvando:", clean_path)
-    df.to_parquet(clean_path, index=False)
+    df = write_clean(df, clean_path)
     print("Salvando sample:", sample_path)
     # reduzir colunas para dashboard (evita textos enormes)
     cols_dashboard = ["seq_auto_infracao","dat_hora_auto_infracao","municipio","uf","infrator_id","valor_multa","gravidade_nivel","lat","lon","autuacoes_365d","des_infracao"]
     cols_dashboard = [c for c in cols_dashboard if c in df.columns]
-    df[cols_dashboard].head(50000).to_parquet(sample_path, index=False)
+    write_clean(df[cols_dashboard].head(50000).copy(), sample_path)
     print("Salvando agregação por município:", agg_path)
     agg.to_parquet(agg_path, index=False)
+    cube_store.save(cube)
 
     print("Concluído. Outputs:")
     print(" -", clean_path)
     print(" -", sample_path)
     print(" -", agg_path)
+    print(" -", cube_store.CUBE_PATH)
+
+def incremental_plan():
+    """
+    Compara o manifesto da ingestão com o estado do último preprocessing.
+    Retorna (alterados, removidos, manifesto) ou None se for preciso processar tudo.
+    """
+    clean_path = os.path.join(PROC_DIR, "clean_autuacoes.parquet")
+    if not (os.path.isdir(DATASET_DIR) and os.path.exists(clean_path) and os.path.exists(PREPROCESS_STATE_PATH)):
+        return None
+    ingested = load_manifest()["arquivos"]
+    state = load_manifest(PREPROCESS_STATE_PATH)
+    done = state["arquivos"]
+    if not ingested or state.get("versao_chave_infrator") != infractors.KEY_VERSION:
+        # chaves de infrator gravadas com outra regra: o histórico inteiro é refeito
+        return None
+    changed = sorted(k for k, e in ingested.items() if done.get(k) != e["sha256"])
+    removed = sorted(set(done) - set(ingested))
+    return changed, removed, ingested
+
+def save_state(ingested):
+    save_manifest({"arquivos": {k: e["sha256"] for k, e in ingested.items()},
+                   "versao_chave_infrator": infractors.KEY_VERSION}, PREPROCESS_STATE_PATH)
+
+@timed()
+def index_infractors(df):
+    """Índice de infratores (ver infractors.py) e a coluna infrator_idx (id int32, -1 = não identificado)."""
+    dates = df["dat_hora_auto_infracao"] if "dat_hora_auto_infracao" in df.columns else pd.Series(pd.NaT, index=df.index)
+    index, ids = infractors.InfractorIndex.build(df["infrator_id"], dates, df.get("valor_multa"))
+    df["infrator_idx"] = ids
+    return index
+
+def main(full=False):
+    plan = None if full else incremental_plan()
+    if plan is None:
+        p = find_latest_parquet()
+        print("Lendo:", p)
+        df = clean_rows(read_processed(p))
+        df = add_rolling_features(df)
+        cube = cube_store.build_cube(df)
+    else:
+        changed, removed, ingested = plan
+        if not changed and not removed:
+            print("Nada novo desde o último preprocessing.")
+            return
+        print("Arquivos novos/alterados:", changed or "-", "| removidos:", removed or "-")
+        clean_path = os.path.join(PROC_DIR, "clean_autuacoes.parquet")
+        df = read_clean(clean_path)
+        dropped = df["arquivo_origem"].isin(changed + removed)
+        # o histórico de 365 dias só muda para infratores que ganharam ou perderam linhas
+        affected = set(df.loc[dropped, "infrator_id"])
+        df = df[~dropped]
+        new = read_sources(changed) if changed else pd.DataFrame()
+        print(f"Linhas mantidas: {len(df)} | linhas novas: {len(new)}")
+        if len(new):
+            new = clean_rows(new)
+        # cubo: só as células dos arquivos trocados são refeitas
+        cube = cube_store.load()
+        if cube is not None:
+            cube = cube_store.replace_sources(cube, new, changed + removed)
+        if len(new):
+            affected.update(new["infrator_id"])
+            df = pd.concat([df, new], ignore_index=True)
+        mask = df["infrator_id"].isin(affected)
+        if mask.any():
+            df = pd.concat([df[~mask], add_rolling_features(df[mask].copy())], ignore_index=True)
+        # o concat com linhas novas (ainda sem as features) promove as contagens a float
+        for w in ROLLING_WINDOWS:
+            df[f"autuacoes_{w}d"] = df[f"autuacoes_{w}d"].fillna(0).astype(np.int32)
+        df = df.sort_values("dat_hora_auto_infracao", kind="stable").reset_index(drop=True)
+
+    if cube is None:
+        cube = cube_store.build_cube(df)
+    # posições do índice = linhas do clean_autuacoes.parquet, na ordem gravada
+    df = df.reset_index(drop=True)
+    index = index_infractors(df)
+    save_outputs(df, build_aggregates(cube), cube)
+    index.save()
+    if "arquivo_origem" in df.columns:
+        ingested = load_manifest()["arquivos"]
+        if ingested:
+            save_state(ingested)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Limpeza e features das autuações do IBAMA")
+    parser.add_argument("--completo", action="store_true",
+                        help="reprocessa todo o histórico em vez de só os arquivos novos")
+    args = parser.parse_args()
+    main(full=args.completo)
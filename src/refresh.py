@@ -0,0 +1,192 @@
+# src/refresh.py
+"""
+Atualização mensal dos modelos sem retreinar todo o histórico.
+
+Quando chega um mês novo de autuações:
+ - o preprocessor atual é mantido (o StandardScaler não muda, então os limiares das
+   árvores antigas continuam valendo) e ganha colunas one-hot no fim só para as UFs
+   e municípios que ele ainda não conhecia (model.ExtendedPreprocessor);
+ - classificador, regressor e IsolationForest ganham um membro novo treinado só com o
+   período novo; o modelo final é a média dos membros ponderada pelas linhas de treino
+   de cada período (model.PeriodEnsemble), seja o membro uma floresta ou não;
+   cada membro antigo lê apenas as colunas que existiam quando foi treinado;
+ - o fim do período novo (por data) fica de holdout e modelo anterior e atualizado
+   são comparados nele. Se o atualizado piorar além de --tolerancia, os arquivos em
+   models/ não são trocados (a não ser com --forcar).
+
+Para voltar a um modelo único, rode o model.py (treino completo).
+
+Uso:
+    python src/refresh.py                     # período depois do último treino/refresh
+    python src/refresh.py --desde 2024-06-01 --arvores 50
+"""
+import os
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.base import clone
+from sklearn.metrics import accuracy_score, f1_score, mean_absolute_error, mean_squared_error
+from math import sqrt
+from datetime import datetime
+from preprocessing import read_clean
+from model import (MODEL_COLUMNS, MODEL_DIR, FEATURE_KEY_PATH, ExtendedPreprocessor, PeriodEnsemble,
+                   find_clean, build_target_and_features, target_thresholds, fit_input, period, uses_text)
+import feature_store
+import artifacts
+
+HOLDOUT_FRAC = 0.2
+NEW_TREES = 50
+TOLERANCE = 0.02
+
+def known_categories(pre):
+    """Categorias já codificadas por coluna categórica (inclui as de refreshes anteriores)."""
+    if isinstance(pre, ExtendedPreprocessor):
+        known = known_categories(pre.base)
+        for c, cats in zip(pre.cat_cols, pre.extra.categories_):
+            known.setdefault(c, set()).update(cats)
+        return known
+    cols = next((cols for name, _, cols in pre.transformers_ if name == "cat"), [])
+    enc = pre.named_transformers_["cat"]
+    return {c: set(cats) for c, cats in zip(cols, enc.categories_)}
+
+def _n_cols(pre):
+    return len(pre.get_feature_names_out())
+
+def new_member(previous, n_trees):
+    """Estimador do mesmo tipo/parâmetros do modelo anterior, com `n_trees` árvores."""
+    base = previous.members[-1][0] if isinstance(previous, PeriodEnsemble) else previous
+    est = clone(base)
+    if "n_estimators" in est.get_params():
+        est.set_params(n_estimators=n_trees)
+    if "n_jobs" in est.get_params():
+        est.set_params(n_jobs=-1)
+    return est
+
+def _metrics(y_cls, pred_cls, y_reg, pred_reg):
+    return {"accuracy": accuracy_score(y_cls, pred_cls), "f1_macro": f1_score(y_cls, pred_cls, average="macro"),
+            "mae": mean_absolute_error(y_reg, pred_reg), "rmse": sqrt(mean_squared_error(y_reg, pred_reg))}
+
+def refresh(date_from=None, date_to=None, n_trees=NEW_TREES, holdout_frac=HOLDOUT_FRAC,
+            tolerance=TOLERANCE, force=False, compression=None):
+    t_start = time.perf_counter()
+    manifest = artifacts.load_manifest(MODEL_DIR)
+    if manifest is None:
+        raise FileNotFoundError("models/manifest.json não encontrado: rode o model.py antes do refresh")
+    if date_from is None:
+        if not manifest.get("periodo"):
+            raise ValueError("o manifest não tem o período do último treino; informe --desde")
+        # o filtro é inclusivo: começa logo depois da última autuação já vista
+        date_from = pd.Timestamp(manifest["periodo"]["fim"]) + pd.Timedelta(seconds=1)
+    uf = manifest.get("params", {}).get("uf")
+
+    path = find_clean()
+    print("Lendo dados:", path)
+    pre, clf, reg, iso = (artifacts.load_model(name, MODEL_DIR, mmap=False) for name in artifacts.ARTIFACTS)
+
+    # classes de risco com os limiares do histórico, não os do mês novo
+    history = read_clean(path, columns=["gravidade_nivel", "valor_multa"], uf=uf,
+                         date_to=pd.Timestamp(date_from) - pd.Timedelta(seconds=1))
+    thresholds = target_thresholds(history)
+    # peso do modelo anterior no ensemble (um PeriodEnsemble anterior é repartido entre os membros)
+    old_rows = manifest.get("linhas_treino") or len(history)
+    del history
+
+    df = read_clean(path, columns=MODEL_COLUMNS, uf=uf, date_from=date_from, date_to=date_to)
+    if len(df) < 10:
+        print(f"Só {len(df)} linhas novas desde {date_from}; nada a atualizar")
+        return None
+    df = df.sort_values("dat_hora_auto_infracao", kind="stable").reset_index(drop=True)
+    X, y_cls, y_reg, _ = build_target_and_features(df, thresholds, text=uses_text(pre))
+    cut = int(len(X) * (1 - holdout_frac))
+    print(f"{len(X)} linhas novas ({cut} treino, {len(X) - cut} holdout)")
+
+    known = known_categories(pre)
+    new_cats = {}
+    for c in known:
+        seen = set(X[c].dropna().astype(str).unique())
+        if seen - known[c]:
+            new_cats[c] = seen - known[c]
+    if new_cats:
+        print("Categorias novas:", {c: len(v) for c, v in new_cats.items()})
+        new_pre = ExtendedPreprocessor(pre, new_cats).fit(X.iloc[:cut])
+    else:
+        new_pre = pre
+
+    Xt = new_pre.transform(X)
+    if sp.issparse(Xt):
+        Xt = Xt.tocsr()
+    X_train, X_hold = Xt[:cut], Xt[cut:]
+    y_cls_train, y_cls_hold = y_cls.to_numpy()[:cut], y_cls.to_numpy()[cut:]
+    y_reg_train, y_reg_hold = y_reg.to_numpy()[:cut], y_reg.to_numpy()[cut:]
+
+    n_old, n_new = _n_cols(pre), _n_cols(new_pre)
+    refreshed = {}
+    for name, old, y in (("rf_clf", clf, y_cls_train), ("rf_reg", reg, y_reg_train), ("iso_forest", iso, None)):
+        t0 = time.perf_counter()
+        est = new_member(old, n_trees)
+        if y is None:
+            est.fit(fit_input(est, X_train))
+        else:
+            est.fit(fit_input(est, X_train), y)
+        # um PeriodEnsemble anterior é achatado mantendo o nº de colunas e o peso de cada membro
+        refreshed[name] = PeriodEnsemble([(old, n_old, old_rows), (est, n_new, cut)])
+        print(f"{name}: membro novo ({cut} linhas) em {time.perf_counter() - t0:.1f}s")
+
+    X_hold_old = X_hold[:, :n_old]
+    before = _metrics(y_cls_hold, clf.predict(fit_input(clf, X_hold_old)),
+                      y_reg_hold, reg.predict(fit_input(reg, X_hold_old)))
+    after = _metrics(y_cls_hold, refreshed["rf_clf"].predict(X_hold), y_reg_hold, refreshed["rf_reg"].predict(X_hold))
+    print(f"{'holdout':10s} {'anterior':>12s} {'atualizado':>12s}")
+    for k in before:
+        print(f"{k:10s} {before[k]:12.4f} {after[k]:12.4f}")
+
+    worse = after["f1_macro"] < before["f1_macro"] * (1 - tolerance) or after["mae"] > before["mae"] * (1 + tolerance)
+    if worse and not force:
+        print("Modelo atualizado pior que o anterior no holdout; models/ mantido (use --forcar para gravar)")
+        return None
+
+    compression = compression or manifest.get("artefatos", {}).get("rf_clf", {}).get("compressao", "nenhuma")
+    saved = {"preprocessor": artifacts.save_model("preprocessor", new_pre, MODEL_DIR, compression)}
+    for name, model in refreshed.items():
+        saved[name] = artifacts.save_model(name, model, MODEL_DIR, compression)
+
+    new_period = period(df)
+    manifest.update(
+        treinado_em=datetime.now().isoformat(timespec="seconds"),
+        # os membros novos viram o clean atual: o manifest descreve esses dados, não os do treino anterior
+        fonte=path,
+        data_sha256=feature_store.data_hash(path),
+        linhas_treino=manifest.get("linhas_treino", 0) + cut,
+        periodo={"inicio": (manifest.get("periodo") or new_period)["inicio"], "fim": new_period["fim"]},
+        colunas_transformadas=new_pre.get_feature_names_out().tolist(),
+        metricas={k: float(v) for k, v in after.items()},
+        artefatos=saved,
+    )
+    manifest.setdefault("atualizacoes", []).append({
+        "em": manifest["treinado_em"], "periodo": new_period, "linhas": len(X), "arvores_novas": n_trees,
+        "categorias_novas": {c: len(v) for c, v in new_cats.items()},
+        "holdout_anterior": {k: float(v) for k, v in before.items()},
+        "holdout_atualizado": {k: float(v) for k, v in after.items()},
+    })
+    artifacts.save_manifest(manifest, MODEL_DIR)
+    # a matriz em cache foi gerada pelo preprocessor anterior: o scoring não pode reaproveitá-la
+    if os.path.exists(FEATURE_KEY_PATH):
+        os.remove(FEATURE_KEY_PATH)
+    print(f"Modelos atualizados em {time.perf_counter() - t_start:.1f}s e salvos em", MODEL_DIR)
+    return after
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Atualiza os modelos com um período novo, sem treino completo")
+    parser.add_argument("--desde", help="início do período novo (padrão: depois do fim do último treino)")
+    parser.add_argument("--ate", help="fim do período novo (AAAA-MM-DD)")
+    parser.add_argument("--arvores", type=int, default=NEW_TREES, help="árvores novas por floresta")
+    parser.add_argument("--holdout", type=float, default=HOLDOUT_FRAC, help="fração final do período usada na comparação")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCE,
+                        help="piora relativa aceita em f1_macro e MAE antes de recusar a atualização")
+    parser.add_argument("--forcar", action="store_true", help="grava mesmo se o holdout piorar")
+    parser.add_argument("--compressao", choices=artifacts.COMPRESSIONS,
+                        help="compressão dos .joblib (padrão: a do treino anterior)")
+    args = parser.parse_args()
+    refresh(args.desde, args.ate, args.arvores, args.holdout, args.tolerancia, args.forcar, args.compressao)
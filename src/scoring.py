@@ -0,0 +1,206 @@
+# src/scoring.py
+"""
+Aplica os modelos treinados pelo model.py a todas as autuações.
+
+Entradas:
+ - data/processed/clean_autuacoes.parquet
+ - models/preprocessor.joblib, rf_clf.joblib, rf_reg.joblib, iso_forest.joblib
+
+Saídas:
+ - data/processed/scored_autuacoes.parquet: colunas de identificação usadas pelo
+   dashboard + pred_risco, valor_multa_previsto, iso_score e iso_flag
+ - data/processed/cube_autuacoes.parquet: o cubo de agregados (ver cube.py) refeito
+   com pred_risco e anomalias, somando os cubos de cada batch
+
+O parquet é lido em record batches e cada batch é pontuado (preprocessor + os três
+modelos) num processo do pool. Só alguns batches ficam em voo ao mesmo tempo, então a
+memória não cresce com o arquivo.
+
+Com o start method "fork" (padrão no Linux) os modelos são carregados uma vez no
+processo principal e herdados pelos workers: as árvores ficam nas mesmas páginas de
+memória em todos os processos. Nos outros start methods cada worker carrega os
+artefatos (com mmap quando gravados sem compressão, ver artifacts.py).
+"""
+import os
+import json
+import time
+import argparse
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from data_access import open_dataset, build_filter
+from model import (MODEL_COLUMNS, MODEL_DIR, PROC_DIR, FEATURE_KEY_PATH, find_clean, build_features,
+                   feature_code_hash, uses_text)
+import feature_store
+import artifacts
+import cube as cube_store
+from instrument import timed
+
+SCORED_PATH = os.path.join(PROC_DIR, "scored_autuacoes.parquet")
+BATCH_ROWS = 50_000
+
+# copiadas da entrada para a saída, sem passar pelos modelos
+PASSTHROUGH_COLUMNS = ["seq_auto_infracao", "dat_hora_auto_infracao", "municipio", "uf", "infrator_id",
+                       "nome_infrator", "valor_multa", "gravidade_nivel", "lat", "lon", "autuacoes_365d",
+                       "des_infracao", "arquivo_origem"]
+CUBE_COLUMNS = ["arquivo_origem", "uf", "municipio", "dat_hora_auto_infracao", "gravidade_nivel",
+                "valor_multa", "lat", "pred_risco", "iso_flag"]
+
+_models = None
+
+@timed()
+def load_models(model_dir=MODEL_DIR, n_jobs=1):
+    t0 = time.perf_counter()
+    pre, clf, reg, iso = (artifacts.load_model(name, model_dir) for name in artifacts.ARTIFACTS)
+    print(f"Modelos carregados em {time.perf_counter() - t0:.2f}s")
+    # com vários processos o paralelismo vem do pool, não das threads de cada floresta
+    for m in (clf, reg, iso):
+        m.n_jobs = n_jobs
+    return pre, clf, reg, iso
+
+def _init_worker(model_dir):
+    global _models
+    if _models is None:
+        _models = load_models(model_dir, n_jobs=1)
+
+@timed()
+def score_frame(df, models=None):
+    """Pontua um DataFrame com as colunas de MODEL_COLUMNS; retorna dict de arrays."""
+    models = models or _models
+    X, _ = build_features(df, copy=False, text=uses_text(models[0]))
+    return score_matrix(models[0].transform(X), models)
+
+@timed()
+def score_matrix(Xt, models=None):
+    """Pontua linhas já transformadas pelo preprocessor."""
+    pre, clf, reg, iso = models or _models
+    iso_score = iso.decision_function(Xt).astype(np.float32)
+    return {
+        "pred_risco": clf.predict(Xt).astype(np.int8),
+        "valor_multa_previsto": reg.predict(Xt),
+        "iso_score": iso_score,
+        # mesmo critério do IsolationForest.predict (== -1)
+        "iso_flag": iso_score < 0,
+    }
+
+def _score_table(table):
+    return score_frame(table.to_pandas())
+
+def cached_matrix(path, filters):
+    """
+    Matriz transformada do feature_store, se o treino usou exatamente este arquivo
+    (mesmo sha256 e código de features) sem filtros; None caso contrário.
+    """
+    if any(v is not None for v in filters.values()) or not os.path.exists(FEATURE_KEY_PATH):
+        return None
+    with open(FEATURE_KEY_PATH, encoding="utf-8") as f:
+        info = json.load(f)
+    p = info["params"]
+    if p["uf"] or p["date_from"] or p["date_to"]:
+        return None
+    if info["data_sha256"] != feature_store.data_hash(path) or info["code_sha256"] != feature_code_hash():
+        return None
+    cached = feature_store.load(info["key"])
+    return cached[0]["X"] if cached else None
+
+def _cached_jobs(path, X, keep_cols, batch_rows):
+    # mesma ordem das linhas usada no treino: a do arquivo
+    pos = 0
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_rows, columns=keep_cols):
+        n = batch.num_rows
+        yield pa.Table.from_batches([batch]), X[pos:pos + n]
+        pos += n
+
+def _append(writer, keep, preds, out, cube_parts):
+    table = keep
+    for name, values in preds.items():
+        table = table.append_column(name, pa.array(values))
+    if writer is None:
+        writer = pq.ParquetWriter(out, table.schema)
+    writer.write_table(table)
+    cube_parts.append(cube_store.build_cube(table.select([c for c in CUBE_COLUMNS if c in table.column_names])
+                                            .to_pandas()))
+    return writer
+
+@timed()
+def score_file(path=None, out=SCORED_PATH, workers=None, batch_rows=BATCH_ROWS, model_dir=MODEL_DIR,
+               use_cache=True, cube_path=cube_store.CUBE_PATH, **filters):
+    global _models
+    path = path or find_clean()
+    dataset = open_dataset(path)
+    names = dataset.schema.names
+    feat_cols = [c for c in MODEL_COLUMNS if c in names]
+    keep_cols = [c for c in PASSTHROUGH_COLUMNS if c in names]
+
+    X = cached_matrix(path, filters) if use_cache and model_dir == MODEL_DIR else None
+    if X is not None:
+        print("Usando a matriz de features do cache (sem refazer o preprocessor)")
+        # cada job: (colunas copiadas para a saída, função, argumento)
+        jobs = ((keep, score_matrix, Xt) for keep, Xt in _cached_jobs(path, X, keep_cols, batch_rows))
+    else:
+        cols = list(dict.fromkeys(keep_cols + feat_cols))
+        expr = build_filter(dataset.schema, **filters)
+        batches = dataset.to_batches(columns=cols, filter=expr, batch_size=batch_rows)
+        jobs = ((t.select(keep_cols), _score_table, t.select(feat_cols))
+                for t in (pa.Table.from_batches([b]) for b in batches if b.num_rows))
+
+    workers = workers or os.cpu_count() or 1
+    tmp = out + ".tmp"
+    writer = None
+    total = 0
+    cube_parts = []
+    t0 = time.perf_counter()
+    try:
+        if workers == 1:
+            models = load_models(model_dir, n_jobs=-1)
+            for keep, fn, arg in jobs:
+                preds = score_matrix(arg, models) if fn is score_matrix else score_frame(arg.to_pandas(), models)
+                writer = _append(writer, keep, preds, tmp, cube_parts)
+                total += keep.num_rows
+        else:
+            if multiprocessing.get_start_method() == "fork":
+                # carregados antes de criar o pool: os filhos herdam sem recarregar
+                _models = load_models(model_dir, n_jobs=1)
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model_dir,)) as pool:
+                pending = deque()
+                # no máximo 2 batches por processo em voo; saída na mesma ordem da entrada
+                for keep, fn, arg in jobs:
+                    pending.append((keep, pool.submit(fn, arg)))
+                    if len(pending) >= 2 * workers:
+                        keep, fut = pending.popleft()
+                        writer = _append(writer, keep, fut.result(), tmp, cube_parts)
+                        total += keep.num_rows
+                while pending:
+                    keep, fut = pending.popleft()
+                    writer = _append(writer, keep, fut.result(), tmp, cube_parts)
+                    total += keep.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if writer is None:
+        print("Nenhuma linha para pontuar.")
+        return None
+    os.replace(tmp, out)
+    # com filtros o cubo cobriria só parte dos dados: o do preprocessing é mantido
+    if cube_path and all(v is None for v in filters.values()):
+        cube_store.save(cube_store.combine(cube_parts), cube_path)
+    dt = time.perf_counter() - t0
+    print(f"{total} linhas pontuadas em {dt:.1f}s ({total / max(dt, 1e-9):,.0f} linhas/s, {workers} processo(s))")
+    print("Salvo:", out)
+    return out
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pontua todas as autuações com os modelos treinados")
+    parser.add_argument("--workers", type=int, default=None, help="processos (padrão: número de CPUs)")
+    parser.add_argument("--batch", type=int, default=BATCH_ROWS, help="linhas por record batch")
+    parser.add_argument("--uf", nargs="+", help="pontua só estas UFs")
+    parser.add_argument("--desde", help="data inicial (AAAA-MM-DD)")
+    parser.add_argument("--ate", help="data final (AAAA-MM-DD)")
+    parser.add_argument("--sem-cache", action="store_true", help="não reaproveita a matriz de features do treino")
+    args = parser.parse_args()
+    score_file(workers=args.workers, batch_rows=args.batch, use_cache=not args.sem_cache,
+               uf=args.uf, date_from=args.desde, date_to=args.ate)
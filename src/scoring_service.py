@@ -0,0 +1,266 @@
+# src/scoring_service.py
+"""
+Serviço local de scoring on-line para autos de infração individuais.
+
+Mantém o preprocessor e as florestas carregados em memória e responde:
+ - HTTP:  POST /score  (um registro JSON ou uma lista deles)
+          GET  /stats  (latência p50/p99, requisições, tamanho médio dos batches)
+ - stdin: um JSON (registro ou lista) por linha, respostas em JSON lines na stdout
+
+Requisições concorrentes são agrupadas (até --max-batch registros ou --max-wait-ms)
+numa única chamada de predict por modelo. As features são as mesmas do treino
+(preprocessing.clean_rows + model.build_features); autuacoes_365d vem do índice de
+infratores gravado pelo preprocessing (infractors.py, aberto com mmap), ou montado a
+partir do clean_autuacoes.parquet se ele não existir.
+
+Uso:
+    python src/scoring_service.py --porta 8765
+    echo '{"dat_hora_auto_infracao": "15/01/2024 10:00:00", "uf": "PA", ...}' | python src/scoring_service.py --stdin
+"""
+import sys
+import json
+import time
+import queue
+import argparse
+import threading
+from bisect import bisect_left, insort
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pandas as pd
+from preprocessing import clean_rows, read_clean
+from model import MODEL_DIR, find_clean
+from scoring import load_models, score_frame
+from infractors import InfractorIndex
+
+WINDOW_DAYS = 365
+
+class HistoryIndex:
+    """
+    Contagem de autuações por infrator numa janela: busca binária no InfractorIndex.
+    Eventos registrados depois da carga ficam em listas ordenadas à parte.
+    """
+    def __init__(self, index):
+        self.index = index
+        self._extra = {}
+
+    @classmethod
+    def from_clean(cls, path):
+        index = InfractorIndex.load()
+        if index is None:
+            df = read_clean(path, columns=["infrator_id", "dat_hora_auto_infracao"])
+            index, _ = InfractorIndex.build(df["infrator_id"].astype(object), df["dat_hora_auto_infracao"])
+        return cls(index)
+
+    def count(self, infrator_id, when, days=WINDOW_DAYS):
+        """Eventos do infrator em [when - days, when), como em preprocessing.rolling_counts."""
+        if pd.isna(when) or pd.isna(infrator_id):
+            return 0
+        t = int(pd.Timestamp(when).timestamp())
+        lo = t - days * 86400
+        n = self.index.count(self.index.id_of(infrator_id), when, days)
+        extra = self._extra.get(infrator_id)
+        if extra:
+            n += bisect_left(extra, t) - bisect_left(extra, lo)
+        return n
+
+    def add(self, infrator_id, when):
+        if not (pd.isna(when) or pd.isna(infrator_id)):
+            insort(self._extra.setdefault(infrator_id, []), int(pd.Timestamp(when).timestamp()))
+
+def records_frame(records):
+    """
+    Registros JSON -> DataFrame limpo, como as linhas do CSV no preprocessing: campo
+    ausente, null ou "" vira NaN (o read_csv lê campo vazio como NaN), então um
+    registro sem des_infracao tem o mesmo desc_len e o mesmo texto que no treino.
+    """
+    df = pd.DataFrame.from_records(records)
+    df.columns = [c.strip().lower().replace(" ", "_") for c in df.columns]
+    for c in ("dat_hora_auto_infracao", "municipio", "uf", "des_infracao"):
+        if c not in df.columns:
+            df[c] = np.nan
+    df = df.astype(object).where(df.notna() & (df != ""), np.nan)
+    return clean_rows(df)
+
+class OnlineScorer:
+    def __init__(self, model_dir=MODEL_DIR, clean_path=None, register=False):
+        t0 = time.perf_counter()
+        self.models = load_models(model_dir, n_jobs=1)
+        self.history = HistoryIndex.from_clean(clean_path or find_clean())
+        self.register = register
+        print(f"Modelos e histórico carregados em {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+
+    def score(self, records):
+        df = records_frame(records)
+        df["autuacoes_365d"] = [self.history.count(i, d) for i, d in zip(df["infrator_id"], df["dat_hora_auto_infracao"])]
+        preds = score_frame(df, self.models)
+        if self.register:
+            for i, d in zip(df["infrator_id"], df["dat_hora_auto_infracao"]):
+                self.history.add(i, d)
+        return [
+            {
+                "pred_risco": int(preds["pred_risco"][k]),
+                "valor_multa_previsto": float(preds["valor_multa_previsto"][k]),
+                "iso_score": float(preds["iso_score"][k]),
+                "iso_flag": bool(preds["iso_flag"][k]),
+                "autuacoes_365d": int(df["autuacoes_365d"].iloc[k]),
+            }
+            for k in range(len(df))
+        ]
+
+class MicroBatcher:
+    """
+    Fila única consumida por uma thread: junta as requisições que chegam dentro de
+    `max_wait_ms` (até `max_batch` registros) e pontua tudo numa chamada só.
+    """
+    def __init__(self, score_fn, max_batch=256, max_wait_ms=5.0, keep=10_000):
+        self.score_fn = score_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.latencies = deque(maxlen=keep)
+        self.requests = 0
+        self.batches = 0
+        self.records = 0
+        self._q = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, records):
+        fut = Future()
+        self._q.put((records, fut, time.perf_counter()))
+        return fut
+
+    def _run(self):
+        while True:
+            items = [self._q.get()]
+            n = len(items[0][0])
+            deadline = time.perf_counter() + self.max_wait
+            while n < self.max_batch:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._q.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                items.append(item)
+                n += len(item[0])
+
+            try:
+                results = self.score_fn([r for records, _, _ in items for r in records])
+            except Exception as e:
+                for _, fut, _ in items:
+                    fut.set_exception(e)
+                continue
+
+            done = time.perf_counter()
+            pos = 0
+            for records, fut, t0 in items:
+                fut.set_result(results[pos:pos + len(records)])
+                pos += len(records)
+                self.latencies.append((done - t0) * 1000)
+            self.requests += len(items)
+            self.batches += 1
+            self.records += n
+
+    def stats(self):
+        # sem requisições ainda as latências ficam null (NaN não é JSON válido)
+        lat = np.array(self.latencies)
+        return {
+            "requisicoes": self.requests,
+            "registros": self.records,
+            "batches": self.batches,
+            "registros_por_batch": self.records / self.batches if self.batches else 0,
+            "latencia_p50_ms": float(np.percentile(lat, 50)) if len(lat) else None,
+            "latencia_p99_ms": float(np.percentile(lat, 99)) if len(lat) else None,
+        }
+
+def make_handler(batcher, timeout=30):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, code, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/stats":
+                self._send(200, batcher.stats())
+            elif self.path == "/health":
+                self._send(200, {"ok": True})
+            else:
+                self._send(404, {"erro": "rota desconhecida"})
+
+        def do_POST(self):
+            if self.path != "/score":
+                self._send(404, {"erro": "rota desconhecida"})
+                return
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            except ValueError as e:
+                self._send(400, {"erro": f"JSON inválido: {e}"})
+                return
+            single = isinstance(payload, dict)
+            try:
+                result = batcher.submit([payload] if single else payload).result(timeout)
+            except Exception as e:
+                self._send(500, {"erro": str(e)})
+                return
+            self._send(200, result[0] if single else result)
+
+        def log_message(self, fmt, *args):
+            pass
+    return Handler
+
+def serve_stdin(batcher, out=None):
+    """Respostas em JSON lines em `out` (padrão: a stdout), na ordem das linhas de entrada."""
+    out = out or sys.stdout
+    # várias linhas em voo são agrupadas pelo batcher
+    pending = deque()
+
+    def flush(block):
+        while pending and (block or pending[0][1].done()):
+            single, fut = pending.popleft()
+            result = fut.result()
+            print(json.dumps(result[0] if single else result, ensure_ascii=False), file=out, flush=True)
+
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        payload = json.loads(line)
+        single = isinstance(payload, dict)
+        pending.append((single, batcher.submit([payload] if single else payload)))
+        flush(block=False)
+    flush(block=True)
+    print(json.dumps(batcher.stats()), file=sys.stderr)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scoring on-line de autos de infração")
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--stdin", action="store_true", help="lê JSON lines da entrada padrão em vez de abrir HTTP")
+    parser.add_argument("--max-batch", type=int, default=256)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--registrar", action="store_true",
+                        help="adiciona cada registro pontuado ao histórico (conta nas próximas autuacoes_365d)")
+    args = parser.parse_args()
+
+    out = sys.stdout
+    if args.stdin:
+        # a stdout só leva as respostas: mensagens do load_models, avisos do clean_rows
+        # ("datas não reconhecidas") etc. vão para a stderr
+        sys.stdout = sys.stderr
+    scorer = OnlineScorer(register=args.registrar)
+    batcher = MicroBatcher(scorer.score, args.max_batch, args.max_wait_ms)
+    if args.stdin:
+        serve_stdin(batcher, out)
+    else:
+        server = ThreadingHTTPServer((args.host, args.porta), make_handler(batcher))
+        print(f"Servindo em http://{args.host}:{args.porta} (POST /score, GET /stats)", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print(json.dumps(batcher.stats()), file=sys.stderr)
@@ -0,0 +1,289 @@
+# src/synthetic_data.py
+"""
+Gerador determinístico de CSVs sintéticos no formato dos autos de infração do IBAMA,
+para medir o pipeline sem o arquivo real (que não vai para o git).
+
+Reproduz as particularidades do arquivo original:
+ - 84 colunas com os nomes do IBAMA (em maiúsculas)
+ - separador ";" ou "," e encoding latin1 ou utf-8
+ - campos entre aspas e multa como texto no formato brasileiro ("15.000,00")
+ - datas dia/mês/ano ("15/01/2024 10:00:00"), com uma fração em ISO e algumas vazias
+ - cpf_cnpj_infrator com reincidentes (distribuição de Zipf), CPF e CNPJ com dígitos
+   verificadores válidos, ora formatados ("12.345.678/0001-95"), ora só dígitos, e
+   filiais diferentes da mesma empresa
+ - coordenadas ausentes em parte das linhas, gravidade ausente em algumas
+
+Mesma semente e mesmos parâmetros geram os mesmos arquivos. As linhas são geradas e
+gravadas em blocos, então 50 milhões de linhas não precisam caber na memória.
+
+Uso:
+    python src/synthetic_data.py --linhas 100000                  # data/raw/auto_infracao_<ano>.csv
+    python src/synthetic_data.py --linhas 1000000 --sep , --encoding utf-8 --saida /tmp/raw
+"""
+import os
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.compute as pc
+
+BASE = os.getcwd()
+RAW_DIR = os.path.join(BASE, "data", "raw")
+FILENAME_PREFIX = "auto_infracao"
+
+SEED = 42
+YEARS = (2022, 2023, 2024)
+CHUNK_ROWS = 250_000
+
+COLUMNS = [
+    "SEQ_AUTO_INFRACAO", "NUM_AUTO_INFRACAO", "SER_AUTO_INFRACAO", "TIPO_AUTO", "TIPO_MULTA",
+    "VAL_AUTO_INFRACAO", "PATRIMONIO_APURACAO", "GRAVIDADE_INFRACAO", "CD_NIVEL_GRAVIDADE", "UNID_ARRECADACAO",
+    "DES_AUTO_INFRACAO", "DAT_HORA_AUTO_INFRACAO", "FORMA_ENTREGA", "DAT_CIENCIA_AUTUACAO", "COD_MUNICIPIO",
+    "MUNICIPIO", "UF", "NUM_PROCESSO", "COD_INFRACAO", "DES_INFRACAO",
+    "TIPO_INFRACAO", "NOME_INFRATOR", "CPF_CNPJ_INFRATOR", "NUM_PESSOA_INFRATOR", "QTD_AREA",
+    "INFRACAO_AREA", "DES_OUTROS_TIPO_AREA", "CLASSIFICACAO_AREA", "NUM_LATITUDE_AUTO", "NUM_LONGITUDE_AUTO",
+    "DES_LOCAL_INFRACAO", "NOTIFICACAO_VINCULADA", "ACAO_FISCALIZATORIA", "UNID_CONTROLE", "TIPO_ACAO",
+    "OPERACAO", "DENUNCIA_SISLIV", "ORDEM_FISCALIZACAO", "SOLICITACAO_RECURSO", "OPERACAO_SOL_RECURSO",
+    "DT_LANCAMENTO", "DAT_ULT_ALTERACAO", "TIPO_ULT_ALTERACAO", "JUSTIFICATIVA_ALTERACAO", "ULTIMA_ATUALIZACAO_RELATORIO",
+    "DT_FATO_INFRACIONAL", "DT_INICIO_ATO_INEQUIVOCO", "DT_FIM_ATO_INEQUIVOCO", "CD_TIPO_INFRACAO", "DS_ENQUADRAMENTO_ADMINISTRATIVO",
+    "DS_ENQUADRAMENTO_NAO_ADMINISTRATIVO", "DS_ENQUADRAMENTO_COMPLEMENTAR", "DS_BIOMAS_ATINGIDOS", "DS_FATOR_AGRAVANTE", "DS_FATOR_ATENUANTE",
+    "DS_SIT_AUTO_INFRACAO", "CD_RECEITA_AUTO_INFRACAO", "DES_RECEITA", "TP_PESSOA_INFRATOR", "SQ_PESSOA",
+    "DS_REFERENCIA_ACAO_FISCALIZATORIA", "DS_ACAO_FISCALIZATORIA", "DS_INFRACAO_AMBIENTAL", "TIPO_DOCUMENTO", "NUM_DOCUMENTO",
+    "CD_MUNICIPIO_IBGE", "SG_UF_INFRATOR", "MUNICIPIO_INFRATOR", "CEP_INFRATOR", "DS_ENDERECO_INFRATOR",
+    "NU_CPF_CNPJ_RESPONSAVEL", "NOME_RESPONSAVEL", "ST_CIENCIA", "DT_CIENCIA", "FORMA_CIENCIA",
+    "ST_DEFESA", "DT_DEFESA", "ST_JULGAMENTO", "DT_JULGAMENTO", "VAL_JULGADO",
+    "ST_PAGAMENTO", "DT_PAGAMENTO", "VAL_PAGO", "ST_DIVIDA_ATIVA",
+]
+assert len(COLUMNS) == 84
+
+# UF -> (peso, lat, lon aproximados do centro); a Amazônia Legal concentra as autuações
+UFS = {
+    "PA": (18, -4.0, -52.5), "MT": (14, -12.6, -55.9), "AM": (10, -4.1, -63.1), "RO": (9, -10.9, -62.8),
+    "MA": (6, -5.4, -45.3), "TO": (4, -10.2, -48.3), "AC": (4, -9.0, -70.5), "RR": (3, 2.0, -61.4),
+    "AP": (2, 1.4, -51.8), "BA": (4, -12.5, -41.7), "MG": (4, -18.5, -44.6), "GO": (3, -15.8, -49.8),
+    "MS": (3, -20.5, -54.6), "PR": (2, -24.6, -51.6), "SC": (1, -27.2, -50.2), "RS": (2, -29.7, -53.3),
+    "SP": (3, -22.3, -48.6), "RJ": (1, -22.3, -42.6), "ES": (1, -19.6, -40.7), "PI": (1, -7.7, -42.7),
+    "CE": (1, -5.2, -39.5), "RN": (1, -5.8, -36.6), "PB": (1, -7.1, -36.8), "PE": (1, -8.4, -37.9),
+    "AL": (1, -9.6, -36.6), "SE": (1, -10.6, -37.4), "DF": (1, -15.8, -47.9),
+}
+MUNICIPIOS_POR_UF = 60
+PREFIXES = ["São", "Santa", "Nova", "Porto", "Vila", "Bom Jesus do", "Conceição do", "Santo Antônio do"]
+SUFFIXES = ["Araguaia", "Xingu", "Tapajós", "Guaporé", "Paraíso", "Esperança", "Rio Branco", "Itaúna",
+            "Jamanxim", "Juruena", "Madeira", "Purus"]
+
+DESCRIPTIONS = [
+    "Destruir {n} hectares de floresta nativa no bioma Amazônia sem autorização do órgão ambiental competente",
+    "Desmatar a corte raso {n} hectares de vegetação nativa em área de reserva legal",
+    "Impedir a regeneração natural de {n} hectares de floresta em área embargada",
+    "Receber e armazenar {n} m³ de madeira serrada sem licença válida para todo o tempo da viagem",
+    "Fazer funcionar atividade potencialmente poluidora sem licença ambiental ({n} dias de operação)",
+    "Transportar {n} espécimes da fauna silvestre sem autorização",
+    "Lançar resíduos em corpo hídrico em desacordo com as exigências (volume de {n} m³)",
+    "Elaborar ou apresentar informação falsa no sistema oficial de controle (DOF), {n} registros",
+]
+SITUACOES = ["Em andamento", "Quitado", "Cancelado", "Inscrito em dívida ativa", "Em recurso"]
+BIOMAS = ["Amazônia", "Cerrado", "Mata Atlântica", "Caatinga", "Pantanal", "Pampa"]
+
+OFFENDERS_PER_ROW = 0.08  # tamanho do cadastro de infratores em relação ao nº de linhas
+ZIPF_A = 1.6              # quanto menor, mais concentrada a reincidência
+MISSING_COORD = 0.2
+MISSING_GRAVIDADE = 0.03
+ISO_DATES = 0.01
+MISSING_DATES = 0.001
+
+def _check_digits(digits, weights_1, weights_2):
+    """Dois dígitos verificadores (módulo 11, como CPF e CNPJ) de cada linha de `digits`."""
+    r = (digits * weights_1).sum(axis=1) % 11
+    d1 = np.where(r < 2, 0, 11 - r)
+    digits = np.column_stack([digits, d1])
+    r = (digits * weights_2).sum(axis=1) % 11
+    d2 = np.where(r < 2, 0, 11 - r)
+    return np.column_stack([digits, d2])
+
+def cnpj_digits(base12):
+    return _check_digits(base12, np.array([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]),
+                         np.array([6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]))
+
+def cpf_digits(base9):
+    return _check_digits(base9, np.arange(10, 1, -1), np.arange(11, 1, -1))
+
+def _join(digits):
+    # cada linha de dígitos vira os bytes ASCII de uma string de largura fixa
+    chars = np.ascontiguousarray(digits.astype(np.uint8) + ord("0"))
+    return pd.Series(chars.view(f"S{digits.shape[1]}").ravel().astype(str), dtype=object)
+
+def _formatted(ids, is_cnpj):
+    """Documento formatado (pontos, barra e traço) a partir só dos dígitos."""
+    out = ids.copy()
+    cn, cp = is_cnpj, ~is_cnpj
+    s = ids[cn]
+    out[cn] = s.str[:2] + "." + s.str[2:5] + "." + s.str[5:8] + "/" + s.str[8:12] + "-" + s.str[12:]
+    s = ids[cp]
+    out[cp] = s.str[:3] + "." + s.str[3:6] + "." + s.str[6:9] + "-" + s.str[9:]
+    return out
+
+def offender_pool(n, rng):
+    """
+    Cadastro de `n` infratores: (raiz de 8 dígitos do CNPJ ou CPF de 9, é CNPJ, nome,
+    ordem de reincidência). Os dígitos verificadores são calculados por linha, já com
+    a filial sorteada.
+    """
+    is_cnpj = rng.random(n) < 0.6
+    base = rng.integers(0, 10, size=(n, 9))
+    names = np.where(is_cnpj, "EMPRESA ", "PRODUTOR ")
+    names = pd.Series(names, dtype=object) + pd.Series(np.arange(1, n + 1)).astype(str)
+    # o k-ésimo infrator mais reincidente não é o k-ésimo do cadastro
+    return base, is_cnpj, names.to_numpy(), rng.permutation(n)
+
+def _money(values):
+    """12345.6 -> "12.345,60"."""
+    reais = np.floor(values).astype(np.int64)
+    cents = np.round((values - reais) * 100).astype(np.int64)
+    txt = pd.Series(reais).map("{:,}".format).str.replace(",", ".", regex=False)
+    return (txt + "," + pd.Series(cents).map("{:02d}".format)).to_numpy()
+
+def _dates(rng, n, years):
+    start = np.datetime64(f"{min(years)}-01-01T00:00:00", "s").astype(np.int64)
+    end = np.datetime64(f"{max(years) + 1}-01-01T00:00:00", "s").astype(np.int64)
+    return rng.integers(start, end, size=n).astype("datetime64[s]")
+
+def _strftime(dates, fmt):
+    # pyarrow formata em C++; o strftime do pandas passa por objetos Python
+    return pc.strftime(pa.array(dates), format=fmt)
+
+def generate_chunk(rng, n, first_seq, years, pool, municipios):
+    base, is_cnpj, names, rank = pool
+    # reincidência: poucos infratores concentram muitas autuações
+    who = rank[(rng.zipf(ZIPF_A, size=n) - 1) % len(names)]
+    cnpj = is_cnpj[who]
+    # filial 0001 na maioria das vezes; algumas autuações em outras filiais da mesma raiz
+    branch = np.where(rng.random(n) < 0.85, 1, rng.integers(2, 20, size=n))
+    branch_digits = np.column_stack([(branch // 10 ** k) % 10 for k in (3, 2, 1, 0)])
+    doc = np.empty(n, dtype=object)
+    if cnpj.any():
+        doc[cnpj] = _join(cnpj_digits(np.column_stack([base[who[cnpj], :8], branch_digits[cnpj]]))).to_numpy()
+    if (~cnpj).any():
+        doc[~cnpj] = _join(cpf_digits(base[who[~cnpj]])).to_numpy()
+    doc = pd.Series(doc, dtype=object)
+    # metade das linhas com o documento formatado, metade só com dígitos
+    fmt = rng.random(n) < 0.5
+    doc[fmt] = _formatted(doc[fmt], pd.Series(cnpj[fmt]).to_numpy())
+
+    uf_names = np.array(list(UFS))
+    weights = np.array([w for w, _, _ in UFS.values()], dtype=float)
+    uf_idx = rng.choice(len(uf_names), size=n, p=weights / weights.sum())
+    mun_idx = np.minimum(rng.zipf(1.3, size=n) - 1, MUNICIPIOS_POR_UF - 1)
+    centers = np.array([(lat, lon) for _, lat, lon in UFS.values()])
+    mun_offset = np.sin(np.arange(MUNICIPIOS_POR_UF) * 12.9898)[mun_idx] * 2.0
+    lat = centers[uf_idx, 0] + mun_offset + rng.normal(0, 0.3, n)
+    lon = centers[uf_idx, 1] + np.cos(mun_idx * 78.233) * 2.0 + rng.normal(0, 0.3, n)
+    no_coord = rng.random(n) < MISSING_COORD
+
+    dates = _dates(rng, n, years)
+    iso = pa.array(rng.random(n) < ISO_DATES)
+    date_txt = pc.if_else(iso, _strftime(dates, "%Y-%m-%d %H:%M:%S"), _strftime(dates, "%d/%m/%Y %H:%M:%S"))
+    date_txt = pc.if_else(pa.array(rng.random(n) < MISSING_DATES), pa.scalar(None, pa.string()), date_txt)
+    day = np.timedelta64(1, "D")
+    fato = _strftime(dates - rng.integers(0, 90, size=n) * day, "%d/%m/%Y")
+    lanc = _strftime(dates + rng.integers(0, 30, size=n) * day, "%d/%m/%Y %H:%M")
+
+    gravidade = rng.choice(np.array(["1", "2", "3"]), size=n, p=[0.5, 0.35, 0.15]).astype(object)
+    gravidade[rng.random(n) < MISSING_GRAVIDADE] = ""
+    level = pd.to_numeric(pd.Series(gravidade), errors="coerce").fillna(1).to_numpy()
+    fine = np.round(np.exp(rng.normal(8.5, 1.6, n)) * level, 2)
+    area = np.round(rng.gamma(1.5, 20, n), 2)
+
+    seq = np.arange(first_seq, first_seq + n) + 1
+    desc_idx = rng.integers(0, len(DESCRIPTIONS), size=n)
+    before, after = (np.array([d.split("{n}")[i] for d in DESCRIPTIONS], dtype=object) for i in (0, 1))
+    descr = before[desc_idx] + pd.Series(np.round(area).astype(int)).astype(str).to_numpy(dtype=object) + after[desc_idx]
+
+    data = {c: pa.nulls(n, pa.string()) for c in COLUMNS}
+    data.update({
+        "SEQ_AUTO_INFRACAO": seq.astype(str),
+        "NUM_AUTO_INFRACAO": (seq * 7 % 9_999_999).astype(str),
+        "SER_AUTO_INFRACAO": rng.choice(np.array(["D", "E", "A"]), size=n),
+        "TIPO_AUTO": rng.choice(np.array(["Multa", "Advertência"]), size=n, p=[0.95, 0.05]),
+        "TIPO_MULTA": rng.choice(np.array(["Simples", "Diária"]), size=n, p=[0.9, 0.1]),
+        "VAL_AUTO_INFRACAO": _money(fine),
+        "GRAVIDADE_INFRACAO": np.where(gravidade == "3", "Grave", np.where(gravidade == "2", "Média", "Leve")),
+        "CD_NIVEL_GRAVIDADE": gravidade,
+        "DES_AUTO_INFRACAO": descr,
+        "DAT_HORA_AUTO_INFRACAO": date_txt,
+        "DAT_CIENCIA_AUTUACAO": lanc,
+        "COD_MUNICIPIO": (uf_idx * 1000 + mun_idx).astype(str),
+        "MUNICIPIO": municipios[uf_idx, mun_idx],
+        "UF": uf_names[uf_idx],
+        "NUM_PROCESSO": pd.Series(seq).map("02001.{:06d}/2024-11".format).to_numpy(),
+        "COD_INFRACAO": (desc_idx + 1).astype(str),
+        "DES_INFRACAO": descr,
+        "TIPO_INFRACAO": rng.choice(np.array(["Flora", "Fauna", "Poluição", "Controle ambiental"]), size=n),
+        "NOME_INFRATOR": names[who],
+        "CPF_CNPJ_INFRATOR": doc.to_numpy(),
+        "NUM_PESSOA_INFRATOR": (who + 1).astype(str),
+        "QTD_AREA": np.char.replace(area.astype(str), ".", ","),
+        "NUM_LATITUDE_AUTO": np.where(no_coord, "", np.round(lat, 6).astype(str)),
+        "NUM_LONGITUDE_AUTO": np.where(no_coord, "", np.round(lon, 6).astype(str)),
+        "DT_LANCAMENTO": lanc,
+        "DT_FATO_INFRACIONAL": fato,
+        "DS_BIOMAS_ATINGIDOS": rng.choice(np.array(BIOMAS), size=n, p=[0.55, 0.2, 0.12, 0.07, 0.04, 0.02]),
+        "DS_SIT_AUTO_INFRACAO": rng.choice(np.array(SITUACOES), size=n),
+        "TP_PESSOA_INFRATOR": np.where(cnpj, "Jurídica", "Física"),
+        "SQ_PESSOA": (who + 1).astype(str),
+        "SG_UF_INFRATOR": uf_names[uf_idx],
+    })
+    return pa.table({c: v if isinstance(v, pa.Array) else pa.array(v, type=pa.string()) for c, v in data.items()})
+
+def municipality_names():
+    names = np.empty((len(UFS), MUNICIPIOS_POR_UF), dtype=object)
+    for u, uf in enumerate(UFS):
+        for k in range(MUNICIPIOS_POR_UF):
+            p, s = PREFIXES[(k + u) % len(PREFIXES)], SUFFIXES[(k * 5 + u) % len(SUFFIXES)]
+            names[u, k] = f"{p} {s}" if k < len(PREFIXES) * len(SUFFIXES) // 2 else f"{p} {s} {k}"
+    return names
+
+def generate(rows, out_dir=RAW_DIR, years=YEARS, sep=";", encoding="latin1", seed=SEED, chunk_rows=CHUNK_ROWS):
+    """
+    Grava `rows` linhas em um CSV por ano (auto_infracao_<ano>.csv).
+    Retorna {caminho: linhas}.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    pool = offender_pool(max(int(rows * OFFENDERS_PER_ROW), 10), rng)
+    municipios = municipality_names()
+    per_year = np.diff(np.linspace(0, rows, len(years) + 1).astype(int))
+    written, seq = {}, 0
+    t0 = time.perf_counter()
+    for year, n_year in zip(years, per_year):
+        path = os.path.join(out_dir, f"{FILENAME_PREFIX}_{year}.csv")
+        with open(path, "wb") as f:
+            done = 0
+            while done < n_year:
+                n = min(chunk_rows, n_year - done)
+                chunk = generate_chunk(rng, n, seq, (year,), pool, municipios)
+                buf = pa.BufferOutputStream()
+                pacsv.write_csv(chunk, buf, pacsv.WriteOptions(include_header=done == 0, delimiter=sep,
+                                                               quoting_style="needed"))
+                data = buf.getvalue().to_pybytes()
+                # o pyarrow só escreve UTF-8
+                f.write(data if encoding == "utf-8" else data.decode("utf-8").encode(encoding))
+                done += n
+                seq += n
+        written[path] = int(n_year)
+        print(f"  {os.path.basename(path)}: {n_year} linhas")
+    dt = time.perf_counter() - t0
+    print(f"{rows} linhas geradas em {dt:.1f}s ({rows / max(dt, 1e-9):,.0f} linhas/s) em {out_dir}")
+    return written
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera CSVs sintéticos de autos de infração do IBAMA")
+    parser.add_argument("--linhas", type=int, default=100_000, help="total de linhas (divididas entre os anos)")
+    parser.add_argument("--anos", type=int, nargs="+", default=list(YEARS))
+    parser.add_argument("--sep", choices=[";", ","], default=";")
+    parser.add_argument("--encoding", choices=["latin1", "utf-8"], default="latin1")
+    parser.add_argument("--semente", type=int, default=SEED)
+    parser.add_argument("--saida", default=RAW_DIR, help="diretório dos CSVs (padrão: data/raw)")
+    args = parser.parse_args()
+    generate(args.linhas, args.saida, args.anos, args.sep, args.encoding, args.semente)
@@ -0,0 +1,150 @@
+# src/text_features.py
+"""
+Features de texto de des_infracao: n-gramas com hashing (colunas fixas, sem vocabulário
+em memória), pesos TF-IDF e, opcionalmente, uma TruncatedSVD para um bloco denso pequeno.
+
+HashedText é um transformer do sklearn que entra no ColumnTransformer do model.py como
+mais uma coluna (ver build_preprocessor); com isso o bloco de texto vai para a mesma
+matriz de classificador, regressor e IsolationForest, para o cache do feature_store e
+para o preprocessor.joblib usado pelo scoring.
+
+des_infracao é category no clean_autuacoes.parquet e se repete muito: cada texto
+distinto é vetorizado uma vez (em batches de BATCH_ROWS) e as linhas só apontam para
+ele. O IDF conta cada texto com o nº de linhas em que aparece; partial_fit acumula
+essas contagens batch a batch (usado pelo out_of_core.py).
+
+Uso:
+    python src/text_features.py --hash 16384 --svd 50    # tamanho e densidade do bloco
+"""
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+
+TEXT_COLUMN = "des_infracao"
+N_FEATURES = 2 ** 14
+BATCH_ROWS = 50_000
+# textos mais frequentes usados no ajuste da SVD
+SVD_TEXTS = 20_000
+
+def distinct_texts(X):
+    """(textos distintos usados, nº de linhas de cada, índice do texto em cada linha; -1 = nulo)."""
+    if isinstance(X, pd.DataFrame):
+        s = X.iloc[:, 0]
+    else:
+        s = X if isinstance(X, pd.Series) else pd.Series(np.asarray(X).ravel())
+    if not isinstance(s.dtype, pd.CategoricalDtype):
+        s = s.astype("category")
+    codes = s.cat.codes.to_numpy()
+    used, inverse = np.unique(codes, return_inverse=True)
+    counts = np.bincount(inverse, minlength=len(used))
+    if len(used) and used[0] < 0:
+        # nulos: índice -1 e fora das contagens
+        inverse, used, counts = inverse - 1, used[1:], counts[1:]
+    return s.cat.categories[used].astype(str), counts, inverse
+
+class HashedText(TransformerMixin, BaseEstimator):
+    """n-gramas de palavras com hashing -> TF-IDF (normalizado) -> SVD opcional."""
+    def __init__(self, n_features=N_FEATURES, ngram_range=(1, 2), svd_components=0, batch_rows=BATCH_ROWS,
+                 svd_texts=SVD_TEXTS, random_state=42):
+        self.n_features = n_features
+        self.ngram_range = ngram_range
+        self.svd_components = svd_components
+        self.batch_rows = batch_rows
+        self.svd_texts = svd_texts
+        self.random_state = random_state
+
+    def _hash(self, texts):
+        vec = HashingVectorizer(n_features=self.n_features, ngram_range=tuple(self.ngram_range),
+                                strip_accents="unicode", alternate_sign=False, norm=None, dtype=np.float32)
+        parts = [vec.transform(texts[i:i + self.batch_rows]) for i in range(0, len(texts), self.batch_rows)]
+        return sp.vstack(parts, format="csr") if parts else sp.csr_matrix((0, self.n_features), dtype=np.float32)
+
+    def _tfidf(self, H):
+        return normalize(H @ sp.diags(self.idf_), copy=False).tocsr()
+
+    def partial_fit(self, X, y=None):
+        """Soma as frequências de documento (e os textos candidatos da SVD) de um batch."""
+        if not hasattr(self, "doc_freq_"):
+            self.doc_freq_ = np.zeros(self.n_features, dtype=np.int64)
+            self.n_docs_ = 0
+            self._top = pd.Series(dtype=np.int64)
+        texts, counts, _ = distinct_texts(X)
+        H = self._hash(texts)
+        rows = np.repeat(np.arange(H.shape[0]), np.diff(H.indptr))
+        self.doc_freq_ += np.bincount(H.indices, weights=counts[rows], minlength=self.n_features).astype(np.int64)
+        self.n_docs_ += int(counts.sum())
+        if self.svd_components:
+            top = self._top.add(pd.Series(counts, index=texts), fill_value=0)
+            # só os textos mais frequentes ficam guardados
+            self._top = top.nlargest(2 * self.svd_texts) if len(top) > 4 * self.svd_texts else top
+        return self
+
+    def finish_fit(self):
+        """Fecha o ajuste depois dos partial_fit: IDF e SVD."""
+        self.idf_ = (np.log((1 + self.n_docs_) / (1 + self.doc_freq_)) + 1).astype(np.float32)
+        self.svd_ = None
+        if self.svd_components:
+            top = self._top.nlargest(self.svd_texts)
+            k = min(self.svd_components, len(top) - 1, self.n_features - 1)
+            if k > 0:
+                # linhas com peso sqrt(nº de linhas do texto): a SVD vê o texto tantas vezes quanto aparece
+                W = sp.diags(np.sqrt(top.to_numpy(dtype=np.float32))) @ self._tfidf(self._hash(top.index))
+                self.svd_ = TruncatedSVD(k, random_state=self.random_state).fit(W)
+        del self._top
+        return self
+
+    def fit(self, X, y=None):
+        for attr in ("doc_freq_", "n_docs_", "_top"):
+            self.__dict__.pop(attr, None)
+        return self.partial_fit(X).finish_fit()
+
+    def transform(self, X):
+        texts, _, inverse = distinct_texts(X)
+        if not len(texts):
+            # batch só com nulos (ex.: um registro on-line sem des_infracao): só a linha de zeros
+            T = (self._hash(texts) if self.svd_ is None
+                 else np.zeros((0, self.svd_.n_components), dtype=np.float32))
+        else:
+            T = self._tfidf(self._hash(texts))
+            if self.svd_ is not None:
+                T = self.svd_.transform(T).astype(np.float32)
+        # uma linha de zeros no fim para os nulos (índice -1)
+        if sp.issparse(T):
+            T = sp.vstack([T, sp.csr_matrix((1, T.shape[1]), dtype=T.dtype)], format="csr")
+        else:
+            T = np.vstack([T, np.zeros((1, T.shape[1]), dtype=T.dtype)])
+        return T[np.where(inverse < 0, T.shape[0] - 1, inverse)]
+
+    def get_feature_names_out(self, input_features=None):
+        if getattr(self, "svd_", None) is not None:
+            return np.array([f"svd{i}" for i in range(self.svd_.n_components)], dtype=object)
+        return np.array([f"hash{i}" for i in range(self.n_features)], dtype=object)
+
+if __name__ == "__main__":
+    from preprocessing import read_clean
+    from model import find_clean
+    parser = argparse.ArgumentParser(description="Tamanho e densidade do bloco de texto de des_infracao")
+    parser.add_argument("--hash", type=int, default=N_FEATURES, help="colunas do hashing")
+    parser.add_argument("--svd", type=int, default=0, help="componentes da SVD (0 = bloco esparso)")
+    args = parser.parse_args()
+    path = find_clean()
+    df = read_clean(path, columns=[TEXT_COLUMN])
+    t0 = time.perf_counter()
+    text = HashedText(n_features=args.hash, svd_components=args.svd).fit(df[[TEXT_COLUMN]])
+    fit_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    T = text.transform(df[[TEXT_COLUMN]])
+    n_texts = len(distinct_texts(df[[TEXT_COLUMN]])[0])
+    print(f"{len(df)} linhas, {n_texts} textos distintos; ajuste {fit_s:.2f}s, transform {time.perf_counter() - t0:.2f}s")
+    if sp.issparse(T):
+        mb = (T.data.nbytes + T.indices.nbytes + T.indptr.nbytes) / 1024 ** 2
+        print(f"bloco esparso {T.shape[0]} x {T.shape[1]}: {T.nnz / max(T.shape[0], 1):.1f} não nulos por linha, {mb:.1f} MB")
+    else:
+        print(f"bloco denso {T.shape[0]} x {T.shape[1]}: {T.nbytes / 1024 ** 2:.1f} MB, "
+              f"variância explicada {text.svd_.explained_variance_ratio_.sum():.3f}")
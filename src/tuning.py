@@ -0,0 +1,188 @@
+# src/tuning.py
+"""
+Busca de hiperparâmetros para o classificador de risco e o regressor de multa.
+
+Cada candidato (RandomForest com outros n_estimators/max_depth/min_samples_leaf e as
+alternativas HistGradientBoosting*) é avaliado em divisões temporais: as linhas são
+ordenadas por dat_hora_auto_infracao e cada fold treina no passado e testa no bloco
+seguinte (TimeSeriesSplit), como acontece em produção.
+
+As matrizes dos folds são montadas uma vez e gravadas no feature_store; os candidatos
+rodam num pool de processos que abre essas matrizes com mmap. Para cada candidato são
+registrados tempo de fit, throughput de predict (1 thread), tamanho do modelo
+serializado e as métricas. O vencedor de cada tarefa é o de melhor métrica entre os
+que cabem no orçamento de latência e tamanho.
+
+Saídas:
+ - models/tuning_results.json: todos os candidatos
+ - models/best_params.json: vencedores e o encoding em que foram avaliados, lidos por
+   `model.py --melhores-parametros`
+
+Uso:
+    python src/tuning.py --workers 4 --folds 3 --latencia-max-ms 50 --tamanho-max-mb 100
+"""
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import TimeSeriesSplit
+from sklearn.metrics import f1_score, accuracy_score, mean_absolute_error, mean_squared_error
+from math import sqrt
+from preprocessing import read_clean
+from model import (MODEL_COLUMNS, MODEL_DIR, ENCODINGS, SEED, BEST_PARAMS_PATH, ESTIMATORS, find_clean,
+                   build_target_and_features, build_preprocessor, feature_code_hash, fit_input)
+import feature_store
+from artifacts import serialized_mb
+
+RESULTS_PATH = os.path.join(MODEL_DIR, "tuning_results.json")
+N_FOLDS = 3
+
+# tarefa -> [(estimador, parâmetros)]; o primeiro de cada tarefa é a configuração atual do model.py
+SEARCH_SPACE = {
+    "clf": [("rf_clf", {"n_estimators": 200})]
+    + [("rf_clf", {"n_estimators": n, "max_depth": d, "min_samples_leaf": leaf})
+       for n in (50, 100) for d in (None, 20) for leaf in (1, 5)]
+    + [("hgb_clf", {"max_iter": it, "max_leaf_nodes": leaves, "learning_rate": 0.1})
+       for it in (100, 300) for leaves in (31, 63)],
+    "reg": [("rf_reg", {"n_estimators": 200})]
+    + [("rf_reg", {"n_estimators": n, "max_depth": d, "min_samples_leaf": leaf})
+       for n in (50, 100) for d in (None, 20) for leaf in (1, 5)]
+    + [("hgb_reg", {"max_iter": it, "max_leaf_nodes": leaves, "learning_rate": 0.1})
+       for it in (100, 300) for leaves in (31, 63)],
+}
+
+# métrica usada na escolha e se maior é melhor
+SELECTION = {"clf": ("f1_macro", True), "reg": ("mae", False)}
+
+def time_folds(dates, n_splits=N_FOLDS):
+    """
+    (treino, teste) em ordem cronológica. O TimeSeriesSplit só vê as linhas com data;
+    as sem data entram no treino de todos os folds e nunca no teste.
+    """
+    dates = pd.to_datetime(pd.Series(dates)).to_numpy()
+    missing = pd.isna(dates)
+    dated = np.flatnonzero(~missing)
+    order = dated[np.argsort(dates[dated], kind="stable")]
+    undated = np.flatnonzero(missing)
+    return [(np.concatenate([order[tr], undated]), order[te])
+            for tr, te in TimeSeriesSplit(n_splits=n_splits).split(order)]
+
+def prepare_folds(path, n_splits=N_FOLDS, encoding="esparso", uf=None, date_from=None, date_to=None, use_cache=True):
+    """Grava no feature_store X/y de treino e teste de cada fold; retorna a chave."""
+    params = {"uf": uf, "date_from": date_from, "date_to": date_to, "encoding": encoding,
+              "split": "tempo", "folds": n_splits}
+    key = feature_store.cache_key(feature_store.data_hash(path), feature_code_hash(), **params)
+    if use_cache and feature_store.exists(key):
+        print("Folds lidos do cache:", key)
+        return key
+
+    df = read_clean(path, columns=MODEL_COLUMNS, uf=uf, date_from=date_from, date_to=date_to)
+    X, y_cls, y_reg, _ = build_target_and_features(df)
+    arrays = {}
+    for i, (tr, te) in enumerate(time_folds(df["dat_hora_auto_infracao"], n_splits)):
+        # o preprocessor de cada fold só vê o passado
+        pre, _, _ = build_preprocessor(X, encoding)
+        arrays[f"X_train_{i}"] = pre.fit_transform(X.iloc[tr])
+        arrays[f"X_test_{i}"] = pre.transform(X.iloc[te])
+        for name, y in (("clf", y_cls), ("reg", y_reg)):
+            arrays[f"y_{name}_train_{i}"] = y.to_numpy()[tr]
+            arrays[f"y_{name}_test_{i}"] = y.to_numpy()[te]
+        print(f"fold {i}: treino {len(tr)} linhas, teste {len(te)} linhas")
+    feature_store.save(key, arrays, meta={"source": path, "params": params, "rows": len(X)})
+    print("Folds salvos no cache:", key)
+    return key
+
+def metrics(task, y_true, y_pred):
+    if task == "clf":
+        return {"f1_macro": f1_score(y_true, y_pred, average="macro"), "accuracy": accuracy_score(y_true, y_pred)}
+    return {"mae": mean_absolute_error(y_true, y_pred), "rmse": sqrt(mean_squared_error(y_true, y_pred))}
+
+def evaluate(key, n_splits, task, estimator, params):
+    """Roda num processo do pool: ajusta e mede o candidato em cada fold."""
+    arrays, _, _ = feature_store.load(key)
+    folds = []
+    for i in range(n_splits):
+        y_tr, y_te = arrays[f"y_{task}_train_{i}"], arrays[f"y_{task}_test_{i}"]
+        model = ESTIMATORS[estimator](random_state=SEED, **params)
+        X_tr, X_te = fit_input(model, arrays[f"X_train_{i}"]), fit_input(model, arrays[f"X_test_{i}"])
+        t0 = time.perf_counter()
+        model.fit(X_tr, y_tr)
+        fit_s = time.perf_counter() - t0
+        if hasattr(model, "n_jobs"):
+            # throughput medido com 1 thread, como em cada processo do scoring.py
+            model.n_jobs = 1
+        t0 = time.perf_counter()
+        pred = model.predict(X_te)
+        predict_s = time.perf_counter() - t0
+        folds.append(dict(metrics(task, y_te, pred), fit_s=fit_s,
+                          ms_por_1000=1000 * predict_s / max(X_te.shape[0], 1) * 1000,
+                          tamanho_mb=serialized_mb(model)))
+    summary = {k: float(np.mean([f[k] for f in folds])) for k in folds[0]}
+    return {"tarefa": task, "estimador": estimator, "params": params, **summary}
+
+def pick_winner(results, task, max_latency_ms=None, max_size_mb=None):
+    metric, higher = SELECTION[task]
+    ok = [r for r in results if r["tarefa"] == task
+          and (max_latency_ms is None or r["ms_por_1000"] <= max_latency_ms)
+          and (max_size_mb is None or r["tamanho_mb"] <= max_size_mb)]
+    if not ok:
+        return None
+    # empate na métrica: fica o mais rápido no predict
+    return max(ok, key=lambda r: (r[metric] if higher else -r[metric], -r["ms_por_1000"]))
+
+def run_search(n_splits=N_FOLDS, workers=None, encoding="esparso", max_latency_ms=None, max_size_mb=None,
+               tasks=("clf", "reg"), use_cache=True, **filters):
+    path = find_clean()
+    print("Lendo dados:", path)
+    key = prepare_folds(path, n_splits, encoding, use_cache=use_cache, **filters)
+
+    jobs = [(task, est, params) for task in tasks for est, params in SEARCH_SPACE[task]]
+    workers = workers or os.cpu_count() or 1
+    print(f"{len(jobs)} candidatos, {n_splits} folds, {workers} processo(s)")
+    results = []
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(evaluate, key, n_splits, *job) for job in jobs]
+        for fut in as_completed(futures):
+            r = fut.result()
+            results.append(r)
+            metric = SELECTION[r["tarefa"]][0]
+            print(f"  {r['estimador']:8s} {json.dumps(r['params'])}: {metric}={r[metric]:.4f} "
+                  f"fit={r['fit_s']:.1f}s predict={r['ms_por_1000']:.1f}ms/1000 tamanho={r['tamanho_mb']:.1f}MB")
+    print(f"Busca concluída em {time.perf_counter() - t0:.1f}s")
+
+    best = {}
+    for task in tasks:
+        w = pick_winner(results, task, max_latency_ms, max_size_mb)
+        if w is None:
+            print(f"Nenhum candidato de '{task}' cabe no orçamento; mantendo a configuração atual")
+            continue
+        best[task] = {"estimador": w["estimador"], "params": w["params"]}
+        print(f"Vencedor {task}: {w['estimador']} {json.dumps(w['params'])}")
+
+    budget = {"latencia_max_ms_por_1000": max_latency_ms, "tamanho_max_mb": max_size_mb}
+    with open(RESULTS_PATH, "w", encoding="utf-8") as f:
+        json.dump({"folds": n_splits, "encoding": encoding, "orcamento": budget, "candidatos": results}, f, indent=2)
+    with open(BEST_PARAMS_PATH, "w", encoding="utf-8") as f:
+        json.dump(dict(best, encoding=encoding, orcamento=budget), f, indent=2)
+    print("Resultados salvos em", RESULTS_PATH, "e", BEST_PARAMS_PATH)
+    return best
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Busca de hiperparâmetros com validação temporal")
+    parser.add_argument("--workers", type=int, default=None, help="processos (padrão: número de CPUs)")
+    parser.add_argument("--folds", type=int, default=N_FOLDS, help="divisões temporais")
+    parser.add_argument("--encoding", choices=ENCODINGS, default="esparso")
+    parser.add_argument("--tarefas", nargs="+", choices=sorted(SEARCH_SPACE), default=sorted(SEARCH_SPACE))
+    parser.add_argument("--latencia-max-ms", type=float, help="predict máximo, em ms por 1000 linhas (1 thread)")
+    parser.add_argument("--tamanho-max-mb", type=float, help="tamanho máximo do modelo serializado")
+    parser.add_argument("--uf", nargs="+")
+    parser.add_argument("--desde", help="data inicial (AAAA-MM-DD)")
+    parser.add_argument("--ate", help="data final (AAAA-MM-DD)")
+    parser.add_argument("--sem-cache", action="store_true", help="remonta os folds mesmo se estiverem no cache")
+    args = parser.parse_args()
+    run_search(args.folds, args.workers, args.encoding, args.latencia_max_ms, args.tamanho_max_mb,
+               tasks=args.tarefas, use_cache=not args.sem_cache, uf=args.uf, date_from=args.desde, date_to=args.ate)
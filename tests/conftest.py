@@ -0,0 +1,22 @@
+import os
+import sys
+import subprocess
+import pytest
+
+# os scripts de src/ se importam pelo nome (python src/model.py)
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC)
+
+def run_script(cwd, script, *args, **kwargs):
+    """Roda `python src/<script>` com `cwd` como raiz do projeto (data/, models/)."""
+    return subprocess.run([sys.executable, os.path.join(SRC, script), *args], cwd=cwd, check=True,
+                          capture_output=True, text=True, **kwargs)
+
+@pytest.fixture(scope="session")
+def trained_project(tmp_path_factory):
+    """Diretório com dados sintéticos já ingeridos, pré-processados e com os modelos treinados."""
+    cwd = tmp_path_factory.mktemp("projeto")
+    for script, *args in (("synthetic_data.py", "--linhas", "1500"), ("data_ingestion.py",),
+                          ("preprocessing.py",), ("model.py",)):
+        run_script(cwd, script, *args)
+    return cwd
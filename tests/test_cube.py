@@ -0,0 +1,19 @@
+import pandas as pd
+import cube as cube_store
+
+def rows(source, n, scored):
+    df = pd.DataFrame({"arquivo_origem": source, "uf": "PA", "municipio": "BELEM",
+                       "dat_hora_auto_infracao": pd.to_datetime(["2024-01-10"] * n),
+                       "valor_multa": 100.0, "gravidade_nivel": 2.0, "lat": -1.4})
+    if scored:
+        df["pred_risco"] = [2] * n
+        df["iso_flag"] = [True] * n
+    return df
+
+def test_incremental_replace_never_mixes_scored_and_unscored_cells():
+    scored = cube_store.combine([cube_store.build_cube(rows("a", 3, True)), cube_store.build_cube(rows("b", 2, True))])
+    cube = cube_store.replace_sources(scored, rows("b", 4, False), ["b"])
+    assert (cube["pred_risco"] == cube_store.NO_PREDICTION).all()
+    assert cube["qtd_anomalias"].sum() == 0
+    total = cube_store.rollup(cube, ["uf"])
+    assert total["qtd_autuacoes"].tolist() == [7] and total["soma_multas"].tolist() == [700.0]
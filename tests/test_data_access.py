@@ -0,0 +1,23 @@
+import pandas as pd
+from data_access import load, count_rows, iter_row_groups, DATE_COL
+
+def write_clean(path):
+    df = pd.DataFrame({
+        DATE_COL: pd.to_datetime(["2024-03-30 10:00:00", "2024-03-31 00:00:00", "2024-03-31 15:30:00",
+                                  "2024-03-31 23:59:59", "2024-04-01 00:00:00"]),
+        "uf": ["PA", "PA", "AM", "PA", "PA"],
+    })
+    df.to_parquet(path, index=False, row_group_size=2)
+    return path
+
+def test_date_to_without_time_includes_the_whole_day(tmp_path):
+    path = write_clean(tmp_path / "clean.parquet")
+    df = load(path, date_from="2024-03-31", date_to="2024-03-31")
+    assert df[DATE_COL].dt.strftime("%H:%M:%S").tolist() == ["00:00:00", "15:30:00", "23:59:59"]
+    assert count_rows(path, date_to="2024-03-31") == 4
+    assert sum(len(g) for g in iter_row_groups(path, date_to="2024-03-31")) == 4
+
+def test_date_to_with_time_is_inclusive_up_to_that_instant(tmp_path):
+    path = write_clean(tmp_path / "clean.parquet")
+    assert count_rows(path, date_to="2024-03-31 15:30") == 3
+    assert count_rows(path, uf="PA", date_to="2024-03-31 15:30") == 2
@@ -0,0 +1,17 @@
+import os
+import feature_store
+
+def test_data_hash_only_rewrites_the_hashes_file_when_the_source_changes(tmp_path, monkeypatch):
+    monkeypatch.setattr(feature_store, "FEATURE_DIR", str(tmp_path / "features"))
+    monkeypatch.setattr(feature_store, "HASHES_PATH", str(tmp_path / "features" / "source_hashes.json"))
+    src = tmp_path / "clean.parquet"
+    src.write_bytes(b"a" * 100)
+    first = feature_store.data_hash(str(src))
+    before = os.stat(feature_store.HASHES_PATH).st_mtime_ns
+    os.utime(feature_store.HASHES_PATH, ns=(before - 10 ** 9, before - 10 ** 9))
+    assert feature_store.data_hash(str(src)) == first
+    assert os.stat(feature_store.HASHES_PATH).st_mtime_ns == before - 10 ** 9
+
+    src.write_bytes(b"b" * 101)
+    assert feature_store.data_hash(str(src)) != first
+    assert os.stat(feature_store.HASHES_PATH).st_mtime_ns != before - 10 ** 9
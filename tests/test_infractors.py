@@ -0,0 +1,21 @@
+import numpy as np
+import pandas as pd
+from infractors import InfractorIndex, normalize_documents
+
+def test_window_includes_the_whole_end_date():
+    keys = ["CPF:1", "CPF:1", "CPF:1", "CPF:2", "CPF:2", None]
+    dates = pd.to_datetime(["2024-03-30 10:00:00", "2024-03-31 15:30:00", "2024-04-01 00:00:00",
+                            "2024-03-31 23:59:59", None, "2024-03-31 12:00:00"])
+    index, ids = InfractorIndex.build(keys, dates, [10.0, 20.0, 30.0, 40.0, 50.0, 60.0])
+    assert ids.tolist()[-1] == -1
+    counts, sums = index.window("2024-03-31", "2024-03-31")
+    assert counts.tolist() == [1, 1] and sums.tolist() == [20.0, 40.0]
+    counts, _ = index.window(date_to="2024-03-31 15:30:00")
+    assert counts.tolist() == [2, 0]
+    top = index.top(date_to="2024-03-31")
+    assert top["autuacoes"].tolist() == [2, 1]
+
+def test_documents_with_punctuation_and_branches_share_a_key():
+    keys = normalize_documents(["11.222.333/0001-81", "11222333000262", "529.982.247-25", None, "000.000.000-00"])
+    assert keys.tolist()[:3] == ["CNPJ:11222333", "CNPJ:11222333", "CPF:52998224725"]
+    assert keys.isna().tolist()[3:] == [True, True]
@@ -0,0 +1,26 @@
+import pickle
+import numpy as np
+from sklearn.dummy import DummyRegressor
+from sklearn.ensemble import RandomForestRegressor
+from model import PeriodEnsemble
+
+X = np.zeros((4, 2))
+
+def test_period_ensemble_weights_members_by_their_rows_not_their_trees():
+    forest = RandomForestRegressor(n_estimators=50, random_state=0).fit(X, np.zeros(4))
+    single = DummyRegressor(strategy="constant", constant=10.0).fit(X, np.zeros(4))
+    ens = PeriodEnsemble([(forest, 2, 100), (single, 2, 100)])
+    np.testing.assert_allclose(ens.predict(X), 5.0)
+    nested = PeriodEnsemble([(ens, 2, None), (single, 2, 200)])
+    np.testing.assert_allclose(nested.predict(X), 7.5)
+    # com peso, o ensemble anterior conta como um período desse tamanho
+    nested = PeriodEnsemble([(ens, 2, 50), (single, 2, 50)])
+    np.testing.assert_allclose(nested.predict(X), 7.5)
+
+def test_period_ensemble_pickled_without_weights_keeps_tree_weights():
+    forest = RandomForestRegressor(n_estimators=3, random_state=0).fit(X, np.zeros(4))
+    single = DummyRegressor(strategy="constant", constant=8.0).fit(X, np.zeros(4))
+    ens = PeriodEnsemble([(forest, 2, 1), (single, 2, 1)])
+    ens.members = [(m, n) for m, n, _ in ens.members]
+    old = pickle.loads(pickle.dumps(ens))
+    np.testing.assert_allclose(old.predict(X), 2.0)
@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+import pytest
+import scipy.sparse as sp
+from model import build_features, build_preprocessor
+from out_of_core import collect_stats, row_groups, streaming_preprocessor
+
+FILTERS = {"uf": None, "date_from": None, "date_to": None}
+
+def dense(M):
+    return M.toarray() if sp.issparse(M) else np.asarray(M)
+
+@pytest.mark.parametrize("encoding,text", [("denso", None), ("ordinal", None),
+                                           ("denso", {"n_features": 256, "svd_components": 0})])
+def test_streamed_preprocessor_matches_an_in_memory_fit(trained_project, encoding, text):
+    path = str(trained_project / "data" / "processed" / "clean_autuacoes.parquet")
+    pre = streaming_preprocessor(collect_stats(path, FILTERS, text), encoding, text)
+
+    X = pd.concat([build_features(df, text=text is not None)[0] for _, df, _ in row_groups(path, FILTERS)],
+                  ignore_index=True)
+    train = np.concatenate([~test for _, _, test in row_groups(path, FILTERS)])
+    ref, _, _ = build_preprocessor(X, encoding, text)
+    ref.fit(X[train])
+
+    assert pre.get_feature_names_out().tolist() == ref.get_feature_names_out().tolist()
+    np.testing.assert_allclose(dense(pre.transform(X)), dense(ref.transform(X)), rtol=1e-4, atol=1e-5)
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+from parsing import parse_valor_series, parse_dates_series
+
+def test_parse_valor_series_brazilian_and_plain_decimals():
+    s = pd.Series(["15.000,00", "R$ 1.234,5", "15.000", "1.234.567", "15000.5", "250", "", "  ", None,
+                   "15.000,00 (quinze mil)", "sem valor"], dtype=object)
+    values, bad = parse_valor_series(s)
+    expected = [15000.0, 1234.5, 15000.0, 1234567.0, 15000.5, 250.0, np.nan, np.nan, np.nan, 15000.0, np.nan]
+    np.testing.assert_array_equal(values.to_numpy(), expected)
+    # vazio e nulo não contam como inválidos, só o texto sem número
+    assert bad == 1
+
+def test_parse_valor_series_plain_decimals_without_comma():
+    # sem vírgula em nenhuma linha o ponto é decimal (antes "15000.5" virava 150005)
+    values, bad = parse_valor_series(pd.Series(["15000.5", "0.75", "100"], dtype=object))
+    assert values.tolist() == [15000.5, 0.75, 100.0] and bad == 0
+
+def test_parse_valor_series_numeric_columns_pass_through():
+    values, bad = parse_valor_series(pd.Series([1.5, None, 3]))
+    np.testing.assert_array_equal(values.to_numpy(), [1.5, np.nan, 3.0])
+    assert bad == 0
+
+def test_parse_dates_series_day_first_and_iso():
+    s = pd.Series(["15/01/2024 10:30:00", "15/01/2024 10:30", "03/02/2024", "2024-02-03 08:00:00", "2024-02-03",
+                   "", None, "31/02/2024", "ontem"], dtype=object)
+    dates, bad = parse_dates_series(s)
+    T = pd.Timestamp
+    assert dates.tolist()[:5] == [T("2024-01-15 10:30"), T("2024-01-15 10:30"), T("2024-02-03"),
+                                  T("2024-02-03 08:00"), T("2024-02-03")]
+    assert dates.isna().tolist() == [False] * 5 + [True] * 4
+    # "03/02/2024" é 3 de fevereiro (dia primeiro), não 2 de março
+    assert dates.iloc[2].month == 2
+    assert bad == 2
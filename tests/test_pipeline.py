@@ -0,0 +1,9 @@
+import os
+import pipeline
+
+def test_run_script_without_wait4_still_runs_the_stage(tmp_path, monkeypatch):
+    monkeypatch.delattr(os, "wait4", raising=False)
+    r = pipeline.run_script("dados", "synthetic_data.py", ["--linhas", "50"], str(tmp_path),
+                            str(tmp_path / "dados.log"))
+    assert r["status"] == "ok" and r["cpu_s"] is None and r["pico_mb"] is None
+    assert pipeline.resources(r) == ""
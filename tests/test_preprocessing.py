@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+from preprocessing import rolling_counts
+
+def naive_rolling(group, dates, values, w):
+    """Janela [t - w dias, t) por grupo com o rolling do pandas; sem grupo ou data fica 0."""
+    df = pd.DataFrame({"g": group, "t": pd.to_datetime(dates), "v": values})
+    counts, sums = np.zeros(len(df), dtype=np.int64), np.zeros(len(df))
+    for _, part in df.dropna(subset=["g", "t"]).groupby("g"):
+        part = part.sort_values("t", kind="stable")
+        roll = part.set_index("t")["v"].fillna(0).rolling(f"{w}D", closed="left")
+        counts[part.index] = roll.count().fillna(0).to_numpy()
+        sums[part.index] = roll.sum().fillna(0).to_numpy()
+    return counts, sums
+
+def test_rolling_counts_match_a_naive_groupby_rolling():
+    rng = np.random.default_rng(0)
+    n = 400
+    group = rng.choice(["A", "B", "C", "D", None], n).astype(object)
+    # datas repetidas (mesmo instante) e algumas nulas
+    dates = pd.Series(pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 200, n), unit="D")
+                      + pd.to_timedelta(rng.choice([0, 3600], n), unit="s"))
+    dates[rng.random(n) < 0.1] = pd.NaT
+    values = rng.uniform(100, 1000, n)
+    values[rng.random(n) < 0.05] = np.nan
+    out = rolling_counts(group, dates, values, windows=(1, 30, 90))
+    for w, (counts, sums) in out.items():
+        ref_counts, ref_sums = naive_rolling(group, dates, values, w)
+        np.testing.assert_array_equal(counts, ref_counts)
+        np.testing.assert_allclose(sums, ref_sums, rtol=1e-9, atol=1e-6)
+    assert (out[30][0][dates.isna().to_numpy() | pd.isna(group)] == 0).all()
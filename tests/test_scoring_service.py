@@ -0,0 +1,62 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import run_script
+from preprocessing import clean_rows, write_clean, read_clean
+from model import MODEL_COLUMNS, build_features
+from scoring import load_models, score_frame
+from scoring_service import MicroBatcher, records_frame
+from text_features import HashedText, TEXT_COLUMN
+
+RECORDS = [
+    {"dat_hora_auto_infracao": "15/01/2024 10:00:00", "uf": "PA", "municipio": "BELEM",
+     "val_auto_infracao": "15.000,00", "cpf_cnpj_infrator": "123"},
+    # data e multa inválidas: o clean_rows avisa, e o aviso não pode ir para a stdout
+    {"dat_hora_auto_infracao": "xx", "uf": "AM", "val_auto_infracao": "abc"},
+]
+
+def test_stdin_mode_writes_only_json_lines_to_stdout(trained_project):
+    lines = [json.dumps(RECORDS[0]), json.dumps(RECORDS[1]), json.dumps(RECORDS)]
+    res = run_script(trained_project, "scoring_service.py", "--stdin", input="\n".join(lines) + "\n")
+    out = res.stdout.splitlines()
+    assert len(out) == 3
+    parsed = [json.loads(line) for line in out]
+    assert parsed[0].keys() == {"pred_risco", "valor_multa_previsto", "iso_score", "iso_flag", "autuacoes_365d"}
+    assert len(parsed[2]) == 2
+    assert "não reconhecid" in res.stderr
+
+def test_stats_are_valid_json_before_any_request():
+    batcher = MicroBatcher(lambda records: [{} for _ in records])
+    stats = json.loads(json.dumps(batcher.stats()), parse_constant=lambda c: pytest.fail(f"{c} no JSON"))
+    assert stats["latencia_p50_ms"] is None and stats["latencia_p99_ms"] is None
+    batcher.submit([{}, {}]).result(5)
+    stats = batcher.stats()
+    assert stats["requisicoes"] == 1 and stats["latencia_p99_ms"] >= 0
+
+def batch_frame(tmp_path, record):
+    """O registro pelo caminho do batch: CSV -> clean_rows -> clean_autuacoes.parquet -> read_clean."""
+    csv = tmp_path / "auto_infracao.csv"
+    pd.DataFrame([record]).to_csv(csv, sep=";", index=False)
+    df = clean_rows(pd.read_csv(csv, sep=";", dtype=str))
+    write_clean(df, tmp_path / "clean.parquet")
+    return read_clean(tmp_path / "clean.parquet", columns=MODEL_COLUMNS)
+
+def test_missing_description_scores_the_same_online_and_in_batch(trained_project, tmp_path):
+    record = {"dat_hora_auto_infracao": "15/01/2024 10:00:00", "uf": "PA", "municipio": "BELEM",
+              "val_auto_infracao": "15.000,00", "cd_nivel_gravidade": "2", "cpf_cnpj_infrator": "123"}
+    batch = batch_frame(tmp_path, {**record, "des_infracao": ""})
+    models = load_models(str(trained_project / "models"))
+    for online in (records_frame([record]), records_frame([{**record, "des_infracao": None}]),
+                   records_frame([{**record, "des_infracao": ""}])):
+        online["autuacoes_365d"] = batch["autuacoes_365d"] = 0
+        assert build_features(online)[0]["desc_len"].tolist() == build_features(batch)[0]["desc_len"].tolist() == [3]
+        got, want = score_frame(online, models), score_frame(batch, models)
+        for name in want:
+            np.testing.assert_allclose(got[name], want[name])
+
+def test_missing_description_gives_the_same_text_features(tmp_path):
+    batch = batch_frame(tmp_path, {"uf": "PA", "municipio": "BELEM", "des_infracao": ""})
+    text = HashedText(n_features=64).fit(pd.DataFrame({TEXT_COLUMN: ["corte de madeira", "pesca ilegal"]}))
+    online = text.transform(build_features(records_frame([{"uf": "PA", "municipio": "BELEM"}]), text=True)[0][[TEXT_COLUMN]])
+    assert (online != text.transform(build_features(batch, text=True)[0][[TEXT_COLUMN]])).nnz == 0
@@ -0,0 +1,15 @@
+import numpy as np
+import pandas as pd
+from tuning import time_folds
+
+def test_rows_without_date_are_only_used_for_training():
+    dates = pd.Series(pd.to_datetime(["2024-01-05", None, "2024-01-01", "2024-01-03", None,
+                                      "2024-01-02", "2024-01-04", "2024-01-06", "2024-01-07"]))
+    folds = time_folds(dates, n_splits=3)
+    undated = set(np.flatnonzero(dates.isna()))
+    for train, test in folds:
+        assert undated <= set(train)
+        assert not undated & set(test)
+        # o teste é sempre posterior ao treino com data
+        assert dates[test].min() > dates[[i for i in train if i not in undated]].max()
+    assert sorted(np.concatenate([te for _, te in folds])) == sorted(dates[dates >= "2024-01-05"].index)